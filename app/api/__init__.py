@@ -3,6 +3,8 @@ from fastapi import APIRouter
 from app.core import settings
 from .v1.auth_router import router as auth_router
 from .v1.user_router import router as user_router
+from .well_known_router import router as well_known_router
+from .metrics_router import router as metrics_router
 
 router = APIRouter(
     prefix=settings.api_prefix
@@ -0,0 +1,154 @@
+from typing import Iterator
+
+from fastapi import APIRouter
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric, SummaryMetricFamily
+from prometheus_client.registry import Collector
+from starlette import status
+from starlette.responses import Response
+
+from app.core import db_helper
+from app.core.metrics import metrics_registry
+from app.services.user_service import user_by_email_loader, user_by_id_loader
+from app.utils import email_outbox, password_hasher, rate_limiter, redis_client, token_denylist, user_cache
+from app.utils.jwt_token import decode_failures
+from app.utils.metrics import LatencyStats
+
+router = APIRouter(
+    tags=['Metrics'],
+)
+
+
+def _latency_metrics(
+        name: str,
+        documentation: str,
+        stats: dict[tuple[str, ...], LatencyStats],
+        labels: tuple[str, ...] = ()
+) -> Iterator[Metric]:
+    """LatencyStats as a summary (count and sum) with a separate gauge of the maximum"""
+    summary = SummaryMetricFamily(name, documentation, labels=labels)
+    maximum = GaugeMetricFamily(f'{name}_max', f'{documentation}, the longest one', labels=labels)
+    for label_values, latency in stats.items():
+        summary.add_metric(label_values, count_value=latency.count, sum_value=latency.total)
+        maximum.add_metric(label_values, latency.max)
+    yield summary
+    yield maximum
+
+
+def _counter(name: str, documentation: str, values: dict[tuple[str, ...], float], labels: tuple[str, ...] = ()) -> Metric:
+    counter = CounterMetricFamily(name, documentation, labels=labels)
+    for label_values, value in values.items():
+        counter.add_metric(label_values, value)
+    return counter
+
+
+def _gauge(name: str, documentation: str, value: float) -> Metric:
+    return GaugeMetricFamily(name, documentation, value=value)
+
+
+class AppStatsCollector(Collector):
+    """
+    Reads the counters the database helper, Redis client, password hasher, caches and token code
+    already keep. Nothing is recorded on the request path for these, the work happens per scrape.
+    """
+    def collect(self) -> Iterator[Metric]:
+        pool = db_helper.pool_stats()
+        yield _counter('db_pool_checkouts', 'Connections checked out of the primary pool', {(): pool['checkouts']})
+        yield _gauge('db_pool_checked_out', 'Connections of the primary pool in use', pool['checked_out'])
+        yield _gauge('db_pool_max_checked_out', 'Most connections of the primary pool in use at once', pool['max_checked_out'])
+        yield _gauge('db_pool_size', 'Configured size of the primary pool', pool['size'])
+        yield _gauge('db_pool_overflow', 'Connections of the primary pool over its size', pool['overflow'])
+        yield from _latency_metrics(
+            'db_pool_connect_seconds',
+            'Time to get a connection of the primary pool, waiting included',
+            {(): db_helper.engine.sync_engine.pool.connect_latency},
+        )
+
+        yield from _latency_metrics(
+            'redis_command_duration_seconds',
+            'Redis command or pipeline round trips',
+            {(command,): latency for command, latency in redis_client.latency.items()},
+            labels=('command',),
+        )
+        yield _counter(
+            'redis_command_errors',
+            'Redis commands that failed',
+            {(command,): errors for command, errors in redis_client.errors.items()},
+            labels=('command',),
+        )
+
+        yield from _latency_metrics(
+            'password_hash_duration_seconds',
+            'Password hashing and verification in the worker pool',
+            {(operation,): latency for operation, latency in password_hasher.operation_latency.items()},
+            labels=('operation',),
+        )
+        yield from _latency_metrics(
+            'password_hash_wait_seconds',
+            'Time password operations waited for a free worker',
+            {(): password_hasher.wait_latency},
+        )
+        yield _gauge('password_hasher_in_flight', 'Password operations running or waiting', password_hasher.in_flight)
+        yield _gauge('password_hasher_queue_depth', 'Password operations waiting for a worker', password_hasher.queue_depth)
+        yield _counter('password_hasher_rejected', 'Password operations rejected with 503', {(): password_hasher.rejected})
+
+        yield _counter(
+            'jwt_decode_failures',
+            'Tokens refused when decoded',
+            {(reason,): count for reason, count in decode_failures.items()},
+            labels=('reason',),
+        )
+        yield _counter('token_denylist_filter_hits', 'Tokens the bloom filter sent to Redis', {(): token_denylist.filter_hits})
+        yield _gauge('token_denylist_filter_items', 'Revoked tokens in the bloom filter', token_denylist.filter_entries)
+
+        cache = user_cache.stats()
+        yield _counter(
+            'user_cache_hits',
+            'User lookups answered by the cache',
+            {('local',): cache['local_hits'], ('redis',): cache['redis_hits']},
+            labels=('tier',),
+        )
+        yield _counter('user_cache_misses', 'User lookups that went to the database', {(): cache['misses']})
+        yield _counter(
+            'user_loader_batches',
+            'Batched user queries',
+            {('id',): user_by_id_loader.batches, ('email',): user_by_email_loader.batches},
+            labels=('key',),
+        )
+        yield _counter(
+            'user_loader_keys',
+            'User keys loaded by batched queries',
+            {('id',): user_by_id_loader.keys_loaded, ('email',): user_by_email_loader.keys_loaded},
+            labels=('key',),
+        )
+
+        yield _counter(
+            'rate_limit_requests',
+            'Requests checked by the rate limiter',
+            {('allowed',): rate_limiter.allowed, ('limited',): rate_limiter.limited},
+            labels=('result',),
+        )
+        yield _counter(
+            'rate_limit_local_fallbacks',
+            'Rate limit checks made in memory while Redis was unavailable',
+            {(): rate_limiter.local_fallbacks},
+        )
+
+        yield _counter(
+            'email_outbox_enqueue_failures',
+            'Emails that could not be added to the outbox, their request failed with 503',
+            {(): email_outbox.enqueue_failures},
+        )
+
+
+metrics_registry.register(AppStatsCollector())
+
+
+@router.get(
+    '/metrics',
+    status_code=status.HTTP_200_OK,
+    include_in_schema=False,
+)
+async def read_metrics():
+    # on the event loop, not in the threadpool, so the counters are not changing while they are read
+    return Response(content=generate_latest(metrics_registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,16 +1,19 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Header
 from fastapi.params import Depends
 from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.background import BackgroundTasks
 
 from app.core import db_helper, security
+from app.core.security import limit_login_attempts, limit_registrations
 from app.exceptions import UserNotVerifiedEmail, UserWithEmailNotFound
+from app.models import User
 from app.schemas import CreateUserSchema, LoginUserSchema, OutputUserSchema, ErrorResponse, LoginOutputSchema
-from app.services import register_user, verify_user, login_user, get_user_by_email, refresh_pair_of_tokens
+from app.services import register_user, verify_user, login_user, get_user_by_email, refresh_pair_of_tokens, \
+    logout_user
+from app.utils.tracing import traced
 
 router = APIRouter(
     tags=['JWT Auth'],
@@ -18,23 +21,35 @@ router = APIRouter(
 )
 
 SESSION_DEP = Annotated[AsyncSession, Depends(db_helper.session_getter)]
-async def check_is_user_verify_email(user_login: Annotated[LoginUserSchema, Form()], session: SESSION_DEP):
-    user = await get_user_by_email(user_login.email, session)
+@traced()
+async def check_is_user_verify_email(user_login: Annotated[LoginUserSchema, Form()], session: SESSION_DEP) -> User:
+    # the password hash is not cached, the row is read from the database
+    user = await get_user_by_email(user_login.email, session, with_password_hash=True)
     if not user:
         raise UserWithEmailNotFound
     if not user.is_verified:
         raise UserNotVerifiedEmail
+    return user
 
 
 @router.post(
     '/register',
     response_model=OutputUserSchema,
     status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(limit_registrations)],
     responses={
       400: {
             "model": ErrorResponse,
             "description": "Email already registered"
       },
+      429: {
+            "model": ErrorResponse,
+            "description": "Too many registrations from your address, see Retry-After"
+      },
+      503: {
+            "model": ErrorResponse,
+            "description": "Verification email could not be queued, the user was not created, see Retry-After"
+      },
       500: {
           "model": ErrorResponse,
         "description": "Internal Server Error"
@@ -43,13 +58,14 @@ async def check_is_user_verify_email(user_login: Annotated[LoginUserSchema, Form
     summary='Register new user',
     description='Register new user. After you should verify your email than login'
 )
-async def register_user_route(user: CreateUserSchema, session: SESSION_DEP, background_tasks: BackgroundTasks):
-    return await register_user(user, session, background_tasks)
+async def register_user_route(user: CreateUserSchema, session: SESSION_DEP):
+    return await register_user(user, session)
 
 @router.post(
     '/login',
     response_model=LoginOutputSchema,
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(limit_login_attempts)],
     responses={
         403: {
             "model": ErrorResponse,
@@ -59,17 +75,26 @@ async def register_user_route(user: CreateUserSchema, session: SESSION_DEP, back
             "model": ErrorResponse,
             "description": "Invalid username or password"
         },
+        429: {
+            "model": ErrorResponse,
+            "description": "Too many login attempts from your address or for this email, see Retry-After"
+        },
         500: {
             "model": ErrorResponse,
             "description": "Internal Server Error"
         }
     },
-    dependencies=[Depends(check_is_user_verify_email)],
     summary='Login in app',
     description='Login in app. You should already verify your email. Than you`ll get a pairs of tokens'
 )
-async def login_user_route(user_login: Annotated[LoginUserSchema, Form()], session: SESSION_DEP):
-    return await login_user(user_login, session)
+async def login_user_route(
+    user_login: Annotated[LoginUserSchema, Form()],
+    session: SESSION_DEP,
+    verified_user: Annotated[User, Depends(check_is_user_verify_email)],
+    user_agent: Annotated[Optional[str], Header()] = None
+):
+    # the user row loaded by the verification check is reused for the credentials check
+    return await login_user(user_login, session, verified_user, user_agent)
 
 @router.get('/verify-email')
 async def verify_email(token: str, session: SESSION_DEP):
@@ -85,7 +110,7 @@ async def verify_email(token: str, session: SESSION_DEP):
         },
         403: {
             "model": ErrorResponse,
-            "description": "Refresh token is missing"
+            "description": "Refresh token is missing, revoked or already used"
         },
         500: {
             "model": ErrorResponse,
@@ -101,3 +126,23 @@ async def refresh_token(
 ):
     return await refresh_pair_of_tokens(credentials)
 
+@router.post(
+    '/logout',
+    responses={
+        403: {
+            "model": ErrorResponse,
+            "description": "Invalid, expired or revoked access token"
+        },
+        500: {
+            "model": ErrorResponse,
+            "description": "Internal Server Error"
+        }
+    },
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary='Logout',
+    description='Revoke your access_token and the session of your refresh_token. Send your access token in headers Bearer<access_token>'
+)
+async def logout(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]
+):
+    await logout_user(credentials)
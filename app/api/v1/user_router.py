@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Any
 
 from fastapi import APIRouter
 from fastapi.params import Depends
@@ -6,8 +6,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.core import db_helper
-from app.core.security import get_current_user
-from app.schemas import OutputUserSchema, ErrorResponse
+from app.core.security import get_current_user, get_access_token_payload, check_internal_token
+from app.schemas import OutputUserSchema, ErrorResponse, SessionSchema, UsersBatchSchema
+from app.services import get_user_sessions, revoke_user_session, revoke_other_user_sessions, get_users_batch
 
 router = APIRouter(
     tags=['USER'],
@@ -16,6 +17,7 @@ router = APIRouter(
 
 SESSION_DEP = Annotated[AsyncSession, Depends(db_helper.session_getter)]
 CURRENT_USER_DEP = Annotated[OutputUserSchema, Depends(get_current_user)]
+TOKEN_PAYLOAD_DEP = Annotated[dict[str, Any], Depends(get_access_token_payload)]
 @router.get(
     "/me",
     response_model=OutputUserSchema,
@@ -32,4 +34,83 @@ CURRENT_USER_DEP = Annotated[OutputUserSchema, Depends(get_current_user)]
 def read_current_user(
         current_user: CURRENT_USER_DEP
 ):
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.get(
+    "/me/sessions",
+    response_model=list[SessionSchema],
+    status_code=status.HTTP_200_OK,
+    responses={
+        403: {
+            "model": ErrorResponse,
+            "description": 'Not authorized'
+        }
+    },
+    summary='List your sessions',
+    description='Devices you are logged in on, most recently used first. The session of your access_token is marked as current'
+)
+async def read_current_user_sessions(
+        payload: TOKEN_PAYLOAD_DEP
+):
+    return await get_user_sessions(payload)
+
+@router.delete(
+    "/me/sessions/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        403: {
+            "model": ErrorResponse,
+            "description": 'Not authorized'
+        },
+        404: {
+            "model": ErrorResponse,
+            "description": 'Session not found'
+        }
+    },
+    summary='Revoke a session',
+    description='Log out a device, its refresh_token stops working'
+)
+async def delete_current_user_session(
+        session_id: str,
+        payload: TOKEN_PAYLOAD_DEP
+):
+    await revoke_user_session(payload, session_id)
+
+@router.delete(
+    "/me/sessions",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        403: {
+            "model": ErrorResponse,
+            "description": 'Not authorized'
+        }
+    },
+    summary='Revoke other sessions',
+    description='Log out every device except the one your access_token belongs to'
+)
+async def delete_other_current_user_sessions(
+        payload: TOKEN_PAYLOAD_DEP
+):
+    await revoke_other_user_sessions(payload)
+
+@router.post(
+    "/batch",
+    response_model=list[OutputUserSchema],
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(check_internal_token)],
+    responses={
+        403: {
+            "model": ErrorResponse,
+            "description": 'Invalid internal token'
+        }
+    },
+    summary='Get users by ids and emails',
+    description='For internal services, send the internal token in the X-Internal-Token header. '
+                'Users that do not exist are left out of the response'
+)
+async def read_users_batch(
+        users_batch: UsersBatchSchema
+):
+    users = await get_users_batch(users_batch.ids, users_batch.emails)
+    return [OutputUserSchema(**user.model_dump()) for user in users]
+
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from starlette import status
+from starlette.responses import Response
+
+from app.utils.jwt_keys import jwt_keyring
+
+router = APIRouter(
+    tags=['Well-known'],
+    prefix='/.well-known'
+)
+
+@router.get(
+    '/jwks.json',
+    status_code=status.HTTP_200_OK,
+    summary='Public keys of the token issuer',
+    description='JSON Web Key Set with the public keys tokens are signed with, to verify tokens without calling this service'
+)
+def read_jwks():
+    # the document is built once when the keyring is loaded
+    return Response(
+        content=jwt_keyring.jwks_json,
+        media_type='application/json',
+        headers={'Cache-Control': 'public, max-age=300'}
+    )
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from app.core import settings
+from app.cli.calibrate_password_hash import calibrate
+from app.cli.import_users import run_import_users
+from logging_config import setup_logging
+
+
+def import_users_command(args: argparse.Namespace) -> None:
+    file_format = args.format or ('jsonl' if args.path.suffix in ('.jsonl', '.ndjson') else 'csv')
+    stats = asyncio.run(run_import_users(
+        args.path,
+        db_url=args.db_url or settings.db.db_url,
+        file_format=file_format,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        on_conflict=args.on_conflict,
+        checkpoint_path=None if args.no_checkpoint else (args.checkpoint or args.path.with_name(f'{args.path.name}.checkpoint')),
+        verified=args.verified,
+    ))
+    print(
+        f'{stats.read} rows read in {stats.elapsed:.1f}s (resumed after {stats.resumed_from}): '
+        f'{stats.inserted} imported, {stats.updated} updated, {stats.skipped} skipped (existing or repeated emails), '
+        f'{stats.invalid} invalid'
+    )
+
+
+def calibrate_password_hash_command(args: argparse.Namespace) -> None:
+    algorithm = args.algorithm or settings.password_hash.algorithm
+    measurements, chosen = calibrate(
+        algorithm,
+        args.target_ms,
+        samples=args.samples,
+        memory_cost=settings.password_hash.argon2_memory_cost,
+        parallelism=settings.password_hash.argon2_parallelism,
+    )
+    cost_name = 'rounds' if algorithm == 'bcrypt' else 'time_cost'
+    for measurement in measurements:
+        print(
+            f'{cost_name} {measurement.cost:>3}  {measurement.milliseconds:>8.1f} ms  '
+            f'{1000 / measurement.milliseconds:>7.1f} hashes/s per worker'
+        )
+
+    if chosen is None:
+        print(f'even the lowest cost takes longer than {args.target_ms:g} ms on this machine')
+        return
+    print(f'\n{cost_name} {chosen.cost} takes {chosen.milliseconds:.1f} ms, set:')
+    print(f'password_hash__algorithm = {algorithm}')
+    if algorithm == 'bcrypt':
+        print(f'password_hash__bcrypt_rounds = {chosen.cost}')
+    else:
+        print(f'password_hash__argon2_time_cost = {chosen.cost}')
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m app.cli', description='Management commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser(
+        'import-users',
+        help='bulk import users from CSV or JSONL',
+        description=(
+            'Stream users into the user table without registration emails. Columns: name, email, avatar_url, '
+            'password (plaintext, hashed here) or password_hash (bcrypt), optional is_verified.'
+        )
+    )
+    import_parser.add_argument('path', type=Path)
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    import_parser.add_argument('--db-url', help='defaults to db__db_url')
+    import_parser.add_argument('--batch-size', type=int, default=5000)
+    import_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes hashing passwords')
+    import_parser.add_argument('--on-conflict', choices=['skip', 'update'], default='skip', help='for emails that already exist')
+    import_parser.add_argument('--checkpoint', type=Path, help='defaults to <path>.checkpoint, an import resumes from it')
+    import_parser.add_argument('--no-checkpoint', action='store_true')
+    import_parser.add_argument('--verified', action='store_true', help='mark every imported user as verified')
+    import_parser.set_defaults(handler=import_users_command)
+
+    calibrate_parser = subparsers.add_parser(
+        'calibrate-password-hash',
+        help='find the password hash cost for a target latency on this machine',
+        description=(
+            'Hash with increasing cost and report the highest one that stays within the target. '
+            'Argon2id keeps password_hash__argon2_memory_cost and tunes time_cost.'
+        )
+    )
+    calibrate_parser.add_argument('--algorithm', choices=['bcrypt', 'argon2id'], help='defaults to password_hash__algorithm')
+    calibrate_parser.add_argument('--target-ms', type=float, default=250, help='time one login may spend hashing')
+    calibrate_parser.add_argument('--samples', type=int, default=3, help='hashes timed per cost, the median is used')
+    calibrate_parser.set_defaults(handler=calibrate_password_hash_command)
+
+    args = parser.parse_args(argv)
+    setup_logging(**settings.logging.model_dump())
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Iterator, Literal, Optional
+
+from app.utils.password import Argon2Backend, BcryptBackend, PasswordHashBackend
+
+CALIBRATION_PASSWORD = 'calibration password'
+
+
+@dataclass
+class Measurement:
+    cost: int
+    milliseconds: float
+
+
+def measure(backend: PasswordHashBackend, samples: int) -> float:
+    """Median milliseconds of one hash, a login verifies at the same cost"""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        backend.hash(CALIBRATION_PASSWORD)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _backends(
+        algorithm: Literal['bcrypt', 'argon2id'],
+        memory_cost: int,
+        parallelism: int
+) -> Iterator[tuple[int, PasswordHashBackend]]:
+    if algorithm == 'bcrypt':
+        for rounds in range(4, 32):
+            yield rounds, BcryptBackend(rounds)
+    else:
+        # memory stays as configured, it bounds how many logins fit in RAM; time_cost is what gets tuned
+        for time_cost in range(1, 100):
+            yield time_cost, Argon2Backend(time_cost, memory_cost, parallelism)
+
+
+def calibrate(
+        algorithm: Literal['bcrypt', 'argon2id'],
+        target_ms: float,
+        samples: int = 3,
+        memory_cost: int = 65536,
+        parallelism: int = 4,
+) -> tuple[list[Measurement], Optional[Measurement]]:
+    """
+    Time increasing costs until one is past the target, return every measurement and
+    the highest cost that stays within the target (None when even the lowest is slower).
+    """
+    measurements: list[Measurement] = []
+    chosen: Optional[Measurement] = None
+    for cost, backend in _backends(algorithm, memory_cost, parallelism):
+        measurement = Measurement(cost, measure(backend, samples))
+        measurements.append(measurement)
+        if measurement.milliseconds > target_ms:
+            break
+        chosen = measurement
+    return measurements, chosen
@@ -0,0 +1,258 @@
+import asyncio
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import Iterator, Literal, Optional
+
+import asyncpg
+from sqlalchemy import make_url
+
+from app.models import User
+from app.utils.password import is_password_hash, password_hash_backend
+
+import_users_logger = getLogger('project.import_users')
+
+STAGING_TABLE = 'user_import'
+COLUMNS = ('name', 'email', 'avatar_url', 'password_hash', 'is_verified')
+
+ON_CONFLICT = {
+    'skip': 'DO NOTHING',
+    'update': (
+        'DO UPDATE SET name = EXCLUDED.name, avatar_url = EXCLUDED.avatar_url, '
+        'password_hash = EXCLUDED.password_hash, is_verified = EXCLUDED.is_verified'
+    ),
+}
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    invalid: int = 0
+    resumed_from: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def skipped(self) -> int:
+        """Valid rows not written: emails that exist already (with ``skip``) or repeat within a batch"""
+        return self.read - self.inserted - self.updated - self.invalid
+
+
+class Checkpoint:
+    """Number of input rows that are already committed, written atomically after every batch"""
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self) -> int:
+        if not self.path.exists():
+            return 0
+        return int(self.path.read_text().strip() or 0)
+
+    def save(self, rows_done: int) -> None:
+        tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        tmp_path.write_text(str(rows_done))
+        os.replace(tmp_path, self.path)
+
+
+def read_rows(path: Path, file_format: Literal['csv', 'jsonl']) -> Iterator[dict]:
+    """Rows of the input one by one, the file is never loaded whole"""
+    with path.open(newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                if not isinstance(row, dict):
+                    import_users_logger.warning('Line %s is not a JSON object, skip it', line_number)
+                    # still a row, so it is counted as invalid and the checkpoint keeps counting lines
+                    row = {}
+                yield row
+
+
+def batches(rows: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def hash_password(password: str) -> str:
+    # module level, so it can be sent to worker processes; the algorithm and cost of password_hash__* apply
+    return password_hash_backend.hash(password).decode()
+
+
+def _is_true(value) -> bool:
+    return value is True or str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+async def prepare_batch(
+        rows: list[dict],
+        executor: Executor,
+        verified: bool
+) -> tuple[list[tuple], int]:
+    """
+    Records ready for COPY and the number of invalid rows.
+
+    Plaintext passwords are hashed in the process pool, whatever they look like. Existing bcrypt
+    or argon2id hashes are only taken from ``password_hash`` and are used as they are.
+    """
+    loop = asyncio.get_running_loop()
+    records: list[list] = []
+    pending_indexes: list[int] = []
+    pending_hashes: list[asyncio.Future] = []
+    invalid = 0
+
+    for row in rows:
+        email = (row.get('email') or '').strip()
+        password_hash = row.get('password_hash') or ''
+        password = row.get('password') or ''
+        if not email or not (password_hash or password):
+            invalid += 1
+            continue
+        if password_hash and not is_password_hash(password_hash.encode()):
+            invalid += 1
+            continue
+
+        is_verified = verified or _is_true(row.get('is_verified', False))
+        record = [row.get('name') or '', email, row.get('avatar_url') or '', password_hash, is_verified]
+        if not password_hash:
+            pending_indexes.append(len(records))
+            pending_hashes.append(loop.run_in_executor(executor, hash_password, password))
+        records.append(record)
+
+    for index, hashed in zip(pending_indexes, await asyncio.gather(*pending_hashes)):
+        records[index][3] = hashed
+
+    return [tuple(record) for record in records], invalid
+
+
+class PostgresUserLoader:
+    """
+    Loads batches with COPY into a temporary staging table, then moves them into the user table
+    with a single INSERT ... SELECT ... ON CONFLICT (email).
+    """
+    def __init__(self, connection: asyncpg.Connection, on_conflict: Literal['skip', 'update'] = 'skip'):
+        self.connection = connection
+        table = User.__tablename__
+        columns = ', '.join(COLUMNS)
+        # DISTINCT ON keeps one row per email, ON CONFLICT cannot touch the same row twice in one statement;
+        # xmax of a returned row is 0 when it was inserted and set when an existing row was updated
+        self.insert_sql = (
+            f'WITH upserted AS ('
+            f'INSERT INTO "{table}" ({columns}) '
+            f'SELECT DISTINCT ON (email) {columns} FROM {STAGING_TABLE} ORDER BY email '
+            f'ON CONFLICT (email) {ON_CONFLICT[on_conflict]} '
+            f'RETURNING xmax = 0 AS inserted) '
+            f'SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated '
+            f'FROM upserted'
+        )
+
+    @classmethod
+    async def connect(cls, db_url: str, on_conflict: Literal['skip', 'update'] = 'skip') -> 'PostgresUserLoader':
+        url = make_url(db_url)
+        if url.get_backend_name() != 'postgresql':
+            raise ValueError('import-users loads rows with COPY and needs PostgreSQL')
+        connection = await asyncpg.connect(url.set(drivername='postgresql').render_as_string(hide_password=False))
+        await connection.execute(
+            f'CREATE TEMP TABLE {STAGING_TABLE} '
+            f'(name text, email text, avatar_url text, password_hash text, is_verified boolean) '
+            f'ON COMMIT DELETE ROWS'
+        )
+        return cls(connection, on_conflict)
+
+    async def load(self, records: list[tuple]) -> tuple[int, int]:
+        """Insert a batch in one transaction, return how many users were inserted and how many updated"""
+        async with self.connection.transaction():
+            await self.connection.copy_records_to_table(STAGING_TABLE, records=records, columns=COLUMNS)
+            counts = await self.connection.fetchrow(self.insert_sql)
+        return counts['inserted'], counts['updated']
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+async def import_users(
+        path: Path,
+        loader: PostgresUserLoader,
+        executor: Executor,
+        file_format: Literal['csv', 'jsonl'] = 'csv',
+        batch_size: int = 5000,
+        checkpoint: Optional[Checkpoint] = None,
+        verified: bool = False,
+) -> ImportStats:
+    """
+    Stream the file in batches: the next batch is hashed while the current one is loaded,
+    so memory stays at two batches whatever the file size.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    rows = read_rows(path, file_format)
+
+    if checkpoint is not None:
+        stats.resumed_from = checkpoint.load()
+        if stats.resumed_from:
+            import_users_logger.info('Resume import after %s rows', stats.resumed_from)
+            # skipped rows are only parsed, not hashed
+            rows = itertools.islice(rows, stats.resumed_from, None)
+
+    rows_done = stats.resumed_from
+    batch_iterator = batches(rows, batch_size)
+    next_batch = next(batch_iterator, None)
+    preparing = asyncio.ensure_future(prepare_batch(next_batch, executor, verified)) if next_batch else None
+
+    while preparing is not None:
+        records, invalid = await preparing
+        batch_rows = len(next_batch)
+
+        next_batch = next(batch_iterator, None)
+        preparing = asyncio.ensure_future(prepare_batch(next_batch, executor, verified)) if next_batch else None
+
+        inserted, updated = await loader.load(records) if records else (0, 0)
+        rows_done += batch_rows
+        if checkpoint is not None:
+            checkpoint.save(rows_done)
+
+        stats.read += batch_rows
+        stats.inserted += inserted
+        stats.updated += updated
+        stats.invalid += invalid
+        import_users_logger.info('Imported %s rows, %s inserted, %s updated', rows_done, stats.inserted, stats.updated)
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+async def run_import_users(
+        path: Path,
+        db_url: str,
+        file_format: Literal['csv', 'jsonl'],
+        batch_size: int,
+        workers: int,
+        on_conflict: Literal['skip', 'update'],
+        checkpoint_path: Optional[Path],
+        verified: bool,
+) -> ImportStats:
+    loader = await PostgresUserLoader.connect(db_url, on_conflict)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return await import_users(
+                path,
+                loader,
+                executor,
+                file_format=file_format,
+                batch_size=batch_size,
+                checkpoint=Checkpoint(checkpoint_path) if checkpoint_path else None,
+                verified=verified,
+            )
+    finally:
+        await loader.close()
@@ -1,14 +1,70 @@
-from collections.abc import AsyncGenerator
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
 from logging import getLogger
+from typing import Any, Optional
 
+from sqlalchemy import Select, event, make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core import settings
+from app.utils.metrics import LatencyStats
+from app.utils.tracing import tracer
 
 
 db_helper_logger = getLogger('project.database_helper')
 
 
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to a replica and everything else to the primary.
+
+    Once the session has written, or ``info['use_primary']`` is set, it stays on the primary,
+    so it reads its own writes.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        helper: 'DatabaseHelper' = self.info['db_helper']
+        primary = helper.engine.sync_engine
+
+        if self.info.get('use_primary'):
+            return primary
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            if clause is not None:
+                self.info['use_primary'] = True
+            return primary
+
+        replica = helper.pick_replica()
+        if replica is None:
+            return primary
+        self.info['replica'] = replica
+        return replica.sync_engine
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Times getting a connection, waiting for a free one when the pool is exhausted included"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connect_latency = LatencyStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.connect_latency.observe(time.perf_counter() - started)
+
+    def recreate(self) -> 'TimedQueuePool':
+        # engine.dispose() replaces the pool, the timings carry over
+        pool = super().recreate()
+        pool.connect_latency = self.connect_latency
+        return pool
+
+
 class DatabaseHelper:
     def __init__(
             self,
@@ -16,33 +72,210 @@ class DatabaseHelper:
             pool_size: int = 5,
             echo: bool = True,
             max_overflow: int = 10,
-            echo_pool: bool = False
+            echo_pool: bool = False,
+            replica_urls: Optional[list[str]] = None,
+            read_your_writes_seconds: float = 5,
+            replica_retry_seconds: float = 30,
+            query_cache_size: int = 500,
+            prepared_statement_cache_size: int = 100,
+            pgbouncer: bool = False,
 
     ):
+        engine_options = {
+            'echo': echo,
+            'echo_pool': echo_pool,
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'query_cache_size': query_cache_size,
+            'poolclass': TimedQueuePool,
+        }
+
         db_helper_logger.info('Create async engine')
         self.engine: AsyncEngine = create_async_engine(
             url,
-            echo=echo,
-            echo_pool=echo_pool,
-            pool_size=pool_size,
-            max_overflow=max_overflow
+            connect_args=self.connect_args(url, prepared_statement_cache_size, pgbouncer),
+            **engine_options
         )
 
+        self.pool_checkouts = 0
+        self.pool_checked_out = 0
+        self.pool_max_checked_out = 0
+        event.listen(self.engine.sync_engine, 'checkout', self._on_checkout)
+        event.listen(self.engine.sync_engine, 'checkin', self._on_checkin)
+
+        self.replica_engines: list[AsyncEngine] = [
+            create_async_engine(
+                replica_url,
+                connect_args=self.connect_args(replica_url, prepared_statement_cache_size, pgbouncer),
+                **engine_options
+            )
+            for replica_url in replica_urls or []
+        ]
+        for engine in (self.engine, *self.replica_engines):
+            tracer.instrument_engine(engine)
+        self._replica_cycle = itertools.cycle(self.replica_engines)
+        # replica -> monotonic time it may be tried again
+        self._unhealthy_until: dict[AsyncEngine, float] = {}
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.replica_retry_seconds = replica_retry_seconds
+        # key -> monotonic time its reads may go to replicas again, oldest first
+        self._recent_writes: OrderedDict[str, float] = OrderedDict()
+
         db_helper_logger.info('create async session')
+        session_options: dict[str, Any] = {}
+        if self.replica_engines:
+            session_options = {'sync_session_class': RoutingSession, 'info': {'db_helper': self}}
         self.session_factory: async_sessionmaker[AsyncSession] = async_sessionmaker(
             bind=self.engine,
             autoflush = False,
             autocommit = False,
-            expire_on_commit = False
+            expire_on_commit = False,
+            **session_options
+        )
+
+    @staticmethod
+    def connect_args(url: str, prepared_statement_cache_size: int, pgbouncer: bool) -> dict[str, Any]:
+        """
+        asyncpg prepares every statement once per connection and keeps up to
+        ``prepared_statement_cache_size`` of them.
+
+        PgBouncer in transaction mode hands a transaction any server connection, where statements
+        prepared on another one do not exist, so both caches are turned off and names made unique.
+        """
+        if make_url(url).get_driver_name() != 'asyncpg':
+            return {}
+        if pgbouncer:
+            return {
+                'prepared_statement_cache_size': 0,
+                'statement_cache_size': 0,
+                'prepared_statement_name_func': lambda: f'__asyncpg_{uuid.uuid4()}__',
+            }
+        return {'prepared_statement_cache_size': prepared_statement_cache_size}
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.pool_checkouts += 1
+        self.pool_checked_out += 1
+        self.pool_max_checked_out = max(self.pool_max_checked_out, self.pool_checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        self.pool_checked_out -= 1
+
+    def pool_stats(self) -> dict[str, Any]:
+        """
+        Connections of the primary pool: checkouts so far, in use now and at most, the configured size,
+        connections over it and how long getting one took
+        """
+        pool = self.engine.sync_engine.pool
+        return {
+            'checkouts': self.pool_checkouts,
+            'checked_out': self.pool_checked_out,
+            'max_checked_out': self.pool_max_checked_out,
+            'size': pool.size(),
+            'overflow': max(pool.overflow(), 0),
+            'connect_latency': pool.connect_latency.as_dict(),
+        }
+
+    def pick_replica(self) -> Optional[AsyncEngine]:
+        """Next healthy replica round-robin, None when there is none and reads go to the primary"""
+        now = time.monotonic()
+        for _ in range(len(self.replica_engines)):
+            replica = next(self._replica_cycle)
+            if self._unhealthy_until.get(replica, 0) <= now:
+                return replica
+        return None
+
+    def mark_replica_unhealthy(self, replica: AsyncEngine) -> None:
+        db_helper_logger.warning('Replica %s is unhealthy, read from the primary', replica.url.host)
+        self._unhealthy_until[replica] = time.monotonic() + self.replica_retry_seconds
+
+    def mark_written(self, *keys: str) -> None:
+        """Reads of these keys go to the primary for read_your_writes_seconds, until replicas catch up"""
+        if not self.replica_engines:
+            return
+        now = time.monotonic()
+        while self._recent_writes and next(iter(self._recent_writes.values())) <= now:
+            self._recent_writes.popitem(last=False)
+        for key in keys:
+            self._recent_writes[key] = now + self.read_your_writes_seconds
+            self._recent_writes.move_to_end(key)
+
+    def _is_recently_written(self, key: str) -> bool:
+        sticky_until = self._recent_writes.get(key)
+        return sticky_until is not None and sticky_until > time.monotonic()
+
+    async def read_scalar(
+            self,
+            session: AsyncSession,
+            statement: Select,
+            params: Optional[dict[str, Any]] = None,
+            sticky_key: Optional[str] = None
+    ) -> Any:
+        """
+        Run a read-only statement on a replica, or on the primary when ``sticky_key`` was written recently.
+
+        A replica that fails is taken out of rotation and the statement is retried on the primary.
+        Sessions of ``session_getter`` give their connection back to the pool right after the read,
+        when the read was all their transaction did.
+        """
+        return await self._read(
+            session, lambda: session.scalar(statement, params), [sticky_key] if sticky_key is not None else []
         )
 
+    async def read_all(
+            self,
+            session: AsyncSession,
+            statement: Select,
+            params: Optional[dict[str, Any]] = None,
+            sticky_keys: Iterable[str] = ()
+    ) -> list[Any]:
+        """Like read_scalar for a statement with many rows, on the primary when any of ``sticky_keys`` was written"""
+        async def run() -> list[Any]:
+            return list(await session.scalars(statement, params))
+
+        return await self._read(session, run, sticky_keys)
+
+    async def _read(self, session: AsyncSession, run: Callable[[], Awaitable[Any]], sticky_keys: Iterable[str]) -> Any:
+        if any(self._is_recently_written(key) for key in sticky_keys):
+            session.info['use_primary'] = True
+        release = session.info.get('release_after_read') and not session.in_transaction()
+        try:
+            result = await run()
+        except (DBAPIError, OSError):
+            replica = session.info.pop('replica', None)
+            if replica is None or session.info.get('use_primary'):
+                raise
+            self.mark_replica_unhealthy(replica)
+            await session.rollback()
+            session.info['use_primary'] = True
+            result = await run()
+
+        if release:
+            # ends the read-only transaction, loaded objects are kept since expire_on_commit is off
+            await session.commit()
+        return result
+
     async def dispose(self):
         db_helper_logger.info('Dispose connection with db')
         await self.engine.dispose()
+        for replica in self.replica_engines:
+            await replica.dispose()
 
     async def session_getter(self) -> AsyncGenerator[AsyncSession, None]:
+        # the connection is checked out on the first statement, not here, and reads give it back
+        # right away, so it is not held while the route hashes a password or waits for Redis
         async with self.session_factory() as session:
-            db_helper_logger.info('yield session')
+            session.info['release_after_read'] = True
+            db_helper_logger.debug('yield session')
             yield session
 
-db_helper = DatabaseHelper(settings.db.db_url,echo_pool=True)
+db_helper = DatabaseHelper(
+    settings.db.db_url,
+    echo=settings.db.echo,
+    echo_pool=settings.db.echo_pool,
+    replica_urls=settings.db.replica_urls,
+    read_your_writes_seconds=settings.db.read_your_writes_seconds,
+    replica_retry_seconds=settings.db.replica_retry_seconds,
+    query_cache_size=settings.db.query_cache_size,
+    prepared_statement_cache_size=settings.db.prepared_statement_cache_size,
+    pgbouncer=settings.db.pgbouncer,
+)
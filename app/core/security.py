@@ -1,31 +1,82 @@
-from typing import Annotated
+import secrets
+from typing import Annotated, Any, Optional
 
+from fastapi import Form, Header, Request
 from fastapi.params import Depends
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core import db_helper
-from app.exceptions import InvalidTokenType
-from app.schemas import OutputUserSchema
+from app.core import db_helper, settings
+from app.exceptions import InvalidTokenType, UserWithIdNotFound, TokenRevoked, InvalidInternalToken, TooManyRequests
+from app.schemas import OutputUserSchema, LoginUserSchema
 from app.services import get_user_by_id
-from app.utils import decode_jwt_token
+from app.services.auth_service import get_user_from_claims
+from app.utils import decode_jwt_token, token_denylist, rate_limiter
 
 security = HTTPBearer()
 
-async def get_current_user(
+async def get_access_token_payload(
         credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-        session: Annotated[AsyncSession, Depends(db_helper.session_getter)]
-) -> OutputUserSchema:
+) -> dict[str, Any]:
     token = credentials.credentials
     payload = decode_jwt_token(token)
 
     if payload.get("type") != "access":
         raise InvalidTokenType
 
+    # answered from the in-memory bloom filter, Redis is asked only for possibly revoked tokens
+    if await token_denylist.is_revoked(payload.get('jti')):
+        raise TokenRevoked
+
+    return payload
+
+async def get_current_user(
+        credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+) -> OutputUserSchema:
+    payload = await get_access_token_payload(credentials)
+
+    user_from_claims = get_user_from_claims(payload)
+    if user_from_claims is not None:
+        return user_from_claims
+
     user_id:int = int(payload.get("sub"))
-    user = await get_user_by_id(user_id, session)
+    async with db_helper.session_factory() as session:
+        user = await get_user_by_id(user_id, session)
 
+    if user is None:
+        raise UserWithIdNotFound
 
     return OutputUserSchema(**user.model_dump())
 
+async def check_internal_token(
+        x_internal_token: Annotated[Optional[str], Header()] = None,
+) -> None:
+    expected = settings.internal_api_token
+    # constant time comparison, so the token cannot be guessed byte by byte from response times
+    if not expected or x_internal_token is None or not secrets.compare_digest(x_internal_token, expected):
+        raise InvalidInternalToken
+
+def _client_ip(request: Request) -> str:
+    forwarded_for = request.headers.get('x-forwarded-for')
+    if settings.rate_limit.trust_forwarded_for and forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+    return request.client.host if request.client else 'unknown'
+
+async def _check_rate_limit(buckets: dict) -> None:
+    retry_after = await rate_limiter.hit(buckets)
+    if retry_after:
+        raise TooManyRequests(rate_limiter.retry_after_header(retry_after))
+
+async def limit_login_attempts(
+        request: Request,
+        user_login: Annotated[LoginUserSchema, Form()],
+) -> None:
+    # runs before the user is loaded and the password is checked, so refused attempts cost no bcrypt
+    rules = settings.rate_limit
+    await _check_rate_limit({
+        f'login:ip:{_client_ip(request)}': rules.login_by_ip,
+        f'login:email:{user_login.email.strip().lower()}': rules.login_by_email,
+    })
+
+async def limit_registrations(request: Request) -> None:
+    await _check_rate_limit({f'register:ip:{_client_ip(request)}': settings.rate_limit.register_by_ip})
 
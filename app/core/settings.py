@@ -1,5 +1,6 @@
 from datetime import timedelta
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -8,6 +9,20 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 class DBSettings(BaseModel):
     db_url: str
+    # SQLAlchemy echo logs every statement regardless of logger levels, turn off in production
+    echo: bool = True
+    echo_pool: bool = True
+    # plain SELECTs of read-only service calls go to replicas round-robin, everything else to db_url
+    replica_urls: list[str] = []
+    # reads of a user written by this process stay on the primary for this long
+    read_your_writes_seconds: float = 5
+    # a failed replica is skipped for this long
+    replica_retry_seconds: float = 30
+    # compiled SQL kept by SQLAlchemy per engine, and statements asyncpg keeps prepared per connection
+    query_cache_size: int = 500
+    prepared_statement_cache_size: int = 100
+    # PgBouncer in transaction mode, turns the prepared statement caches off
+    pgbouncer: bool = False
 
 class SMTPSettings(BaseModel):
     sender_email: str
@@ -15,10 +30,29 @@ class SMTPSettings(BaseModel):
     smtp_port: int
     smtp_login: str
     smtp_password: str
+    smtp_use_tls: bool = True
+    smtp_pool_size: int = 2
+    smtp_timeout: float = 10
+    smtp_idle_timeout: float = 60
 
 class RedisSettings(BaseModel):
     redis_host: str
     redis_port: int
+    max_connections: int = 50
+    # seconds to wait for a free pooled connection
+    pool_timeout: float = 5
+    # has to be longer than email_outbox.block_ms, the email worker blocks on XREADGROUP
+    socket_timeout: float = 10
+    socket_connect_timeout: float = 2
+    health_check_interval: int = 30
+
+class JWTKeySettings(BaseModel):
+    kid: str
+    algorithm: Literal['RS256', 'ES256', 'EdDSA']
+    # PEM files, retiring keys only need the public part
+    private_key_path: str | None = None
+    public_key_path: str | None = None
+    status: Literal['active', 'retiring'] = 'active'
 
 class JWTSettings(BaseModel):
     secret_key: str
@@ -26,6 +60,107 @@ class JWTSettings(BaseModel):
     email_token_expire_minutes: int = 10
     refresh_token_expire_minutes: timedelta = timedelta(minutes=5)
     access_token_expire_minutes: timedelta = timedelta(minutes=1)
+    # put OutputUserSchema fields into tokens so get_current_user can skip the database
+    user_claims_in_access_token: bool = False
+    # bump when the claims layout changes, tokens with another version fall back to the database
+    user_claims_version: int = 1
+    # asymmetric keys with kid, when set they replace secret_key/algorithm
+    keys: list[JWTKeySettings] = []
+    # refresh sessions (devices) a user can have, the least recently used one is evicted over the cap
+    max_sessions_per_user: int = 10
+
+class PasswordHashSettings(BaseModel):
+    max_workers: int = 4
+    max_queue_size: int = 64
+    use_processes: bool = False
+    # new hashes use this algorithm and cost, older ones are rehashed on the next login,
+    # python -m app.cli calibrate-password-hash finds the cost for a target latency
+    algorithm: Literal['bcrypt', 'argon2id'] = 'bcrypt'
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    # KiB
+    argon2_memory_cost: int = 65536
+    argon2_parallelism: int = 4
+
+class UserCacheSettings(BaseModel):
+    enabled: bool = True
+    local_max_size: int = 10_000
+    # the in-process tier cannot be invalidated across workers, keep it short
+    local_ttl_seconds: float = 5
+    redis_ttl_seconds: int = 300
+    negative_ttl_seconds: int = 30
+
+class AccessLogSettings(BaseModel):
+    log_body: bool = False
+    body_sample_rate: float = 0.0
+    body_max_bytes: int = 1024
+    redact_fields: list[str] = ['password']
+
+class LoggingSettings(BaseModel):
+    profile: Literal['development', 'production'] = 'development'
+    use_queue: bool = True
+    filename: str = 'jwt_auth.log'
+    max_bytes: int = 10 * 1024 * 1024
+    backup_count: int = 5
+    flush_every: int = 64
+
+class EmailOutboxSettings(BaseModel):
+    stream: str = 'email:outbox'
+    group: str = 'email-workers'
+    retry_key: str = 'email:outbox:retry'
+    dead_letter_stream: str = 'email:outbox:dead'
+    batch_size: int = 50
+    concurrency: int = 10
+    max_attempts: int = 5
+    backoff_base_seconds: float = 2
+    backoff_max_seconds: float = 300
+    block_ms: int = 5000
+    # pending jobs of a consumer that has been silent this long are taken over
+    claim_idle_ms: int = 5 * 60 * 1000
+
+class UserLoaderSettings(BaseModel):
+    # lookups by id/email made in the same event loop tick are sent as one query
+    enabled: bool = True
+    max_batch_size: int = 500
+
+class TokenDenylistSettings(BaseModel):
+    key_prefix: str = 'revoked_token:'
+    stream: str = 'revoked_tokens'
+    # revocations the bloom filter holds before it is rebuilt, and its false positive rate
+    capacity: int = 100_000
+    error_rate: float = 0.001
+    # how long a revocation may stay unseen by other workers
+    refresh_interval_seconds: float = 1.0
+
+class RateLimitRule(BaseModel):
+    # requests allowed in a burst, and how many come back per minute
+    capacity: int
+    per_minute: float
+
+class RateLimitSettings(BaseModel):
+    enabled: bool = True
+    key_prefix: str = 'rate_limit:'
+    # buckets kept in memory per worker while Redis is unavailable
+    local_max_keys: int = 10_000
+    # take the client ip from X-Forwarded-For, only behind a proxy that sets it
+    trust_forwarded_for: bool = False
+    login_by_ip: RateLimitRule = RateLimitRule(capacity=20, per_minute=10)
+    login_by_email: RateLimitRule = RateLimitRule(capacity=5, per_minute=2)
+    register_by_ip: RateLimitRule = RateLimitRule(capacity=5, per_minute=1)
+
+class MetricsSettings(BaseModel):
+    # GET /metrics in the Prometheus text format, counted per worker process
+    enabled: bool = True
+    latency_buckets: list[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+class TracingSettings(BaseModel):
+    enabled: bool = False
+    # share of new traces recorded; traces continued from a traceparent header follow the caller's decision
+    sample_rate: float = 0.1
+    follow_parent_sampling: bool = True
+    exporter: Literal['json_file', 'none'] = 'json_file'
+    filename: str = 'traces.jsonl'
+    batch_size: int = 64
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_nested_delimiter='__')
@@ -33,7 +168,19 @@ class Settings(BaseSettings):
     smtp: SMTPSettings
     jwt: JWTSettings
     redis: RedisSettings
+    password_hash: PasswordHashSettings = PasswordHashSettings()
+    user_cache: UserCacheSettings = UserCacheSettings()
+    access_log: AccessLogSettings = AccessLogSettings()
+    logging: LoggingSettings = LoggingSettings()
+    email_outbox: EmailOutboxSettings = EmailOutboxSettings()
+    token_denylist: TokenDenylistSettings = TokenDenylistSettings()
+    user_loader: UserLoaderSettings = UserLoaderSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    tracing: TracingSettings = TracingSettings()
     api_prefix: str = '/api/v1'
+    # X-Internal-Token of internal endpoints such as POST /users/batch, they are closed while unset
+    internal_api_token: str | None = None
     HOST: str
     PORT: int
 
@@ -1,2 +1,3 @@
-from .user_exception import UserWithEmailNotFound, UserWithEmailAlreadyExists, UserWithIdNotFound
-from .auth_exceptions import ExpiredSignatureError, InvalidTokenError, InvalidSignatureError, PasswordIsIncorrect, UserNotVerifiedEmail, InvalidTokenType, RefreshTokenDoesNotExist
\ No newline at end of file
+from .user_exception import UserWithEmailNotFound, UserWithEmailAlreadyExists, UserWithIdNotFound, SessionNotFound
+from .auth_exceptions import ExpiredSignatureError, InvalidTokenError, InvalidSignatureError, PasswordIsIncorrect, UserNotVerifiedEmail, InvalidTokenType, RefreshTokenDoesNotExist, RefreshTokenReused, TokenRevoked, InvalidInternalToken
+from .service_exceptions import ServiceUnavailable, PasswordHasherIsBusy, TooManyRequests, VerificationEmailNotQueued
\ No newline at end of file
@@ -43,3 +43,18 @@ class InvalidTokenType(AuthException):
 class RefreshTokenDoesNotExist(AuthException):
     def __init__(self):
         super().__init__("Refresh token does not exist")
+
+
+class RefreshTokenReused(AuthException):
+    def __init__(self):
+        super().__init__("Refresh token has already been used")
+
+
+class TokenRevoked(AuthException):
+    def __init__(self):
+        super().__init__("Token has been revoked")
+
+
+class InvalidInternalToken(AuthException):
+    def __init__(self):
+        super().__init__("Invalid internal token")
@@ -0,0 +1,30 @@
+from fastapi import HTTPException
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE, HTTP_429_TOO_MANY_REQUESTS
+
+
+class ServiceUnavailable(HTTPException):
+    def __init__(self, detail: str, retry_after: int = 1):
+        super().__init__(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={'Retry-After': str(retry_after)}
+        )
+
+
+class PasswordHasherIsBusy(ServiceUnavailable):
+    def __init__(self):
+        super().__init__("Too many password operations in progress, try again later")
+
+
+class VerificationEmailNotQueued(ServiceUnavailable):
+    def __init__(self):
+        super().__init__("Could not send the verification email, try to register again later")
+
+
+class TooManyRequests(HTTPException):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later",
+            headers={'Retry-After': str(retry_after)}
+        )
@@ -21,4 +21,11 @@ class UserWithIdNotFound(HTTPException):
         super().__init__(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User with this id not found"
-        )
\ No newline at end of file
+        )
+
+class SessionNotFound(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
@@ -1,14 +1,15 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from logging import getLogger
 
 import uvicorn
 from fastapi import FastAPI
 
 from app.core import db_helper
-from app.middlewares import LogginMiddleware
-from app.utils import redis_client
+from app.middlewares import LogginMiddleware, MetricsMiddleware, TracingMiddleware
+from app.utils import redis_client, password_hasher, smtp_pool, token_denylist, tracer
 from app.core import settings
-from app.api import router
+from app.api import router, well_known_router, metrics_router
 
 from logging_config import setup_logging
 
@@ -21,10 +22,17 @@ async def lifespan(app:FastAPI):
         if pong:
             main_logger.info("Redis is alive ✅")
     except Exception as e:
-        main_logger.warning(f"Redis connection failed: {e}")
+        main_logger.warning('Redis connection failed: %s', e)
+
+    # keeps this worker's copy of revoked tokens up to date
+    denylist_task = asyncio.create_task(token_denylist.run())
 
     yield
 
+    denylist_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await denylist_task
+
     # dispose connection with db
     main_logger.info('dispose connection with db')
     await db_helper.dispose()
@@ -33,14 +41,33 @@ async def lifespan(app:FastAPI):
     main_logger.info('dispose connection with redis')
     await redis_client.dispose()
 
+    # close pooled smtp connections
+    main_logger.info('close smtp connections')
+    await smtp_pool.close()
+
+    # stop password hashing workers
+    main_logger.info('shutdown password hasher pool')
+    password_hasher.shutdown()
+
+    # export the spans still buffered
+    main_logger.info('flush traces')
+    tracer.shutdown()
+
 app = FastAPI(lifespan=lifespan)
 app.include_router(router)
+app.include_router(well_known_router)
 
-app.add_middleware(LogginMiddleware)
+app.add_middleware(LogginMiddleware, **settings.access_log.model_dump())
+if settings.tracing.enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+if settings.metrics.enabled:
+    app.include_router(metrics_router)
+    # added last, so it is outermost and the access log's work is in the measured time
+    app.add_middleware(MetricsMiddleware)
 
 
 if __name__ == "__main__":
-    setup_logging()
+    setup_logging(**settings.logging.model_dump())
     main_logger.info('Server start')
     uvicorn.run('main:app', host=settings.HOST, port=settings.PORT, reload=False)
     main_logger.info('Server stopped')
\ No newline at end of file
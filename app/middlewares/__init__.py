@@ -1 +1,3 @@
-from .log_request_middleware import LogginMiddleware
\ No newline at end of file
+from .log_request_middleware import LogginMiddleware
+from .metrics_middleware import MetricsMiddleware
+from .tracing_middleware import TracingMiddleware
\ No newline at end of file
@@ -1,29 +1,122 @@
+import json
+import random
 import time
-from logging import getLogger
+from logging import getLogger, INFO
+from typing import Any
+from urllib.parse import parse_qsl, urlencode
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 log_request_logger = getLogger('project.log_request_logger')
 
-class LogginMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        start_time = time.perf_counter()
+REDACTED = '***'
 
-        try:
-            body = await request.body()
-            body_str = body.decode('utf-8') if body else None
-        except Exception:
-            body_str = "<unable to read body>"
+class LogginMiddleware:
+    """
+    Access log and X-Process-Time header as a pure ASGI middleware.
+
+    ``receive``/``send`` are wrapped, not buffered, so request and response bodies stream through
+    untouched. The request body is captured only when ``log_body`` is on or the request is picked by
+    ``body_sample_rate``, up to ``body_max_bytes``. JSON and form-urlencoded bodies are parsed and
+    logged with the values of ``redact_fields`` masked; any other body, or one cut off by the limit
+    that no longer parses, is logged as its size and content type only.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            log_body: bool = False,
+            body_sample_rate: float = 0.0,
+            body_max_bytes: int = 1024,
+            redact_fields: tuple[str, ...] | list[str] = ('password',)
+    ):
+        self.app = app
+        self.log_body = log_body
+        self.body_sample_rate = body_sample_rate
+        self.body_max_bytes = body_max_bytes
+        self.redact_fields = frozenset(field.lower() for field in redact_fields)
+
+    def _should_capture_body(self) -> bool:
+        if self.log_body:
+            return True
+        return self.body_sample_rate > 0 and random.random() < self.body_sample_rate
+
+    def _redact_value(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if key.lower() in self.redact_fields else self._redact_value(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._redact_value(item) for item in value]
+        return value
 
-        response = await call_next(request)
-        process_time = time.perf_counter() - start_time
+    def _redact(self, body: bytes, content_type: str, body_size: int) -> str:
+        media_type = content_type.partition(';')[0].strip().lower()
+        if media_type == 'application/json' or media_type.endswith('+json'):
+            try:
+                return json.dumps(self._redact_value(json.loads(body)), ensure_ascii=False)
+            except ValueError:
+                pass
+        elif media_type == 'application/x-www-form-urlencoded':
+            if len(body) < body_size:
+                # the last pair was cut off by the limit
+                body = body.rpartition(b'&')[0]
+            try:
+                pairs = parse_qsl(body.decode('utf-8'), keep_blank_values=True, strict_parsing=True)
+            except (UnicodeDecodeError, ValueError):
+                pass
+            else:
+                return urlencode([
+                    (key, REDACTED if key.lower() in self.redact_fields else value) for key, value in pairs
+                ], safe='*')
+        # multipart and everything else may hold secrets that can not be masked reliably
+        return f'<{body_size} bytes, {media_type or "no content-type"}>'
 
-        log_request_logger.info(
-            f"{request.client.host} - {request.method} {request.url.path} "
-            f"Status: {response.status_code} | Time: {process_time:.4f}s | Body: {body_str}"
-        )
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
 
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
\ No newline at end of file
+        start_time = time.perf_counter()
+        status_code = 500
+        body_chunks: list[bytes] = []
+        captured_size = 0
+        body_size = 0
+
+        async def receive_with_capture() -> Message:
+            nonlocal captured_size, body_size
+            message = await receive()
+            if message['type'] == 'http.request':
+                body = message.get('body', b'')
+                body_size += len(body)
+                if captured_size < self.body_max_bytes:
+                    chunk = body[:self.body_max_bytes - captured_size]
+                    body_chunks.append(chunk)
+                    captured_size += len(chunk)
+            return message
+
+        async def send_with_process_time(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers = MutableHeaders(scope=message)
+                headers.append('X-Process-Time', str(time.perf_counter() - start_time))
+            await send(message)
+
+        capture_body = self._should_capture_body()
+        try:
+            await self.app(scope, receive_with_capture if capture_body else receive, send_with_process_time)
+        finally:
+            if log_request_logger.isEnabledFor(INFO):
+                client = scope.get('client')
+                body = None
+                if body_size:
+                    body = self._redact(
+                        b''.join(body_chunks), Headers(scope=scope).get('content-type', ''), body_size
+                    )
+                log_request_logger.info(
+                    '%s - %s %s Status: %s | Time: %.4fs | Body: %s',
+                    client[0] if client else '-', scope['method'], scope['path'],
+                    status_code, time.perf_counter() - start_time, body
+                )
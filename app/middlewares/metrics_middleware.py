@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import request_duration, requests_in_progress
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class MetricsMiddleware:
+    """
+    Request latency histogram and in-flight gauge per method and route template, as a pure ASGI middleware.
+
+    Routes are labelled by their path template (``/api/v1/users/me/sessions/{session_id}``), not the
+    requested path, so ids do not make a new series each. Requests no route matches share one label.
+    Templates of the ``cache_size`` most recent method and path pairs are kept, matching every route
+    costs more than the rest of the middleware.
+    """
+    def __init__(self, app: ASGIApp, cache_size: int = 1024):
+        self.app = app
+        self.cache_size = cache_size
+        self._templates: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+    def _cached_route_template(self, scope: Scope) -> str:
+        key = (scope['method'], scope['path'])
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = self._route_template(scope)
+            if len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        else:
+            self._templates.move_to_end(key)
+        return template
+
+    @staticmethod
+    def _route_template(scope: Scope) -> str:
+        partial = None
+        for route in scope['app'].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                # the path matches but not the method, the router answers 405 for it
+                partial = route.path
+        return partial or UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        route = self._cached_route_template(scope)
+        in_progress = requests_in_progress.labels(method, route)
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            request_duration.labels(method, route, str(status_code)).observe(time.perf_counter() - start_time)
@@ -0,0 +1,46 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.tracing import Tracer
+
+
+class TracingMiddleware:
+    """
+    Root span of every request as a pure ASGI middleware, continuing the trace of a traceparent header.
+
+    The span is renamed to the matched route template once routing is done. Recorded requests get
+    their trace id in the X-Trace-Id response header, to find them in the exported spans.
+    """
+    def __init__(self, app: ASGIApp, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = Headers(scope=scope).get('traceparent')
+        with self.tracer.start_span(
+                f'{scope["method"]} {scope["path"]}',
+                {'http.method': scope['method'], 'http.target': scope['path']},
+                traceparent=traceparent
+        ) as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message: Message) -> None:
+                if message['type'] == 'http.response.start':
+                    span.set_attribute('http.status_code', message['status'])
+                    MutableHeaders(scope=message).append('X-Trace-Id', span.trace_id)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                # FastAPI puts the matched route in the scope
+                route = scope.get('route')
+                if route is not None:
+                    span.name = f'{scope["method"]} {route.path}'
+                    span.set_attribute('http.route', route.path)
@@ -1,3 +1,3 @@
-from .user_schemas import CreateUserSchema, OutputUserSchema
-from .auth_schemas import LoginUserSchema, LoginOutputSchema
+from .user_schemas import CreateUserSchema, OutputUserSchema, UsersBatchSchema
+from .auth_schemas import LoginUserSchema, LoginOutputSchema, SessionSchema
 from .error_response_schemas import ErrorResponse
\ No newline at end of file
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from sqlmodel import SQLModel
 
 
@@ -8,4 +11,11 @@ class LoginUserSchema(SQLModel):
 class LoginOutputSchema(SQLModel):
     refresh_token: str
     access_token: str
-    token_type: str
\ No newline at end of file
+    token_type: str
+
+class SessionSchema(SQLModel):
+    id: str
+    created_at: datetime
+    last_used_at: datetime
+    user_agent: Optional[str] = None
+    current: bool = False
@@ -1,4 +1,6 @@
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, Field
+
+MAX_USERS_BATCH_SIZE = 1000
 
 
 class __BaseUserSchema(SQLModel):
@@ -13,3 +15,6 @@ class OutputUserSchema(__BaseUserSchema):
     id: int
     is_verified: bool
 
+class UsersBatchSchema(SQLModel):
+    ids: list[int] = Field(default=[], max_length=MAX_USERS_BATCH_SIZE)
+    emails: list[str] = Field(default=[], max_length=MAX_USERS_BATCH_SIZE)
@@ -1,3 +1,4 @@
-from .user_service import create_user,get_user_by_id, get_user_by_email
-from .email_service import send_email
-from .auth_service import register_user, verify_user, login_user, refresh_pair_of_tokens
+from .user_service import create_user,get_user_by_id, get_user_by_email, get_users_batch
+from .email_service import send_email, send_verification_email
+from .auth_service import register_user, verify_user, login_user, refresh_pair_of_tokens, logout_user, \
+    get_user_sessions, revoke_user_session, revoke_other_user_sessions
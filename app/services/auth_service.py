@@ -1,56 +1,45 @@
+import asyncio
 import datetime
 import enum
+import uuid
 from logging import getLogger
 from typing import Optional, Any
 
 from fastapi.security import HTTPAuthorizationCredentials
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.background import BackgroundTasks
 
-from app.core import settings
-from app.exceptions import UserWithEmailAlreadyExists, UserWithEmailNotFound, PasswordIsIncorrect, \
-    RefreshTokenDoesNotExist
+from app.core import settings, db_helper
+from app.exceptions import UserWithEmailNotFound, PasswordIsIncorrect, RefreshTokenDoesNotExist, RefreshTokenReused, \
+    InvalidTokenType, SessionNotFound, PasswordHasherIsBusy, VerificationEmailNotQueued
 from app.models import User
-from app.schemas import CreateUserSchema, OutputUserSchema, LoginUserSchema, LoginOutputSchema
-from app.services import send_email, create_user, get_user_by_id
+from app.schemas import CreateUserSchema, OutputUserSchema, LoginUserSchema, LoginOutputSchema, SessionSchema
+from app.services import create_user, get_user_by_id
 from app.services import get_user_by_email
-from app.services.user_service import change_user_verify_status
-from app.utils import generate_email_verify_token, generate_verify_link, decode_jwt_token, password_is_correct, \
-    create_token, redis_client
-from app.utils import hash_password
+from app.services.user_service import change_user_verify_status, update_user_password_hash, delete_user
+from app.utils import decode_jwt_token, password_hasher, create_token, email_outbox, token_denylist, refresh_sessions
+from app.utils.tracing import traced
 
 
 auth_service_logger = getLogger('project.auth_service')
 
+# rehash tasks outlive the login request, the references keep them from being garbage collected
+_background_tasks: set[asyncio.Task] = set()
+
 class TokenType(enum.Enum):
     ACCESS = 'access'
     REFRESH = 'refresh'
 
-def __generate_and_send_email_verify_link(email: str, user_id: int):
-    auth_service_logger.info('Call send email function in background tasks')
-
-    token = generate_email_verify_token({'sub': email,'user_id': user_id})
-    link = generate_verify_link(token)
-    send_email(email, 'Confirm email',
-               body=f"Hello press the link to confirm your gmail: {link}")
-
-    auth_service_logger.info('Call send email function in background tasks finished')
-
-async def register_user(user: CreateUserSchema, session: AsyncSession, background_tasks: BackgroundTasks) -> OutputUserSchema:
+@traced()
+async def register_user(user: CreateUserSchema, session: AsyncSession) -> OutputUserSchema:
     auth_service_logger.info('Register user')
 
-    auth_service_logger.info('Checking is user with email already exists')
-    exists_user: Optional[User] = await get_user_by_email(user.email, session)
-
-    if exists_user is not None:
-        auth_service_logger.error('User with same email already exists')
-        raise UserWithEmailAlreadyExists
-
-    hashed_password: bytes = hash_password(user.password)
+    hashed_password: bytes = await password_hasher.hash_password(user.password)
     hashed_password: str = hashed_password.decode()
 
     auth_service_logger.info('Call create user method')
 
+    # raises UserWithEmailAlreadyExists when the email is taken
     created_user: Optional[User] = await create_user(
         session,
         User(
@@ -61,11 +50,20 @@ async def register_user(user: CreateUserSchema, session: AsyncSession, backgroun
 
     auth_service_logger.info('Create user method finished')
 
-    background_tasks.add_task(__generate_and_send_email_verify_link, created_user.email, created_user.id)
+    try:
+        # the email itself is sent by the email worker (python -m app.workers.email)
+        await email_outbox.enqueue_verification_email(created_user.email, created_user.id)
+    except RedisError as e:
+        # without the job the user could never verify, nor register again with the same email:
+        # the user is removed and the request fails, so the client can simply retry it
+        auth_service_logger.exception('Could not enqueue verification email, remove the user')
+        await delete_user(session, created_user)
+        raise VerificationEmailNotQueued from e
 
     auth_service_logger.info('Register function is end')
     return OutputUserSchema(**created_user.model_dump())
 
+@traced()
 async def verify_user(token: str, session: AsyncSession) -> OutputUserSchema:
     auth_service_logger.info('Verifying user')
     payload: dict[str, Any] = decode_jwt_token(
@@ -77,16 +75,51 @@ async def verify_user(token: str, session: AsyncSession) -> OutputUserSchema:
     auth_service_logger.info('User verifying status changed to True')
     return OutputUserSchema(**user.model_dump())
 
-def _generate_pair_token(user_id: int) -> dict[str, str]:
+def _user_claims(user: User) -> dict[str, Any]:
+    return {
+        'usr': {
+            'name': user.name,
+            'email': user.email,
+            'avatar_url': user.avatar_url,
+            'is_verified': user.is_verified,
+        },
+        'ucv': settings.jwt.user_claims_version,
+    }
+
+def _is_claims_version_actual(payload: dict[str, Any]) -> bool:
+    return (
+        settings.jwt.user_claims_in_access_token
+        and 'usr' in payload
+        and payload.get('ucv') == settings.jwt.user_claims_version
+    )
+
+def get_user_from_claims(payload: dict[str, Any]) -> Optional[OutputUserSchema]:
+    """Build the user from verified token claims, None means the caller has to go to the database"""
+    if not _is_claims_version_actual(payload):
+        return None
+    return OutputUserSchema(id=int(payload['sub']), **payload['usr'])
+
+@traced()
+def _generate_pair_token(
+        user_id: int,
+        user_claims: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None
+) -> dict[str, str]:
     payload = {
         'sub': f'{user_id}',
+        **(user_claims or {}),
     }
+    if session_id is not None:
+        payload['sid'] = session_id
+    refresh_jti = uuid.uuid4().hex
 
     access_token = create_token(
         payload={
             **payload,
             'exp': datetime.datetime.now(datetime.UTC) + settings.jwt.access_token_expire_minutes,
             'type': TokenType.ACCESS.value,
+            # lets the token be revoked before it expires, see token_denylist
+            'jti': uuid.uuid4().hex,
         }
     )
     refresh_token = create_token(
@@ -94,35 +127,55 @@ def _generate_pair_token(user_id: int) -> dict[str, str]:
             **payload,
             'exp': datetime.datetime.now(datetime.UTC) + settings.jwt.refresh_token_expire_minutes,
             'type': TokenType.REFRESH.value,
+            # makes every refresh token unique, so a replayed one can be told from the current one
+            'jti': refresh_jti,
         }
     )
     return {
         'access_token': access_token,
-        'refresh_token': refresh_token
+        'refresh_token': refresh_token,
+        'refresh_jti': refresh_jti,
     }
 
-async def login_user(user_login: LoginUserSchema, session: AsyncSession) -> LoginOutputSchema:
+@traced()
+async def login_user(
+        user_login: LoginUserSchema,
+        session: AsyncSession,
+        user: Optional[User] = None,
+        user_agent: Optional[str] = None
+) -> LoginOutputSchema:
     auth_service_logger.info('Login user')
     email, password = user_login.email, user_login.password
 
-    user = await get_user_by_email(email, session)
+    if user is None:
+        user = await get_user_by_email(email, session, with_password_hash=True)
+
     if user is None:
         auth_service_logger.error('User with this email is not exists')
         raise UserWithEmailNotFound
 
     user_password = user.password_hash
 
-    is_password_correct:bool = password_is_correct(password.encode(), user_password.encode())
-    auth_service_logger.debug(f'{is_password_correct=}')
+    is_password_correct:bool = await password_hasher.password_is_correct(password.encode(), user_password.encode())
+    auth_service_logger.debug('is_password_correct=%s', is_password_correct)
 
     if not is_password_correct:
         auth_service_logger.error('Password is incorrect')
         raise PasswordIsIncorrect
 
-    pair_token = _generate_pair_token(user.id)
+    if password_hasher.needs_rehash(user_password.encode()):
+        # the plaintext is only known now, the response does not wait for the new hash
+        task = asyncio.create_task(_rehash_password(user, password))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
-    auth_service_logger.info('Set data in redis')
-    await redis_client.set_data(f'refresh_token:{user.id}', pair_token['refresh_token'], settings.jwt.refresh_token_expire_minutes)
+    user_claims = _user_claims(user) if settings.jwt.user_claims_in_access_token else None
+    # every login is a new session, logins on other devices keep theirs
+    session_id = uuid.uuid4().hex
+    pair_token = _generate_pair_token(user.id, user_claims, session_id)
+
+    auth_service_logger.info('Create refresh session in redis')
+    await refresh_sessions.create(user.id, session_id, pair_token['refresh_jti'], user_agent)
 
     return LoginOutputSchema(
         refresh_token = pair_token['refresh_token'],
@@ -130,24 +183,48 @@ async def login_user(user_login: LoginUserSchema, session: AsyncSession) -> Logi
         token_type = 'Bearer'
     )
 
-async def _is_refresh_token_exists(user_id: int) -> str | None:
-    return await redis_client.get_data(f'refresh_token:{user_id}')
+@traced()
+async def _rehash_password(user: User, password: str) -> None:
+    auth_service_logger.info('Rehash password with the current algorithm and cost')
+    try:
+        password_hash: bytes = await password_hasher.hash_password(password)
+        async with db_helper.session_factory() as session:
+            await update_user_password_hash(user, password_hash.decode(), session)
+    except PasswordHasherIsBusy:
+        auth_service_logger.warning('Password hasher is busy, rehash on a later login')
+    except Exception:
+        auth_service_logger.exception('Password rehash failed')
+
+@traced()
+async def _rotate_refresh_session(user_id: int, session_id: Optional[str], presented_jti: str, new_jti: str) -> None:
+    if session_id is None:
+        raise RefreshTokenDoesNotExist
+
+    # one script call compares the session's refresh token, swaps in the new one and extends the TTL
+    result = await refresh_sessions.rotate(user_id, session_id, presented_jti, new_jti)
+    if result == 0:
+        raise RefreshTokenDoesNotExist
+    if result == -1:
+        auth_service_logger.warning('Refresh token reuse detected, session of user %s is revoked', user_id)
+        raise RefreshTokenReused
 
 
+@traced()
 async def refresh_pair_of_tokens(credentials: HTTPAuthorizationCredentials) -> LoginOutputSchema:
     token = credentials.credentials
     payload = decode_jwt_token(token)
+    # an access token must not reach the rotation, it would be taken for a reused refresh token
+    if payload.get('type') != TokenType.REFRESH.value:
+        raise InvalidTokenType
     user_id = int(payload.get('sub'))
 
-    exists_refresh_token = await _is_refresh_token_exists(user_id)
-
-    if exists_refresh_token is None:
-        raise RefreshTokenDoesNotExist
-
-    new_pair_token = _generate_pair_token(user_id)
+    # claims are carried over from the refresh token, stale ones are dropped
+    user_claims = {'usr': payload['usr'], 'ucv': payload['ucv']} if _is_claims_version_actual(payload) else None
+    session_id = payload.get('sid')
+    new_pair_token = _generate_pair_token(user_id, user_claims, session_id)
 
-    auth_service_logger.info('Refresh all tokens and save new refresh to redis')
-    await redis_client.set_data(f'refresh_token:{user_id}', new_pair_token['refresh_token'], settings.jwt.refresh_token_expire_minutes)
+    auth_service_logger.info('Rotate refresh token in redis')
+    await _rotate_refresh_session(user_id, session_id, payload.get('jti'), new_pair_token['refresh_jti'])
 
 
     return LoginOutputSchema(
@@ -156,8 +233,45 @@ async def refresh_pair_of_tokens(credentials: HTTPAuthorizationCredentials) -> L
         token_type='Bearer'
     )
 
+@traced()
+async def logout_user(credentials: HTTPAuthorizationCredentials) -> None:
+    payload = decode_jwt_token(credentials.credentials)
+    if payload.get('type') != TokenType.ACCESS.value:
+        raise InvalidTokenType
+    user_id = int(payload.get('sub'))
 
-
-
-
-
+    auth_service_logger.info('Logout user, revoke access token and its refresh session')
+    if 'jti' in payload:
+        await token_denylist.revoke(payload['jti'], payload['exp'])
+    if 'sid' in payload:
+        await refresh_sessions.revoke(user_id, [payload['sid']])
+
+@traced()
+async def get_user_sessions(payload: dict[str, Any]) -> list[SessionSchema]:
+    current_session_id = payload.get('sid')
+    sessions = await refresh_sessions.get_all(int(payload['sub']))
+    return [
+        SessionSchema(
+            id=session.id,
+            created_at=datetime.datetime.fromtimestamp(session.created_at, datetime.UTC),
+            last_used_at=datetime.datetime.fromtimestamp(session.last_used_at, datetime.UTC),
+            user_agent=session.user_agent,
+            current=session.id == current_session_id,
+        )
+        for session in sessions
+    ]
+
+@traced()
+async def revoke_user_session(payload: dict[str, Any], session_id: str) -> None:
+    auth_service_logger.info('Revoke refresh session')
+    if not await refresh_sessions.revoke(int(payload['sub']), [session_id]):
+        raise SessionNotFound
+
+@traced()
+async def revoke_other_user_sessions(payload: dict[str, Any]) -> int:
+    """Revoke every session except the one the access token belongs to, return how many were revoked"""
+    user_id = int(payload['sub'])
+    current_session_id = payload.get('sid')
+    sessions = await refresh_sessions.get_all(user_id)
+    auth_service_logger.info('Revoke other refresh sessions')
+    return await refresh_sessions.revoke(user_id, [session.id for session in sessions if session.id != current_session_id])
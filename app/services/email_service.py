@@ -1,22 +1,19 @@
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from logging import getLogger
+
 from app.core import settings
+from app.utils import smtp_pool, generate_email_verify_token, generate_verify_link
+from app.utils.tracing import traced
 
 email_sender_logger = getLogger('project.email_sender_service')
 
-def send_email(
+@traced()
+async def send_email(
                receiver_email: str,
                subject: str,
                body: str,
-               sender_email: str = settings.smtp.sender_email,
-               smtp_server: str = settings.smtp.smtp_server,
-               smtp_port: int = settings.smtp.smtp_port,
-               login: str = settings.smtp.smtp_login,
-               password: str = settings.smtp.smtp_password):
-
-    server = None
+               sender_email: str = settings.smtp.sender_email):
 
     msg = MIMEMultipart()
     msg['From'] = sender_email
@@ -26,13 +23,18 @@ def send_email(
 
     try:
         email_sender_logger.info('Trying to send email')
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        server.login(login, password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
+        await smtp_pool.send(msg)
         email_sender_logger.info('Email successfully sent')
     except Exception:
         email_sender_logger.exception('Problem with sending email: ')
         raise
-    finally:
-        if server:
-            server.quit()
+
+@traced()
+async def send_verification_email(email: str, user_id: int):
+    email_sender_logger.info('Send email verify link')
+
+    # the token is generated at send time, so a job waiting in the outbox does not send an expired link
+    token = generate_email_verify_token({'sub': email,'user_id': user_id})
+    link = generate_verify_link(token)
+    await send_email(email, 'Confirm email',
+               body=f"Hello press the link to confirm your gmail: {link}")
@@ -1,40 +1,169 @@
+import asyncio
 from logging import getLogger
-from typing import Optional
+from typing import Any, Callable, Optional
 
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from sqlalchemy import ARRAY, Integer, String, any_, bindparam, delete, Select
+from sqlmodel import select, update
 
+from app.core import settings
+from app.core.db_helper import db_helper
+from app.exceptions import UserWithEmailAlreadyExists
 from app.models import User
+from app.utils.user_cache import user_cache, MISSING
+from app.utils.tracing import traced
 
 user_service_logger = getLogger('project.user_service')
 
-async def get_user_by_email(email: str, session: AsyncSession) -> Optional[User]:
+# built once: SQLAlchemy compiles each of them a single time and asyncpg prepares it once per connection,
+# every lookup only binds new values
+USER_BY_EMAIL_STMT = select(User).where(User.email == bindparam('email'))
+USER_BY_ID_STMT = select(User).where(User.id == bindparam('user_id'))
+
+
+def _users_by_keys_stmt(column, item_type) -> Select:
+    # "= ANY(array)" is one statement for any number of keys, so Postgres and asyncpg prepare it once;
+    # other databases get an expanding IN
+    if db_helper.engine.dialect.name == 'postgresql':
+        return select(User).where(column == any_(bindparam('keys', type_=ARRAY(item_type))))
+    return select(User).where(column.in_(bindparam('keys', expanding=True)))
+
+
+class UserLoader:
+    """
+    Collects the lookups made within one event loop tick and loads them with a single query.
+
+    Concurrent lookups of the same key share one pending result (single-flight). Batches use their
+    own short session, so a hundred concurrent lookups take one pool connection instead of a hundred.
+    """
+    def __init__(
+            self,
+            attribute: str,
+            statement: Select,
+            cache_key: Callable[[Any], str],
+            max_batch_size: int = 500
+    ):
+        self.attribute = attribute
+        self.statement = statement
+        self.cache_key = cache_key
+        self.max_batch_size = max_batch_size
+        self._pending: dict[Any, asyncio.Future] = {}
+        self._queue: list[Any] = []
+        self._dispatch_scheduled = False
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.keys_loaded = 0
+
+    async def load(self, key: Any) -> Optional[User]:
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            self._queue.append(key)
+            if not self._dispatch_scheduled:
+                self._dispatch_scheduled = True
+                loop.call_soon(self._dispatch)
+        # a cancelled caller must not cancel the result other callers wait for
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        keys, self._queue = self._queue, []
+        for start in range(0, len(keys), self.max_batch_size):
+            task = asyncio.create_task(self._load_batch(keys[start:start + self.max_batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @traced()
+    async def _load_batch(self, keys: list[Any]) -> None:
+        user_service_logger.debug('Load a batch of %s users', len(keys))
+        self.batches += 1
+        self.keys_loaded += len(keys)
+        try:
+            async with db_helper.session_factory() as session:
+                users = await db_helper.read_all(
+                    session, self.statement, {'keys': keys}, sticky_keys=[self.cache_key(key) for key in keys]
+                )
+        except Exception as e:
+            user_service_logger.exception('Exception with db:')
+            for key in keys:
+                self._pending.pop(key).set_exception(e)
+            return
+
+        found = {getattr(user, self.attribute): user for user in users}
+        for key in keys:
+            self._pending.pop(key).set_result(found.get(key))
+
+
+def _use_loader(session: AsyncSession) -> bool:
+    # a session in the middle of a transaction reads through itself, so it sees its own uncommitted rows
+    return settings.user_loader.enabled and not session.in_transaction()
+
+
+user_by_id_loader = UserLoader(
+    'id',
+    _users_by_keys_stmt(User.id, Integer),
+    user_cache.id_key,
+    max_batch_size=settings.user_loader.max_batch_size,
+)
+user_by_email_loader = UserLoader(
+    'email',
+    _users_by_keys_stmt(User.email, String),
+    user_cache.email_key,
+    max_batch_size=settings.user_loader.max_batch_size,
+)
+
+@traced()
+async def get_user_by_email(email: str, session: AsyncSession, with_password_hash: bool = False) -> Optional[User]:
+    """Cached users have no password hash, ``with_password_hash`` reads the row from the database"""
     user_service_logger.info("Getting user by email")
-    try:
+    cache_key = user_cache.email_key(email)
+    if not with_password_hash:
+        cached_user = await user_cache.get(cache_key)
+        if cached_user is not MISSING:
+            user_service_logger.info("Return User by email from cache")
+            return cached_user
 
-        stmt = select(User).where(User.email == email)
+    try:
 
         user_service_logger.info("Make query to db, try to find user by email")
-        user: Optional[User] = await session.scalar(stmt)
+        if _use_loader(session):
+            user: Optional[User] = await user_by_email_loader.load(email)
+        else:
+            user: Optional[User] = await db_helper.read_scalar(
+                session, USER_BY_EMAIL_STMT, {'email': email}, sticky_key=cache_key
+            )
 
     except SQLAlchemyError:
         user_service_logger.exception("Some problem with db: ")
         raise
 
-    user_service_logger.info(f"Return User by email {user}")
+    await user_cache.set(cache_key, user)
+    user_service_logger.info("Return User by email, id=%s", user.id if user else None)
     return user
 
 
 
+def _insert_user_stmt(session: AsyncSession, user: User):
+    dialect_insert = sqlite.insert if session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+    return (
+        dialect_insert(User)
+        .values(**user.model_dump(exclude={'id'}))
+        .on_conflict_do_nothing(index_elements=['email'])
+        .returning(User)
+    )
+
+@traced()
 async def create_user(session: AsyncSession, user: User) -> User:
     user_service_logger.info('save user to db')
     try:
-        user = User(**user.model_dump())
-
-        session.add(user)
+        # one round trip: the email conflict is resolved by the unique constraint instead of a SELECT beforehand
+        created_user: Optional[User] = await session.scalar(_insert_user_stmt(session, user))
         await session.commit()
-        await session.refresh(user)
 
     except IntegrityError as e:
         user_service_logger.exception('Integrity error')
@@ -47,31 +176,112 @@ async def create_user(session: AsyncSession, user: User) -> User:
         user_service_logger.exception('Some problem with DB')
         await session.rollback()
 
-        user_service_logger.info(f'Session rollback')
+        user_service_logger.info('Session rollback')
         raise e
 
+    if created_user is None:
+        user_service_logger.error('User with same email already exists')
+        raise UserWithEmailAlreadyExists
+
+    db_helper.mark_written(user_cache.email_key(created_user.email), user_cache.id_key(created_user.id))
+    await user_cache.invalidate(created_user)
+
     user_service_logger.info('commit query to db, user successfully created')
-    return user
+    return created_user
 
+async def delete_user(session: AsyncSession, user: User) -> None:
+    user_service_logger.info('delete user from db')
+    try:
+        await session.execute(delete(User).where(User.id == user.id))
+        await session.commit()
+    except SQLAlchemyError as e:
+        user_service_logger.exception('Some problem with DB')
+        await session.rollback()
+
+        user_service_logger.info('Session rollback')
+        raise e
+
+    db_helper.mark_written(user_cache.email_key(user.email), user_cache.id_key(user.id))
+    await user_cache.invalidate(user)
 
 
+
+@traced()
 async def get_user_by_id(user_id:int, session: AsyncSession) -> User:
     user_service_logger.info('Getting a user by id')
+    cache_key = user_cache.id_key(user_id)
+    cached_user = await user_cache.get(cache_key)
+    if cached_user is not MISSING:
+        user_service_logger.info('Returning user by id from cache')
+        return cached_user
+
     try:
-        user: Optional[User] = await session.get(User, user_id)
+        if _use_loader(session):
+            user: Optional[User] = await user_by_id_loader.load(user_id)
+        else:
+            user: Optional[User] = await db_helper.read_scalar(
+                session, USER_BY_ID_STMT, {'user_id': user_id}, sticky_key=cache_key
+            )
     except SQLAlchemyError as e:
         user_service_logger.exception('Exception with db:')
         raise e
 
+    await user_cache.set(cache_key, user)
     user_service_logger.info('Returning user by id')
     return user
 
+@traced()
 async def change_user_verify_status(user: User, session: AsyncSession):
     user_service_logger.info('Change user is_verify status')
     try:
+        # the user may come from the cache and not be attached to this session
+        stmt = update(User).where(User.id == user.id).values(is_verified=True)
+        await session.execute(stmt)
+        await session.commit()
         user.is_verified = True
         user_service_logger.info('user is_verify status changed')
+    except SQLAlchemyError as e:
+        user_service_logger.exception('Exception with db:')
+        raise e
+
+    db_helper.mark_written(user_cache.email_key(user.email), user_cache.id_key(user.id))
+    await user_cache.invalidate(user)
+
+@traced()
+async def update_user_password_hash(user: User, password_hash: str, session: AsyncSession) -> bool:
+    """Replace the hash the user was loaded with, False when the password was changed in the meantime"""
+    user_service_logger.info('Update user password hash')
+    try:
+        stmt = (
+            update(User)
+            .where(User.id == user.id, User.password_hash == user.password_hash)
+            .values(password_hash=password_hash)
+        )
+        result = await session.execute(stmt)
         await session.commit()
     except SQLAlchemyError as e:
         user_service_logger.exception('Exception with db:')
         raise e
+
+    db_helper.mark_written(user_cache.email_key(user.email), user_cache.id_key(user.id))
+    await user_cache.invalidate(user)
+    return result.rowcount == 1
+
+@traced()
+async def get_users_batch(user_ids: list[int], emails: list[str]) -> list[User]:
+    """Users with any of the ids or emails, cache misses of both kinds are loaded with one query each"""
+    user_service_logger.info('Getting a batch of users')
+    keys = [(user_by_id_loader, user_id) for user_id in dict.fromkeys(user_ids)]
+    keys += [(user_by_email_loader, email) for email in dict.fromkeys(emails)]
+    cache_keys = [loader.cache_key(key) for loader, key in keys]
+
+    results = await user_cache.get_many(cache_keys)
+    missing = [index for index, result in enumerate(results) if result is MISSING]
+    # every miss is asked for in the same tick, so the loaders send one query per kind of key
+    loaded = await asyncio.gather(*(keys[index][0].load(keys[index][1]) for index in missing))
+    for index, user in zip(missing, loaded):
+        results[index] = user
+    await asyncio.gather(*(user_cache.set(cache_keys[index], user) for index, user in zip(missing, loaded)))
+
+    users = {user.id: user for user in results if user is not None}
+    return list(users.values())
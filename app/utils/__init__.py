@@ -1,4 +1,11 @@
 from .jwt_token import generate_email_verify_token, decode_jwt_token, create_token
 from .generate_links import generate_verify_link
-from .password import hash_password, password_is_correct
+from .password import hash_password, password_is_correct, password_hasher
 from .redis_client import redis_client
+from .user_cache import user_cache
+from .smtp_pool import smtp_pool
+from .email_outbox import email_outbox
+from .token_denylist import token_denylist
+from .refresh_sessions import refresh_sessions
+from .rate_limiter import rate_limiter
+from .tracing import tracer
@@ -0,0 +1,163 @@
+import json
+import random
+import time
+from dataclasses import dataclass
+from logging import getLogger
+
+from redis.exceptions import RedisError, ResponseError
+
+from app.core import settings
+from app.utils.redis_client import RedisClient, redis_client
+from app.utils.tracing import tracer
+
+email_outbox_logger = getLogger('project.email_outbox')
+
+# moves retries that are due back to the stream, atomically so no job is lost or duplicated
+MOVE_DUE_RETRIES_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, raw_job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], raw_job)
+    local job = cjson.decode(raw_job)
+    redis.call(
+        'XADD', KEYS[2], '*', 'kind', job.kind, 'email', job.email, 'user_id', job.user_id, 'attempts', job.attempts,
+        'traceparent', job.traceparent or ''
+    )
+end
+return #due
+"""
+
+
+@dataclass
+class EmailJob:
+    id: str
+    kind: str
+    email: str
+    user_id: int
+    attempts: int = 0
+    # trace of the request that enqueued the job, the worker continues it
+    traceparent: str = ''
+
+    @classmethod
+    def from_entry(cls, entry_id: str, fields: dict[str, str]) -> 'EmailJob':
+        return cls(
+            id=entry_id,
+            kind=fields['kind'],
+            email=fields['email'],
+            user_id=int(fields['user_id']),
+            attempts=int(fields.get('attempts', 0)),
+            traceparent=fields.get('traceparent', ''),
+        )
+
+    def fields(self) -> dict[str, str | int]:
+        return {
+            'kind': self.kind,
+            'email': self.email,
+            'user_id': self.user_id,
+            'attempts': self.attempts,
+            'traceparent': self.traceparent,
+        }
+
+
+class EmailOutbox:
+    """
+    Durable queue of emails to send, kept in a Redis stream with a consumer group.
+
+    Jobs stay pending in the group until a worker acknowledges them, failed jobs wait in a sorted set
+    scored by their next attempt time and jobs out of attempts end up in the dead-letter stream.
+    """
+    def __init__(
+            self,
+            redis: RedisClient,
+            stream: str,
+            group: str,
+            retry_key: str,
+            dead_letter_stream: str,
+            max_attempts: int = 5,
+            backoff_base_seconds: float = 2,
+            backoff_max_seconds: float = 300
+    ):
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.retry_key = retry_key
+        self.dead_letter_stream = dead_letter_stream
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._move_due_retries = redis.register_script(MOVE_DUE_RETRIES_SCRIPT)
+
+        self.enqueue_failures = 0
+
+    async def enqueue(self, kind: str, email: str, user_id: int) -> str:
+        email_outbox_logger.info('Enqueue email job')
+        job = EmailJob(id='*', kind=kind, email=email, user_id=user_id, traceparent=tracer.current_traceparent() or '')
+        try:
+            return await self.redis.redis_client.xadd(self.stream, job.fields())
+        except RedisError:
+            self.enqueue_failures += 1
+            raise
+
+    async def enqueue_verification_email(self, email: str, user_id: int) -> str:
+        return await self.enqueue('verify_email', email, user_id)
+
+    async def ensure_group(self):
+        try:
+            await self.redis.redis_client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def read_batch(self, consumer: str, count: int, block_ms: int) -> list[EmailJob]:
+        response = await self.redis.redis_client.xreadgroup(
+            self.group, consumer, {self.stream: '>'}, count=count, block=block_ms
+        )
+        return [
+            EmailJob.from_entry(entry_id, fields)
+            for _, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> list[EmailJob]:
+        _, entries, *_ = await self.redis.redis_client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=min_idle_ms, start_id='0-0', count=count
+        )
+        return [EmailJob.from_entry(entry_id, fields) for entry_id, fields in entries if fields]
+
+    async def move_due_retries(self, limit: int = 100) -> int:
+        return await self.redis.run_script(
+            self._move_due_retries, keys=[self.retry_key, self.stream], args=[time.time(), limit], name='move_due_retries'
+        )
+
+    async def ack(self, job: EmailJob):
+        async with self.redis.pipeline(name='email_ack') as pipe:
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_base_seconds * 2 ** (attempts - 1), self.backoff_max_seconds)
+        return delay * random.uniform(0.5, 1)
+
+    async def fail(self, job: EmailJob, error: str):
+        """Acknowledge a failed job and schedule its retry, or dead-letter it when out of attempts"""
+        attempts = job.attempts + 1
+        async with self.redis.pipeline(name='email_fail') as pipe:
+            if attempts >= self.max_attempts:
+                email_outbox_logger.error('Email job is out of attempts, move it to dead letter stream')
+                pipe.xadd(self.dead_letter_stream, {**job.fields(), 'attempts': attempts, 'error': error})
+            else:
+                retry_job = {**job.fields(), 'attempts': attempts}
+                pipe.zadd(self.retry_key, {json.dumps(retry_job): time.time() + self.backoff(attempts)})
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+
+
+email_outbox = EmailOutbox(
+    redis_client,
+    stream=settings.email_outbox.stream,
+    group=settings.email_outbox.group,
+    retry_key=settings.email_outbox.retry_key,
+    dead_letter_stream=settings.email_outbox.dead_letter_stream,
+    max_attempts=settings.email_outbox.max_attempts,
+    backoff_base_seconds=settings.email_outbox.backoff_base_seconds,
+    backoff_max_seconds=settings.email_outbox.backoff_max_seconds,
+)
@@ -0,0 +1,86 @@
+import json
+from dataclasses import dataclass
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Optional
+
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+
+from app.core import settings
+from app.core.settings import JWTKeySettings
+
+jwt_keys_logger = getLogger('project.jwt_keys')
+
+JWK_EXPORTERS = {
+    'RS256': RSAAlgorithm,
+    'ES256': ECAlgorithm,
+    'EdDSA': OKPAlgorithm,
+}
+
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    # parsed key objects, PyJWT uses them as is instead of parsing PEM on every call
+    private_key: Optional[Any]
+    public_key: Any
+
+    def jwk(self) -> dict[str, Any]:
+        return {
+            **JWK_EXPORTERS[self.algorithm].to_jwk(self.public_key, as_dict=True),
+            'kid': self.kid,
+            'alg': self.algorithm,
+            'use': 'sig',
+        }
+
+
+class JWTKeyring:
+    """
+    Asymmetric keys tokens are signed and verified with, looked up by the ``kid`` header.
+
+    The first active key signs new tokens, retiring keys only verify tokens issued before the rotation.
+    An empty keyring means tokens are signed with the shared ``jwt.secret_key``.
+    """
+    def __init__(self, keys: list[SigningKey], active_kid: Optional[str] = None):
+        self._keys = {key.kid: key for key in keys}
+        self.active: Optional[SigningKey] = self._keys[active_kid] if active_kid else None
+        if self.active is not None and self.active.private_key is None:
+            raise ValueError(f'Active JWT key {active_kid} has no private key')
+
+        self.jwks: dict[str, Any] = {'keys': [key.jwk() for key in keys]}
+        # served as is by /.well-known/jwks.json
+        self.jwks_json: bytes = json.dumps(self.jwks).encode()
+
+    def __bool__(self) -> bool:
+        return self.active is not None
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        return self._keys.get(kid) if kid else None
+
+    @classmethod
+    def from_settings(cls, keys_settings: list[JWTKeySettings]) -> 'JWTKeyring':
+        keys: list[SigningKey] = []
+        active_kid = None
+        for key_settings in keys_settings:
+            jwt_keys_logger.info('Load JWT key %s', key_settings.kid)
+            private_key = None
+            if key_settings.private_key_path:
+                private_key = load_pem_private_key(Path(key_settings.private_key_path).read_bytes(), password=None)
+                public_key = private_key.public_key()
+            elif key_settings.public_key_path:
+                public_key = load_pem_public_key(Path(key_settings.public_key_path).read_bytes())
+            else:
+                raise ValueError(f'JWT key {key_settings.kid} needs private_key_path or public_key_path')
+
+            keys.append(SigningKey(key_settings.kid, key_settings.algorithm, private_key, public_key))
+            if key_settings.status == 'active' and active_kid is None:
+                active_kid = key_settings.kid
+
+        if keys and active_kid is None:
+            raise ValueError('JWT keys are configured, but none of them is active')
+        return cls(keys, active_kid)
+
+
+jwt_keyring = JWTKeyring.from_settings(settings.jwt.keys)
@@ -1,3 +1,4 @@
+from collections import Counter
 from datetime import datetime, timezone
 from logging import getLogger
 from typing import Any
@@ -7,24 +8,40 @@ from datetime import timedelta
 
 from app.core import settings
 from app.exceptions import InvalidTokenError, InvalidSignatureError, ExpiredSignatureError
+from app.utils.jwt_keys import JWTKeyring, jwt_keyring
 
 jwt_token_utils_logger = getLogger('project.jwt_token_utils')
 
+# tokens refused by decode_jwt_token: expired, invalid_signature, invalid
+decode_failures: Counter[str] = Counter()
+
+def _encode(payload: dict[str, Any], secret_key: str, algorithm: str, keyring: JWTKeyring) -> str:
+    if keyring:
+        signing_key = keyring.active
+        return jwt.encode(
+            payload=payload,
+            key=signing_key.private_key,
+            algorithm=signing_key.algorithm,
+            headers={'kid': signing_key.kid}
+        )
+    return jwt.encode(
+        payload=payload,
+        key=secret_key,
+        algorithm=algorithm
+    )
+
 def generate_email_verify_token(
         payload: dict[str, Any],
         secret_key: str = settings.jwt.secret_key,
         algorithm: str = settings.jwt.algorithm,
+        keyring: JWTKeyring = jwt_keyring,
 ) -> str:
     jwt_token_utils_logger.info('Generate email verify token')
     payload = {
         **payload,
         'exp': datetime.now(timezone.utc) + timedelta(minutes=settings.jwt.email_token_expire_minutes)
     }
-    token = jwt.encode(
-        payload = payload,
-        key = secret_key,
-        algorithm = algorithm
-    )
+    token = _encode(payload, secret_key, algorithm, keyring)
     jwt_token_utils_logger.info('Return email verify token')
 
     return token
@@ -32,22 +49,29 @@ def generate_email_verify_token(
 def create_token(
         payload: dict[str, Any],
         secret_key: str = settings.jwt.secret_key,
-        algorithm: str = settings.jwt.algorithm
+        algorithm: str = settings.jwt.algorithm,
+        keyring: JWTKeyring = jwt_keyring,
 ) -> str:
     jwt_token_utils_logger.info('Generate token')
-    token = jwt.encode(
-        payload=payload,
-        key = secret_key,
-        algorithm=algorithm
-    )
-    return token
+    return _encode(payload, secret_key, algorithm, keyring)
 
 def decode_jwt_token(
         token: str,
         secret_key: str = settings.jwt.secret_key,
         algorithm: str = settings.jwt.algorithm,
+        keyring: JWTKeyring = jwt_keyring,
 ) -> dict[str, Any]:
     try:
+        if keyring:
+            verifying_key = keyring.get(jwt.get_unverified_header(token).get('kid'))
+            if verifying_key is None:
+                raise jwt.InvalidTokenError('Unknown kid')
+            return jwt.decode(
+                token,
+                key=verifying_key.public_key,
+                algorithms=[verifying_key.algorithm]
+            )
+
         decoded = jwt.decode(
             token,
             key=secret_key,
@@ -56,10 +80,13 @@ def decode_jwt_token(
         return decoded
     except jwt.ExpiredSignatureError:
         jwt_token_utils_logger.exception('Token has expired.')
+        decode_failures['expired'] += 1
         raise ExpiredSignatureError
     except jwt.InvalidSignatureError:
         jwt_token_utils_logger.exception('Invalid token signature.')
+        decode_failures['invalid_signature'] += 1
         raise InvalidSignatureError
     except jwt.InvalidTokenError:
         jwt_token_utils_logger.exception('Token is invalid.')
+        decode_failures['invalid'] += 1
         raise InvalidTokenError
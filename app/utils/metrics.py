@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class LatencyStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            'count': self.count,
+            'avg': self.avg,
+            'max': self.max,
+        }
@@ -1,14 +1,231 @@
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from logging import getLogger
+from typing import Any, Callable, Optional
 
 import bcrypt
+from argon2 import PasswordHasher as Argon2Hasher, extract_parameters
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from app.core import settings
+from app.exceptions import PasswordHasherIsBusy
+from app.utils.metrics import LatencyStats
+from app.utils.tracing import tracer
 
 password_utils_logger = getLogger('project.password')
 
+
+class BcryptBackend:
+    algorithm = 'bcrypt'
+
+    def __init__(self, rounds: int = 12):
+        self.rounds = rounds
+
+    @staticmethod
+    def identifies(hashed_password: bytes) -> bool:
+        return hashed_password.startswith((b'$2a$', b'$2b$', b'$2y$'))
+
+    @classmethod
+    def is_valid(cls, hashed_password: bytes) -> bool:
+        # $2b$<two digit rounds>$<53 characters of salt and hash>
+        return cls.identifies(hashed_password) and len(hashed_password) == 60 and hashed_password[4:6].isdigit()
+
+    def hash(self, password: str) -> bytes:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds))
+
+    @staticmethod
+    def verify(password: bytes, hashed_password: bytes) -> bool:
+        # the cost is read from the hash, so hashes of any cost are verified
+        return bcrypt.checkpw(password, hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        # $2b$<rounds>$<salt and hash>
+        return int(hashed_password[4:6]) != self.rounds
+
+
+class Argon2Backend:
+    algorithm = 'argon2id'
+
+    def __init__(self, time_cost: int = 3, memory_cost: int = 65536, parallelism: int = 4):
+        self.time_cost = time_cost
+        self.memory_cost = memory_cost
+        self.parallelism = parallelism
+        self._hasher = Argon2Hasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+    @staticmethod
+    def identifies(hashed_password: bytes) -> bool:
+        return hashed_password.startswith(b'$argon2id$')
+
+    @classmethod
+    def is_valid(cls, hashed_password: bytes) -> bool:
+        if not cls.identifies(hashed_password):
+            return False
+        try:
+            extract_parameters(hashed_password.decode())
+        except (InvalidHashError, UnicodeDecodeError):
+            return False
+        return True
+
+    def hash(self, password: str) -> bytes:
+        return self._hasher.hash(password).encode()
+
+    def verify(self, password: bytes, hashed_password: bytes) -> bool:
+        try:
+            return self._hasher.verify(hashed_password, password)
+        except (VerificationError, InvalidHashError):
+            return False
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        return self._hasher.check_needs_rehash(hashed_password)
+
+
+PasswordHashBackend = BcryptBackend | Argon2Backend
+
+
+def backend_from_settings() -> PasswordHashBackend:
+    hash_settings = settings.password_hash
+    if hash_settings.algorithm == 'argon2id':
+        return Argon2Backend(
+            hash_settings.argon2_time_cost,
+            hash_settings.argon2_memory_cost,
+            hash_settings.argon2_parallelism,
+        )
+    return BcryptBackend(hash_settings.bcrypt_rounds)
+
+
+# new hashes are made by this backend, module level so worker processes build the same one from settings
+password_hash_backend: PasswordHashBackend = backend_from_settings()
+
+
+def _backend_of(hashed_password: bytes) -> Optional[PasswordHashBackend]:
+    if password_hash_backend.identifies(hashed_password):
+        return password_hash_backend
+    # hashes of the other algorithm keep working until their owner logs in and they are rehashed
+    for backend in (BcryptBackend(), Argon2Backend()):
+        if backend.identifies(hashed_password):
+            return backend
+    return None
+
+def is_password_hash(hashed_password: bytes) -> bool:
+    """A well formed hash of an algorithm password_is_correct can verify"""
+    backend = _backend_of(hashed_password)
+    return backend is not None and backend.is_valid(hashed_password)
+
 def hash_password(password: str) -> bytes:
     password_utils_logger.info('Hashing password')
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode(), salt)
+    return password_hash_backend.hash(password)
 
 def password_is_correct(password: bytes, hashed_password: bytes) -> bool:
-    return bcrypt.checkpw(password, hashed_password)
+    backend = _backend_of(hashed_password)
+    if backend is None:
+        password_utils_logger.error('Unknown password hash format')
+        return False
+    return backend.verify(password, hashed_password)
+
+def password_needs_rehash(hashed_password: bytes) -> bool:
+    """True when the hash is of another algorithm or cost than new hashes get"""
+    if not password_hash_backend.identifies(hashed_password):
+        return True
+    return password_hash_backend.needs_rehash(hashed_password)
+
+def _timed_call(func: Callable[..., Any], *args: Any) -> tuple[Any, float]:
+    # runs inside the worker, so the measured time excludes waiting in the queue
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """
+    Runs password hashing off the event loop in a bounded pool.
+
+    At most ``max_workers`` operations run at once and ``max_queue_size`` more may wait;
+    anything beyond that is rejected with 503 instead of piling up behind the pool.
+    """
+    def __init__(self, max_workers: int, max_queue_size: int, use_processes: bool = False):
+        password_utils_logger.info('Initialize password hasher pool')
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.use_processes = use_processes
+        self._executor: Executor | None = None
+        self._in_flight = 0
+        self.hash_latency = LatencyStats()
+        self.wait_latency = LatencyStats()
+        # hash_latency split by operation: hash, verify
+        self.operation_latency: defaultdict[str, LatencyStats] = defaultdict(LatencyStats)
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._in_flight - self.max_workers, 0)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, func: Callable[..., Any], *args: Any, operation: str = 'other') -> Any:
+        if self._in_flight >= self.max_workers + self.max_queue_size:
+            self.rejected += 1
+            password_utils_logger.warning('Password hasher queue is full, rejecting request')
+            raise PasswordHasherIsBusy
+
+        self._in_flight += 1
+        start = time.perf_counter()
+        with tracer.start_span(f'password.{operation}', child_only=True) as span:
+            try:
+                loop = asyncio.get_running_loop()
+                result, elapsed = await loop.run_in_executor(self.executor, _timed_call, func, *args)
+            finally:
+                self._in_flight -= 1
+
+            wait = time.perf_counter() - start - elapsed
+            if span is not None:
+                span.set_attribute('wait_ms', wait * 1000)
+
+        self.hash_latency.observe(elapsed)
+        self.operation_latency[operation].observe(elapsed)
+        self.wait_latency.observe(wait)
+        return result
+
+    async def hash_password(self, password: str) -> bytes:
+        return await self.run(hash_password, password, operation='hash')
+
+    async def password_is_correct(self, password: bytes, hashed_password: bytes) -> bool:
+        return await self.run(password_is_correct, password, hashed_password, operation='verify')
+
+    @staticmethod
+    def needs_rehash(hashed_password: bytes) -> bool:
+        # only parses the hash, cheap enough for the event loop
+        return password_needs_rehash(hashed_password)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'in_flight': self._in_flight,
+            'queue_depth': self.queue_depth,
+            'rejected': self.rejected,
+            'hash_latency': self.hash_latency.as_dict(),
+            'wait_latency': self.wait_latency.as_dict(),
+            'operations': {operation: latency.as_dict() for operation, latency in self.operation_latency.items()},
+        }
+
+    def shutdown(self):
+        password_utils_logger.info('Shutdown password hasher pool')
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
 
+password_hasher = PasswordHasher(
+    settings.password_hash.max_workers,
+    settings.password_hash.max_queue_size,
+    settings.password_hash.use_processes,
+)
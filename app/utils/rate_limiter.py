@@ -0,0 +1,139 @@
+import math
+import time
+from collections import OrderedDict
+from logging import getLogger
+
+from redis.exceptions import RedisError
+
+from app.core import settings
+from app.core.settings import RateLimitRule
+from app.utils.redis_client import RedisClient, redis_client
+
+rate_limiter_logger = getLogger('project.rate_limiter')
+
+# KEYS: one bucket hash per rule
+# ARGV: capacity and refill per second of every bucket, in the order of KEYS
+# a token is taken from every bucket only when all of them have one, otherwise nothing is taken
+# and the reply is the seconds until the emptiest bucket refills. The reply is a string,
+# Lua numbers are truncated to integers on the way back
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    tokens[i] = available
+    if available < 1 then
+        retry_after = math.max(retry_after, (1 - available) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local available = tokens[i]
+    if retry_after == 0 then
+        available = available - 1
+    end
+    redis.call('HSET', key, 'tokens', available, 'updated_at', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(retry_after)
+"""
+
+
+class LocalTokenBuckets:
+    """The token buckets of the Lua script in process memory, the least recently used ones are dropped"""
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time of the last update)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def hit(self, buckets: list[tuple[str, RateLimitRule]]) -> float:
+        now = time.monotonic()
+        available: list[float] = []
+        retry_after = 0.0
+        for key, rule in buckets:
+            rate = rule.per_minute / 60
+            tokens, updated_at = self._buckets.get(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated_at) * rate)
+            available.append(tokens)
+            if tokens < 1:
+                retry_after = max(retry_after, (1 - tokens) / rate)
+
+        for (key, _), tokens in zip(buckets, available):
+            self._buckets[key] = (tokens - 1 if not retry_after else tokens, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """
+    Token buckets shared by all workers through Redis, one atomic script call per request.
+
+    When Redis is unavailable the buckets are kept per worker in memory, so limits still hold,
+    only multiplied by the number of workers.
+    """
+    def __init__(self, redis: RedisClient, enabled: bool = True, key_prefix: str = 'rate_limit:', local_max_keys: int = 10_000):
+        self.redis = redis
+        self.enabled = enabled
+        self.key_prefix = key_prefix
+        self.local = LocalTokenBuckets(local_max_keys)
+        self._token_bucket = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+        self.allowed = 0
+        self.limited = 0
+        self.local_fallbacks = 0
+
+    async def hit(self, buckets: dict[str, RateLimitRule]) -> float:
+        """Take a token from every bucket, return 0 when allowed or the seconds to wait"""
+        if not self.enabled or not buckets:
+            return 0.0
+
+        keys = [f'{self.key_prefix}{name}' for name in buckets]
+        args: list[float] = []
+        for rule in buckets.values():
+            args += [rule.capacity, rule.per_minute / 60]
+        try:
+            retry_after = float(await self.redis.run_script(self._token_bucket, keys=keys, args=args, name='rate_limit'))
+        except RedisError:
+            rate_limiter_logger.warning('Redis is unavailable, rate limit in process memory')
+            self.local_fallbacks += 1
+            retry_after = self.local.hit(list(zip(keys, buckets.values())))
+
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    @staticmethod
+    def retry_after_header(seconds: float) -> int:
+        # Retry-After is whole seconds, rounded up so a client that waits exactly that long gets a token
+        return max(1, math.ceil(seconds))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'local_fallbacks': self.local_fallbacks,
+            'local_buckets': len(self.local),
+        }
+
+
+rate_limiter = RateLimiter(
+    redis_client,
+    enabled=settings.rate_limit.enabled,
+    key_prefix=settings.rate_limit.key_prefix,
+    local_max_keys=settings.rate_limit.local_max_keys,
+)
@@ -1,41 +1,152 @@
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
 from datetime import timedelta
 from logging import getLogger
+from time import perf_counter
+from typing import Any, AsyncIterator, Iterator, Optional
 
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
 
 from app.core import settings
+from app.utils.metrics import LatencyStats
+from app.utils.tracing import tracer
 
 redis_logger = getLogger('project.redis_client')
 
 class RedisClient:
-    def __init__(self, host:str, port: int, decode_response: bool = True):
+    """
+    Thin wrapper over ``redis.asyncio.Redis`` with an explicitly sized connection pool.
+
+    Every call is timed per command name, ``stats()`` returns the collected latencies and error counts.
+    """
+    def __init__(
+            self,
+            host:str,
+            port: int,
+            decode_response: bool = True,
+            max_connections: int = 50,
+            pool_timeout: float = 5,
+            socket_timeout: float = 10,
+            socket_connect_timeout: float = 2,
+            health_check_interval: int = 30,
+    ):
         redis_logger.info('Initialize a redis connect')
-        self.redis_client = redis.Redis(
+        # waits up to pool_timeout for a free connection instead of failing once max_connections are in use
+        self.pool = redis.BlockingConnectionPool(
             host=host,
             port=port,
-            decode_responses=decode_response
+            decode_responses=decode_response,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
         )
+        self.redis_client = redis.Redis(connection_pool=self.pool)
+        self.latency: defaultdict[str, LatencyStats] = defaultdict(LatencyStats)
+        self.errors: defaultdict[str, int] = defaultdict(int)
 
-    async def set_data(self, key: str, value:str, expire: int | timedelta):
-        redis_logger.info('Create new data in redis')
-        return await self.redis_client.set(
-            name=key,
-            value=value,
-            ex=expire
-        )
+    @contextmanager
+    def _timed(self, command: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            with tracer.start_span('redis', {'db.operation': command}, child_only=True):
+                yield
+        except RedisError:
+            self.errors[command] += 1
+            raise
+        finally:
+            self.latency[command].observe(perf_counter() - started)
+
+    async def set_data(self, key: str, value:str, expire: int | timedelta, nx: bool = False):
+        """With ``nx`` the key is only set when it does not exist, the reply is then None"""
+        redis_logger.debug('Create new data in redis')
+        with self._timed('set'):
+            return await self.redis_client.set(
+                name=key,
+                value=value,
+                ex=expire,
+                nx=nx
+            )
 
     async def get_data(self, key: str) -> str | None:
-        redis_logger.info('Get data from redis')
-        return await self.redis_client.get(name=key)
+        redis_logger.debug('Get data from redis')
+        with self._timed('get'):
+            return await self.redis_client.get(name=key)
 
     async def delete_data(self, key: str | list[str]) -> None:
-        if isinstance(key, list):
-            return await self.redis_client.delete(*key)
-        return await self.redis_client.delete(key)
+        with self._timed('delete'):
+            if isinstance(key, list):
+                return await self.redis_client.delete(*key)
+            return await self.redis_client.delete(key)
+
+    async def get_many(self, keys: list[str]) -> list[Optional[str]]:
+        """Values of keys in the same order, None for missing ones, in one MGET"""
+        if not keys:
+            return []
+        with self._timed('mget'):
+            return await self.redis_client.mget(keys)
+
+    async def set_many(self, mapping: dict[str, str], expire: int | timedelta) -> None:
+        """Set every key with the same TTL in one round trip, MSET has no TTL so SETs are pipelined"""
+        if not mapping:
+            return
+        async with self.pipeline(transaction=False, name='set_many') as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=expire)
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True, name: str = 'pipeline') -> AsyncIterator[Pipeline]:
+        """
+        Queue commands on the yielded pipeline, they are sent in one round trip when the block exits.
+
+        With ``transaction`` the commands run in MULTI/EXEC. Call ``await pipe.execute()``
+        inside the block to get the replies, nothing is sent twice.
+        Either way the round trip is timed under ``name``.
+        """
+        async with self.redis_client.pipeline(transaction=transaction) as pipe:
+            execute = pipe.execute
+
+            async def timed_execute(raise_on_error: bool = True) -> list[Any]:
+                with self._timed(name):
+                    return await execute(raise_on_error)
+
+            # explicit execute() calls inside the block are timed too
+            pipe.execute = timed_execute
+            yield pipe
+            if pipe.command_stack:
+                await pipe.execute()
+
+    def register_script(self, script: str) -> AsyncScript:
+        # the script is sent with EVALSHA and loaded on the first NOSCRIPT reply
+        return self.redis_client.register_script(script)
+
+    async def run_script(self, script: AsyncScript, keys: list[str], args: list[Any], name: str = 'script') -> Any:
+        with self._timed(name):
+            # the current client is passed, so scripts registered at import keep working after it is replaced
+            return await script(keys=keys, args=args, client=self.redis_client)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            command: {**latency.as_dict(), 'errors': self.errors.get(command, 0)}
+            for command, latency in self.latency.items()
+        }
 
     async def dispose(self):
         redis_logger.info('Dispose connection with redis')
-        return await self.redis_client.aclose()
+        await self.redis_client.aclose()
+        return await self.pool.aclose()
 
 
-redis_client = RedisClient(settings.redis.redis_host, settings.redis.redis_port)
+redis_client = RedisClient(
+    settings.redis.redis_host,
+    settings.redis.redis_port,
+    max_connections=settings.redis.max_connections,
+    pool_timeout=settings.redis.pool_timeout,
+    socket_timeout=settings.redis.socket_timeout,
+    socket_connect_timeout=settings.redis.socket_connect_timeout,
+    health_check_interval=settings.redis.health_check_interval,
+)
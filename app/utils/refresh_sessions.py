@@ -0,0 +1,159 @@
+import json
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Optional
+
+from app.core import settings
+from app.utils.redis_client import RedisClient, redis_client
+
+refresh_sessions_logger = getLogger('project.refresh_sessions')
+
+# KEYS: sessions hash, last-used zset
+# ARGV: session id, session json, now, ttl seconds, max sessions
+# sessions unused for longer than the refresh token lifetime are dropped, then the least recently used
+# ones over the cap, each removal is a ZPOPMIN/ZREM and an HDEL
+CREATE_SESSION_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[3] - ARGV[4])
+for _, session_id in ipairs(expired) do
+    redis.call('HDEL', KEYS[1], session_id)
+    redis.call('ZREM', KEYS[2], session_id)
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+local evicted = 0
+while redis.call('ZCARD', KEYS[2]) > tonumber(ARGV[5]) do
+    local oldest = redis.call('ZPOPMIN', KEYS[2])
+    redis.call('HDEL', KEYS[1], oldest[1])
+    evicted = evicted + 1
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return evicted
+"""
+
+# KEYS: sessions hash, last-used zset
+# ARGV: session id, presented refresh jti, new refresh jti, now, ttl seconds
+# returns 0 when the session does not exist, -1 when the presented token was already rotated
+# (the session is revoked then), 1 when the session now belongs to the new token
+ROTATE_SESSION_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+local last_used = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if not raw or not last_used or tonumber(last_used) < ARGV[4] - ARGV[5] then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return 0
+end
+local session = cjson.decode(raw)
+if session.jti ~= ARGV[2] then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return -1
+end
+session.jti = ARGV[3]
+session.last_used_at = tonumber(ARGV[4])
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(session))
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+"""
+
+
+@dataclass
+class RefreshSession:
+    id: str
+    created_at: float
+    last_used_at: float
+    user_agent: Optional[str] = None
+
+
+class RefreshSessionStore:
+    """
+    Refresh sessions of a user, one per device, each holding the jti of its current refresh token.
+
+    ``sessions:{user_id}`` is a hash of session id to session data, ``sessions:{user_id}:lru``
+    orders the same ids by last use. Creating a session over ``max_sessions`` evicts the least
+    recently used one.
+    """
+    def __init__(self, redis: RedisClient, max_sessions: int = 10, ttl_seconds: int = 300):
+        self.redis = redis
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._create_session = redis.register_script(CREATE_SESSION_SCRIPT)
+        self._rotate_session = redis.register_script(ROTATE_SESSION_SCRIPT)
+
+    @staticmethod
+    def _keys(user_id: int) -> list[str]:
+        return [f'sessions:{user_id}', f'sessions:{user_id}:lru']
+
+    async def create(self, user_id: int, session_id: str, refresh_jti: str, user_agent: Optional[str] = None) -> int:
+        """Store a new session, return how many old sessions were evicted to stay under the cap"""
+        now = time.time()
+        session: dict[str, Any] = {
+            'jti': refresh_jti,
+            'created_at': now,
+            'last_used_at': now,
+            'user_agent': user_agent,
+        }
+        evicted = await self.redis.run_script(
+            self._create_session,
+            keys=self._keys(user_id),
+            args=[session_id, json.dumps(session), now, self.ttl_seconds, self.max_sessions],
+            name='create_session'
+        )
+        if evicted:
+            refresh_sessions_logger.info('Evicted %s least recently used sessions', evicted)
+        return evicted
+
+    async def rotate(self, user_id: int, session_id: str, presented_jti: str, new_jti: str) -> int:
+        return await self.redis.run_script(
+            self._rotate_session,
+            keys=self._keys(user_id),
+            args=[session_id, presented_jti, new_jti, time.time(), self.ttl_seconds],
+            name='rotate_session'
+        )
+
+    async def get_all(self, user_id: int) -> list[RefreshSession]:
+        """Sessions that are still alive, most recently used first"""
+        sessions_key, lru_key = self._keys(user_id)
+        min_last_used = time.time() - self.ttl_seconds
+        async with self.redis.pipeline(transaction=False, name='list_sessions') as pipe:
+            pipe.zrevrangebyscore(lru_key, '+inf', min_last_used)
+            pipe.hgetall(sessions_key)
+            session_ids, raw_sessions = await pipe.execute()
+
+        sessions = []
+        for session_id in session_ids:
+            raw = raw_sessions.get(session_id)
+            if raw is None:
+                continue
+            data = json.loads(raw)
+            sessions.append(RefreshSession(
+                id=session_id,
+                created_at=data['created_at'],
+                last_used_at=data['last_used_at'],
+                user_agent=data['user_agent'],
+            ))
+        return sessions
+
+    async def revoke(self, user_id: int, session_ids: list[str]) -> int:
+        """Delete sessions, return how many of them existed"""
+        if not session_ids:
+            return 0
+        sessions_key, lru_key = self._keys(user_id)
+        async with self.redis.pipeline(name='revoke_sessions') as pipe:
+            pipe.hdel(sessions_key, *session_ids)
+            pipe.zrem(lru_key, *session_ids)
+            deleted, _ = await pipe.execute()
+        return deleted
+
+    async def revoke_all(self, user_id: int) -> None:
+        await self.redis.delete_data(self._keys(user_id))
+
+
+refresh_sessions = RefreshSessionStore(
+    redis_client,
+    max_sessions=settings.jwt.max_sessions_per_user,
+    ttl_seconds=int(settings.jwt.refresh_token_expire_minutes.total_seconds()),
+)
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from email.message import Message
+from logging import getLogger
+
+import aiosmtplib
+
+from app.core import settings
+
+smtp_logger = getLogger('project.smtp_pool')
+
+# errors after which the connection can not be trusted anymore
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, ConnectionError, OSError)
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to ``size`` authenticated SMTP connections and reuses them across messages.
+
+    A pooled connection that turns out to be dead is dropped and the message is sent once more
+    over a fresh one. Connections idle for longer than ``idle_timeout`` are reopened before use,
+    since servers close them on their side anyway.
+    """
+    def __init__(
+            self,
+            hostname: str,
+            port: int,
+            login: str | None = None,
+            password: str | None = None,
+            size: int = 2,
+            use_tls: bool = True,
+            timeout: float = 10,
+            idle_timeout: float = 60
+    ):
+        smtp_logger.info('Initialize smtp connection pool')
+        self.hostname = hostname
+        self.port = port
+        self.login = login
+        self.password = password
+        self.size = size
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle: list[tuple[aiosmtplib.SMTP, float]] = []
+        self.connections_opened = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp_logger.info('Open new smtp connection')
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            timeout=self.timeout
+        )
+        await client.connect()
+        if self.login:
+            try:
+                await client.login(self.login, self.password)
+            except BaseException:
+                # the connection is open already, a failed login must not leave its socket behind
+                client.close()
+                raise
+        self.connections_opened += 1
+        return client
+
+    def _take_idle(self) -> aiosmtplib.SMTP | None:
+        while self._idle:
+            client, released_at = self._idle.pop()
+            if client.is_connected and time.monotonic() - released_at < self.idle_timeout:
+                return client
+            client.close()
+        return None
+
+    def _release(self, client: aiosmtplib.SMTP):
+        self._idle.append((client, time.monotonic()))
+
+    async def _send_over(self, client: aiosmtplib.SMTP, message: Message):
+        try:
+            await client.send_message(message)
+        except CONNECTION_ERRORS:
+            client.close()
+            raise
+        except aiosmtplib.SMTPException:
+            # refused recipients, rejected data or unsupported extensions: the server answered,
+            # so the connection itself is still usable
+            self._release(client)
+            raise
+        except BaseException:
+            # cancelled or failed midway, the state of the SMTP session is unknown
+            client.close()
+            raise
+        self._release(client)
+
+    async def send(self, message: Message):
+        async with self._semaphore:
+            client = self._take_idle()
+            if client is not None:
+                try:
+                    await self._send_over(client, message)
+                    return
+                except CONNECTION_ERRORS:
+                    smtp_logger.warning('Pooled smtp connection is broken, reconnecting')
+
+            await self._send_over(await self._connect(), message)
+
+    async def close(self):
+        smtp_logger.info('Close smtp connections')
+        idle, self._idle = self._idle, []
+        for client, _ in idle:
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+
+
+smtp_pool = SMTPConnectionPool(
+    settings.smtp.smtp_server,
+    settings.smtp.smtp_port,
+    login=settings.smtp.smtp_login,
+    password=settings.smtp.smtp_password,
+    size=settings.smtp.smtp_pool_size,
+    use_tls=settings.smtp.smtp_use_tls,
+    timeout=settings.smtp.smtp_timeout,
+    idle_timeout=settings.smtp.smtp_idle_timeout,
+)
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import math
+import time
+from logging import getLogger
+from typing import AsyncIterator, Iterator, Optional
+
+from redis.exceptions import RedisError
+
+from app.core import settings
+from app.utils.redis_client import RedisClient, redis_client
+
+token_denylist_logger = getLogger('project.token_denylist')
+
+
+class BloomFilter:
+    """Set membership without false negatives, sized for ``capacity`` items at ``error_rate`` false positives"""
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # double hashing, k positions out of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenDenylist:
+    """
+    Revoked access token ids (``jti``).
+
+    A revocation is a Redis key that expires together with the token, plus an entry in a stream
+    that every worker reads incrementally into its own bloom filter. Checks are answered from
+    the filter, Redis is asked only when the filter says the token may be revoked.
+    """
+    def __init__(
+            self,
+            redis: RedisClient,
+            key_prefix: str = 'revoked_token:',
+            stream: str = 'revoked_tokens',
+            capacity: int = 100_000,
+            error_rate: float = 0.001,
+            refresh_interval_seconds: float = 1.0,
+            max_token_lifetime_seconds: int = 60,
+    ):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.stream = stream
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.max_token_lifetime_seconds = max_token_lifetime_seconds
+
+        self.filter = BloomFilter(capacity, error_rate)
+        # the filter being rebuilt, revocations made meanwhile go into it as well
+        self._rebuilding: Optional[BloomFilter] = None
+        self.last_id = '0-0'
+        # stream entries read into the filter; revocations of this worker are also added by revoke,
+        # so the filter's own count would hold them twice
+        self.filter_entries = 0
+        self.filter_hits = 0
+
+    def _key(self, jti: str) -> str:
+        return f'{self.key_prefix}{jti}'
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        ttl = math.ceil(expires_at - now)
+        if ttl <= 0:
+            return
+
+        # entries older than the longest token lifetime only describe expired tokens
+        min_id = int((now - self.max_token_lifetime_seconds) * 1000)
+        async with self.redis.pipeline(name='revoke_token') as pipe:
+            pipe.set(self._key(jti), 1, ex=ttl)
+            pipe.xadd(self.stream, {'jti': jti}, minid=min_id, approximate=True)
+        self.filter.add(jti)
+        if self._rebuilding is not None:
+            self._rebuilding.add(jti)
+        token_denylist_logger.info('Token is revoked')
+
+    async def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None or jti not in self.filter:
+            return False
+
+        self.filter_hits += 1
+        try:
+            return await self.redis.get_data(self._key(jti)) is not None
+        except RedisError:
+            # the token may be revoked and there is no way to tell, so it is refused
+            token_denylist_logger.warning('Redis is unavailable, token with a denylist hit is refused')
+            return True
+
+    async def _entries_after(self, last_id: str, batch_size: int) -> AsyncIterator[list[tuple[str, dict]]]:
+        while True:
+            entries = await self.redis.redis_client.xrange(self.stream, min=f'({last_id}', count=batch_size)
+            if entries:
+                last_id = entries[-1][0]
+                yield entries
+            if len(entries) < batch_size:
+                return
+
+    async def refresh(self, batch_size: int = 1000) -> int:
+        """Add revocations made since the last refresh to the filter, return how many were read"""
+        if self.filter_entries >= self.capacity:
+            return await self._rebuild(batch_size)
+
+        read = 0
+        async for entries in self._entries_after(self.last_id, batch_size):
+            for _, fields in entries:
+                self.filter.add(fields['jti'])
+            self.last_id = entries[-1][0]
+            self.filter_entries += len(entries)
+            read += len(entries)
+        return read
+
+    async def _rebuild(self, batch_size: int) -> int:
+        # a bloom filter cannot drop items, it is rebuilt from the trimmed stream instead;
+        # the full filter keeps answering until the new one holds the whole stream
+        token_denylist_logger.info('Token denylist filter is full, rebuild it')
+        rebuilt = self._rebuilding = BloomFilter(self.capacity, self.error_rate)
+        last_id, read = '0-0', 0
+        try:
+            async for entries in self._entries_after(last_id, batch_size):
+                for _, fields in entries:
+                    rebuilt.add(fields['jti'])
+                last_id = entries[-1][0]
+                read += len(entries)
+        finally:
+            self._rebuilding = None
+        self.filter, self.last_id, self.filter_entries = rebuilt, last_id, read
+        return read
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except RedisError:
+                token_denylist_logger.warning('Redis is unavailable, token denylist is not refreshed')
+            await asyncio.sleep(self.refresh_interval_seconds)
+
+
+token_denylist = TokenDenylist(
+    redis_client,
+    key_prefix=settings.token_denylist.key_prefix,
+    stream=settings.token_denylist.stream,
+    capacity=settings.token_denylist.capacity,
+    error_rate=settings.token_denylist.error_rate,
+    refresh_interval_seconds=settings.token_denylist.refresh_interval_seconds,
+    max_token_lifetime_seconds=int(settings.jwt.access_token_expire_minutes.total_seconds()),
+)
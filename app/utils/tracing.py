@@ -0,0 +1,309 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.settings import settings
+
+tracing_logger = getLogger('project.tracing')
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# version-trace_id-parent_id-flags, https://www.w3.org/TR/trace-context/#traceparent-header
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+SAMPLED_FLAG = 0x01
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    sampled: bool = True
+    # wall clock for the exported start, monotonic for the duration
+    start_time: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    duration: float = 0.0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-{SAMPLED_FLAG if self.sampled else 0:02x}'
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration_ms': self.duration * 1000,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """trace id, parent span id and the sampled flag of a W3C traceparent header, None when it is not valid"""
+    if not header:
+        return None
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & SAMPLED_FLAG)
+
+
+class SpanExporter:
+    """Receives finished spans in batches, subclass it to send spans elsewhere"""
+    def export(self, spans: list[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonFileExporter(SpanExporter):
+    """Appends spans to a file, one JSON object per line, for offline analysis"""
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def export(self, spans: list[Span]) -> None:
+        lines = ''.join(json.dumps(span.as_dict(), default=str) + '\n' for span in spans)
+        with open(self.filename, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+
+class Tracer:
+    """
+    Spans kept in a context variable, so they nest across awaits and tasks without being passed around.
+
+    Whether a trace is recorded is decided once, when its first span starts (head-based sampling):
+    ``sample_rate`` of new traces, or what the caller decided for traces continued from a traceparent
+    header when ``follow_parent_sampling`` is on. Spans of a trace that is not recorded cost a context
+    variable lookup. Finished spans are exported in batches of ``batch_size``, by a background thread
+    unless ``export_in_background`` is off, so a slow exporter never blocks the event loop. When the
+    thread falls ``max_queued_batches`` behind, new batches are dropped.
+    """
+    def __init__(
+            self,
+            exporter: Optional[SpanExporter] = None,
+            enabled: bool = True,
+            sample_rate: float = 1.0,
+            follow_parent_sampling: bool = True,
+            batch_size: int = 64,
+            max_queued_batches: int = 16,
+            export_in_background: bool = True
+    ):
+        self.exporter = exporter
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.follow_parent_sampling = follow_parent_sampling
+        self.batch_size = batch_size
+        self._current: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+        self._finished: list[Span] = []
+        self.export_in_background = export_in_background
+        # batches waiting for the export thread, None tells it to stop
+        self._batches: queue.Queue[Optional[list[Span]]] = queue.Queue(max_queued_batches)
+        self._export_thread: Optional[threading.Thread] = None
+        self._export_thread_lock = threading.Lock()
+
+        self.exported = 0
+        self.export_errors = 0
+        self.dropped = 0
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_traceparent(self) -> Optional[str]:
+        span = self._current.get()
+        return span.traceparent if span is not None and span.sampled else None
+
+    def _new_span(self, name: str, parent: Optional[Span], traceparent: Optional[str]) -> Span:
+        if parent is not None:
+            return Span(parent.trace_id, os.urandom(8).hex(), parent.span_id, name, parent.sampled)
+
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id, remote_sampled = remote
+            sampled = remote_sampled if self.follow_parent_sampling else random.random() < self.sample_rate
+            return Span(trace_id, os.urandom(8).hex(), parent_id, name, sampled)
+        return Span(os.urandom(16).hex(), os.urandom(8).hex(), None, name, random.random() < self.sample_rate)
+
+    @contextmanager
+    def start_span(
+            self,
+            name: str,
+            attributes: Optional[dict[str, Any]] = None,
+            traceparent: Optional[str] = None,
+            child_only: bool = False
+    ) -> Iterator[Optional[Span]]:
+        """
+        Span around the block, a child of the current one. Without a current span it starts a trace,
+        continuing the one of ``traceparent`` when given, unless ``child_only`` is set.
+
+        Yields None when nothing is recorded.
+        """
+        parent = self._current.get()
+        if not self.enabled or (parent is None and child_only):
+            yield None
+            return
+        if parent is not None and not parent.sampled:
+            # the trace is not recorded, its children are not either
+            yield None
+            return
+
+        span = self._new_span(name, parent, traceparent)
+        if attributes:
+            span.attributes.update(attributes)
+        token = self._current.set(span)
+        try:
+            yield span if span.sampled else None
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            self._current.reset(token)
+            if span.sampled:
+                self.end(span)
+
+    def end(self, span: Span) -> None:
+        span.duration = time.perf_counter() - span.started
+        self._finished.append(span)
+        if len(self._finished) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the finished spans to the exporter, without waiting for it when exporting in background"""
+        spans, self._finished = self._finished, []
+        if not spans or self.exporter is None:
+            return
+        if not self.export_in_background:
+            self._export(spans)
+            return
+        self._start_export_thread()
+        try:
+            self._batches.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+            tracing_logger.warning('Span exporter is falling behind, drop %s spans', len(spans))
+
+    def _export(self, spans: list[Span]) -> None:
+        try:
+            self.exporter.export(spans)
+            self.exported += len(spans)
+        except Exception:
+            # tracing never fails a request, the batch is dropped
+            self.export_errors += 1
+            tracing_logger.exception('Could not export %s spans', len(spans))
+
+    def _export_loop(self) -> None:
+        while (spans := self._batches.get()) is not None:
+            self._export(spans)
+
+    def _start_export_thread(self) -> None:
+        with self._export_thread_lock:
+            if self._export_thread is None:
+                self._export_thread = threading.Thread(target=self._export_loop, name='span-exporter', daemon=True)
+                self._export_thread.start()
+
+    def shutdown(self) -> None:
+        """Export what is left and wait for the export thread to finish"""
+        self.flush()
+        with self._export_thread_lock:
+            if self._export_thread is not None:
+                self._batches.put(None)
+                self._export_thread.join()
+                self._export_thread = None
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+    def traced(self, name: Optional[str] = None, child_only: bool = False) -> Callable[[F], F]:
+        """Decorator running every call of a function, sync or async, in a span named after it"""
+        def decorator(func: F) -> F:
+            span_name = name or f'{func.__module__.rsplit(".", 1)[-1]}.{func.__qualname__}'
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.start_span(span_name, child_only=child_only):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.start_span(span_name, child_only=child_only):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument_engine(self, engine: AsyncEngine) -> None:
+        """A span per statement sent to the database, inside traces that are already recorded"""
+        sync_engine = engine.sync_engine
+        database = sync_engine.url.get_backend_name()
+
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not self.enabled:
+                return
+            parent = self._current.get()
+            if parent is None or not parent.sampled:
+                return
+            span = self._new_span('db.query', parent, None)
+            span.attributes.update({
+                'db.system': database,
+                'db.statement': statement,
+                'db.host': sync_engine.url.host,
+            })
+            conn.info.setdefault('trace_spans', []).append(span)
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            spans = conn.info.get('trace_spans')
+            if spans:
+                self.end(spans.pop())
+
+        @event.listens_for(sync_engine, 'handle_error')
+        def handle_error(exception_context):
+            connection = exception_context.connection
+            spans = connection.info.get('trace_spans') if connection is not None else None
+            if spans:
+                span = spans.pop()
+                span.error = type(exception_context.original_exception).__name__
+                self.end(span)
+
+
+def exporter_from_settings() -> Optional[SpanExporter]:
+    if settings.tracing.exporter == 'json_file':
+        return JsonFileExporter(settings.tracing.filename)
+    return None
+
+
+tracer = Tracer(
+    exporter_from_settings(),
+    enabled=settings.tracing.enabled,
+    sample_rate=settings.tracing.sample_rate,
+    follow_parent_sampling=settings.tracing.follow_parent_sampling,
+    batch_size=settings.tracing.batch_size,
+)
+traced = tracer.traced
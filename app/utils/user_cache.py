@@ -0,0 +1,212 @@
+import json
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Optional
+
+from redis.exceptions import RedisError
+
+from app.core import settings
+from app.models import User
+from app.utils.redis_client import RedisClient, redis_client
+
+user_cache_logger = getLogger('project.user_cache')
+
+# returned when the key is not cached at all, None means "cached as not found"
+MISSING = object()
+# kept for negative_ttl_seconds where an invalidated key was, so a "not found" read from the database
+# before the change can not be cached after it; not JSON, it never collides with a cached value
+INVALIDATED = 'invalidated'
+# credentials stay in the database, cached users have no password hash
+EXCLUDED_FIELDS = {'password_hash'}
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class UserCache:
+    """
+    Caches user rows without their password hash in process memory and in Redis, including
+    "not found" results. Callers that need the hash read the database.
+
+    Redis errors are logged and treated as a miss, so the database stays the source of truth.
+    """
+    def __init__(
+            self,
+            redis: RedisClient,
+            enabled: bool = True,
+            local_max_size: int = 10_000,
+            local_ttl_seconds: float = 5,
+            redis_ttl_seconds: int = 300,
+            negative_ttl_seconds: int = 30
+    ):
+        self.redis = redis
+        self.enabled = enabled
+        self.local = LRUCache(local_max_size)
+        self.local_ttl_seconds = local_ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def email_key(email: str) -> str:
+        return f'user:email:{email}'
+
+    @staticmethod
+    def id_key(user_id: int) -> str:
+        return f'user:id:{user_id}'
+
+    @staticmethod
+    def _to_user(data: Optional[dict[str, Any]]) -> Optional[User]:
+        return User(**data) if data is not None else None
+
+    async def get(self, key: str) -> Any:
+        """Return a User, None for a cached "not found" or MISSING"""
+        if not self.enabled:
+            return MISSING
+
+        data = self.local.get(key)
+        if data is not MISSING and data != INVALIDATED:
+            self.local_hits += 1
+            return self._to_user(data)
+
+        try:
+            raw = await self.redis.get_data(key)
+        except RedisError:
+            user_cache_logger.warning('Redis is unavailable, skip user cache')
+            raw = None
+
+        if raw is None or raw == INVALIDATED:
+            self.misses += 1
+            return MISSING
+
+        self.redis_hits += 1
+        data = json.loads(raw)
+        self.local.set(key, data, self._local_ttl(data))
+        return self._to_user(data)
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        """Like get for many keys, the ones missing in memory are read from Redis with one MGET"""
+        if not self.enabled:
+            return [MISSING] * len(keys)
+
+        results = [self.local.get(key) for key in keys]
+        results = [MISSING if result == INVALIDATED else result for result in results]
+        self.local_hits += sum(result is not MISSING for result in results)
+        redis_keys = [key for key, result in zip(keys, results) if result is MISSING]
+        try:
+            raw_values = dict(zip(redis_keys, await self.redis.get_many(redis_keys)))
+        except RedisError:
+            user_cache_logger.warning('Redis is unavailable, skip user cache')
+            raw_values = {}
+
+        for index, key in enumerate(keys):
+            if results[index] is not MISSING:
+                results[index] = self._to_user(results[index])
+                continue
+            raw = raw_values.get(key)
+            if raw is None or raw == INVALIDATED:
+                self.misses += 1
+                continue
+            self.redis_hits += 1
+            data = json.loads(raw)
+            self.local.set(key, data, self._local_ttl(data))
+            results[index] = self._to_user(data)
+        return results
+
+    async def set(self, key: str, user: Optional[User]):
+        if not self.enabled:
+            return
+
+        if user is None:
+            await self._set_not_found(key)
+            return
+
+        data = user.model_dump(exclude=EXCLUDED_FIELDS)
+        keys = [self.email_key(user.email), self.id_key(user.id)]
+        for cache_key in keys:
+            self.local.set(cache_key, data, self._local_ttl(data))
+        try:
+            # both lookup keys of a user are written in one round trip
+            await self.redis.set_many(dict.fromkeys(keys, json.dumps(data)), self.redis_ttl_seconds)
+        except RedisError:
+            user_cache_logger.warning('Redis is unavailable, user is cached only in memory')
+
+    async def _set_not_found(self, key: str):
+        # a key invalidated recently keeps its marker, the lookup may have started before the user was written
+        if self.local.get(key) == INVALIDATED:
+            return
+        self.local.set(key, None, self._local_ttl(None))
+        try:
+            written = await self.redis.set_data(key, json.dumps(None), self.negative_ttl_seconds, nx=True)
+        except RedisError:
+            user_cache_logger.warning('Redis is unavailable, user is cached only in memory')
+            return
+        if not written:
+            self.local.delete(key)
+
+    async def invalidate(self, user: User):
+        keys = [self.email_key(user.email)]
+        if user.id is not None:
+            keys.append(self.id_key(user.id))
+
+        for key in keys:
+            self.local.set(key, INVALIDATED, self.negative_ttl_seconds)
+        try:
+            await self.redis.set_many(dict.fromkeys(keys, INVALIDATED), self.negative_ttl_seconds)
+        except RedisError:
+            user_cache_logger.warning('Redis is unavailable, user cache is invalidated only in memory')
+
+    def _local_ttl(self, data: Optional[dict[str, Any]]) -> float:
+        if data is None:
+            return min(self.local_ttl_seconds, self.negative_ttl_seconds)
+        return self.local_ttl_seconds
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'local_size': len(self.local),
+        }
+
+
+user_cache = UserCache(
+    redis_client,
+    enabled=settings.user_cache.enabled,
+    local_max_size=settings.user_cache.local_max_size,
+    local_ttl_seconds=settings.user_cache.local_ttl_seconds,
+    redis_ttl_seconds=settings.user_cache.redis_ttl_seconds,
+    negative_ttl_seconds=settings.user_cache.negative_ttl_seconds,
+)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import signal
+import socket
+from logging import getLogger
+from typing import Awaitable, Callable
+
+from app.core import settings
+from app.services import send_verification_email
+from app.utils import email_outbox, redis_client, smtp_pool, tracer
+from app.utils.email_outbox import EmailJob, EmailOutbox
+from logging_config import setup_logging
+
+email_worker_logger = getLogger('project.email_worker')
+
+EMAIL_SENDERS: dict[str, Callable[[EmailJob], Awaitable[None]]] = {
+    'verify_email': lambda job: send_verification_email(job.email, job.user_id),
+}
+
+
+class EmailWorker:
+    """Consumes the email outbox in batches, at most ``concurrency`` emails are sent at once"""
+    def __init__(
+            self,
+            outbox: EmailOutbox,
+            consumer: str,
+            batch_size: int = 50,
+            concurrency: int = 10,
+            block_ms: int = 5000,
+            claim_idle_ms: int = 5 * 60 * 1000
+    ):
+        self.outbox = outbox
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        email_worker_logger.info('Stopping email worker')
+        self._stopping.set()
+
+    async def process(self, job: EmailJob):
+        async with self._semaphore:
+            try:
+                with tracer.start_span(f'email_worker.{job.kind}', {'attempt': job.attempts + 1}, traceparent=job.traceparent):
+                    await EMAIL_SENDERS[job.kind](job)
+            except Exception as e:
+                email_worker_logger.exception('Email job failed, attempt %s', job.attempts + 1)
+                await self.outbox.fail(job, repr(e))
+                return
+            await self.outbox.ack(job)
+
+    async def run_once(self) -> int:
+        await self.outbox.move_due_retries()
+        jobs = await self.outbox.claim_stale(self.consumer, self.claim_idle_ms, self.batch_size)
+        if not jobs:
+            jobs = await self.outbox.read_batch(self.consumer, self.batch_size, self.block_ms)
+        await asyncio.gather(*(self.process(job) for job in jobs))
+        return len(jobs)
+
+    async def run(self):
+        email_worker_logger.info('Email worker %s started', self.consumer)
+        await self.outbox.ensure_group()
+        while not self._stopping.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                email_worker_logger.exception('Email worker iteration failed')
+                await asyncio.sleep(1)
+        email_worker_logger.info('Email worker %s stopped', self.consumer)
+
+
+async def main():
+    worker = EmailWorker(
+        email_outbox,
+        consumer=f'{socket.gethostname()}-{os.getpid()}',
+        batch_size=settings.email_outbox.batch_size,
+        concurrency=settings.email_outbox.concurrency,
+        block_ms=settings.email_outbox.block_ms,
+        claim_idle_ms=settings.email_outbox.claim_idle_ms,
+    )
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await smtp_pool.close()
+        await redis_client.dispose()
+        tracer.shutdown()
+
+
+if __name__ == '__main__':
+    setup_logging(**settings.logging.model_dump())
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Requests per second through the access log middleware, before and after the pure ASGI rewrite.
+
+    python -m benchmarks.access_log_middleware --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from app.middlewares.log_request_middleware import LogginMiddleware, log_request_logger
+
+
+class LegacyLogginMiddleware(BaseHTTPMiddleware):
+    """The BaseHTTPMiddleware implementation this benchmark compares against"""
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        start_time = time.perf_counter()
+
+        try:
+            body = await request.body()
+            body_str = body.decode('utf-8') if body else None
+        except Exception:
+            body_str = "<unable to read body>"
+
+        response = await call_next(request)
+        process_time = time.perf_counter() - start_time
+
+        log_request_logger.info(
+            f"{request.client.host} - {request.method} {request.url.path} "
+            f"Status: {response.status_code} | Time: {process_time:.4f}s | Body: {body_str}"
+        )
+
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+async def login(request: Request) -> JSONResponse:
+    form = await request.form()
+    return JSONResponse({'email': form['email'], 'token_type': 'Bearer'})
+
+
+def build_app(middleware: list[Middleware]) -> Starlette:
+    return Starlette(routes=[Route('/auth/login', login, methods=['POST'])], middleware=middleware)
+
+
+async def measure(app: Starlette, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app, client=('127.0.0.1', 5000))
+    semaphore = asyncio.Semaphore(concurrency)
+    data = {'email': 'user@example.com', 'password': 'x' * 32}
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        async def one():
+            async with semaphore:
+                response = await client.post('/auth/login', data=data)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, concurrency: int):
+    # records are created and filtered as in production, but not written anywhere
+    log_request_logger.addHandler(logging.NullHandler())
+    log_request_logger.setLevel(logging.INFO)
+    log_request_logger.propagate = False
+
+    cases = {
+        'no middleware': [],
+        'BaseHTTPMiddleware (before)': [Middleware(LegacyLogginMiddleware)],
+        'pure ASGI (after)': [Middleware(LogginMiddleware)],
+        'pure ASGI, body logged': [Middleware(LogginMiddleware, log_body=True)],
+    }
+    for name, middleware in cases.items():
+        app = build_app(middleware)
+        await measure(app, min(requests, 500), concurrency)
+        rps = await measure(app, requests, concurrency)
+        print(f'{name:<30} {rps:>10.0f} req/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
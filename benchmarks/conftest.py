@@ -0,0 +1,49 @@
+"""
+Fixtures of the pytest-benchmark suite, see ``pytest benchmarks`` in the readme.
+
+Keys and users are built once per session, so only the call under test is timed.
+"""
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from pytest_benchmark.utils import parse_compare_fail
+
+import app.core  # noqa: F401, app.core has to be imported before app.utils
+from app.models import User
+from app.utils.jwt_keys import JWTKeyring, SigningKey
+
+# a mean this much slower than the compared baseline fails the run
+REGRESSION_THRESHOLD = 'mean:20%'
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config) -> None:
+    # --benchmark-compare-fail is an error without --benchmark-compare, so the default is only set with it
+    if config.getoption('benchmark_compare', None) and not config.getoption('benchmark_compare_fail', None):
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+
+def _keyring(kid: str, algorithm: str, private_key) -> JWTKeyring:
+    return JWTKeyring([SigningKey(kid, algorithm, private_key, private_key.public_key())], active_kid=kid)
+
+
+@pytest.fixture(scope='session')
+def keyrings() -> dict[str, JWTKeyring]:
+    """Algorithm -> keyring signing with it, an empty keyring is HS256 with the shared secret"""
+    return {
+        'HS256': JWTKeyring([]),
+        'RS256': _keyring('rsa', 'RS256', rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+        'ES256': _keyring('ec', 'ES256', ec.generate_private_key(ec.SECP256R1())),
+        'EdDSA': _keyring('ed25519', 'EdDSA', ed25519.Ed25519PrivateKey.generate()),
+    }
+
+
+@pytest.fixture(scope='session')
+def user() -> User:
+    return User(
+        id=123456,
+        name='Benchmark User',
+        email='benchmark.user@example.com',
+        avatar_url='https://cdn.example.com/avatars/benchmark-user.png',
+        password_hash='$2b$12$' + 'x' * 53,
+        is_verified=True,
+    )
@@ -0,0 +1,91 @@
+"""
+Pool usage of login-like requests: a user lookup followed by a password check that does not need the database.
+
+Compares sessions that keep their connection until the request ends with sessions of
+``DatabaseHelper.session_getter`` that give it back right after the read. The password check is
+simulated with ``--hash-ms`` of sleep. SQLite is used unless ``--db-url`` points to Postgres.
+
+    python -m benchmarks.db_sessions --requests 500 --concurrency 50 --pool-size 2 --hash-ms 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlmodel import SQLModel, select
+
+import app.core  # noqa: F401, app.core has to be imported before app.utils
+from app.core.db_helper import DatabaseHelper
+from app.models import User
+
+EMAIL = 'benchmark@example.com'
+
+
+async def prepare(db_url: str):
+    helper = DatabaseHelper(db_url, echo=False)
+    async with helper.engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with helper.session_factory() as session:
+        if await session.scalar(select(User).where(User.email == EMAIL)) is None:
+            session.add(User(name='benchmark', email=EMAIL, avatar_url='', password_hash=''))
+            await session.commit()
+    await helper.dispose()
+
+
+async def login_like_request(helper: DatabaseHelper, release_after_read: bool, hash_seconds: float):
+    async with helper.session_factory() as session:
+        session.info['release_after_read'] = release_after_read
+        user = await helper.read_scalar(session, select(User).where(User.email == EMAIL))
+        # bcrypt runs in a worker, the request only waits for it
+        await asyncio.sleep(hash_seconds)
+        assert user is not None
+
+
+async def run_case(db_url: str, release_after_read: bool, requests: int, concurrency: int, pool_size: int, hash_seconds: float):
+    helper = DatabaseHelper(db_url, echo=False, pool_size=pool_size, max_overflow=0)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await login_like_request(helper, release_after_read, hash_seconds)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stats = helper.pool_stats()
+    await helper.dispose()
+    return elapsed, stats
+
+
+def main(db_url: str, requests: int, concurrency: int, pool_size: int, hash_ms: float):
+    asyncio.run(prepare(db_url))
+    cases = {
+        'connection held until the request ends': False,
+        'connection released after the read': True,
+    }
+    for name, release_after_read in cases.items():
+        elapsed, stats = asyncio.run(run_case(db_url, release_after_read, requests, concurrency, pool_size, hash_ms / 1000))
+        print(
+            f'{name:<42} {requests / elapsed:>8.0f} req/s  '
+            f'{stats["checkouts"]:>5} checkouts  {stats["max_checked_out"]:>3} max in use (pool size {pool_size})'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db-url', default=None, help='defaults to a temporary SQLite database')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--hash-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    if args.db_url:
+        main(args.db_url, args.requests, args.concurrency, args.pool_size, args.hash_ms)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            main(
+                f'sqlite+aiosqlite:///{os.path.join(directory, "benchmark.db")}',
+                args.requests, args.concurrency, args.pool_size, args.hash_ms
+            )
@@ -0,0 +1,99 @@
+"""
+Per-request cost of logging on the request thread, synchronous file handler vs queue pipeline.
+
+    python -m benchmarks.logging_overhead --requests 20000
+"""
+import argparse
+import logging
+import logging.config
+import tempfile
+import time
+from pathlib import Path
+
+from logging_config import setup_logging
+
+auth_service_logger = logging.getLogger('project.auth_service')
+user_service_logger = logging.getLogger('project.user_service')
+jwt_token_utils_logger = logging.getLogger('project.jwt_token_utils')
+redis_logger = logging.getLogger('project.redis_client')
+log_request_logger = logging.getLogger('project.log_request_logger')
+
+USER = {'id': 1, 'name': 'name', 'email': 'user@example.com', 'avatar_url': 'https://example.com/a.png'}
+
+# the logging.FileHandler setup this benchmark compares against
+SYNC_LOGGING_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {"format": "%(asctime)s %(name)s %(levelname)s %(message)s", "datefmt": "%Y-%m-%d %H:%M:%S"},
+    },
+    "handlers": {
+        "file": {"level": "DEBUG", "class": "logging.FileHandler", "formatter": "default", "mode": "a"},
+    },
+    "loggers": {
+        "": {"handlers": ["file"], "level": "DEBUG", "propagate": True},
+    },
+}
+
+
+def login_with_fstrings(is_password_correct: bool = True):
+    auth_service_logger.info('Login user')
+    user_service_logger.info("Getting user by email")
+    user_service_logger.info("Make query to db, try to find user by email")
+    user_service_logger.info(f"Return User by email {USER}")
+    auth_service_logger.debug(f'{is_password_correct=}')
+    jwt_token_utils_logger.info('Generate token')
+    jwt_token_utils_logger.info('Generate token')
+    auth_service_logger.info('Set data in redis')
+    redis_logger.info('Create new data in redis')
+    log_request_logger.info(f"127.0.0.1 - POST /api/v1/auth/login Status: 200 | Time: {0.0123:.4f}s | Body: None")
+
+
+def login_with_lazy_formatting(is_password_correct: bool = True):
+    auth_service_logger.info('Login user')
+    user_service_logger.info("Getting user by email")
+    user_service_logger.info("Make query to db, try to find user by email")
+    user_service_logger.info("Return User by email, id=%s", USER['id'])
+    auth_service_logger.debug('is_password_correct=%s', is_password_correct)
+    jwt_token_utils_logger.info('Generate token')
+    jwt_token_utils_logger.info('Generate token')
+    auth_service_logger.info('Set data in redis')
+    redis_logger.info('Create new data in redis')
+    log_request_logger.info(
+        '%s - %s %s Status: %s | Time: %.4fs | Body: %s',
+        '127.0.0.1', 'POST', '/api/v1/auth/login', 200, 0.0123, None
+    )
+
+
+def measure(simulate_request, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        simulate_request()
+    return (time.perf_counter() - start) / requests
+
+
+def main(requests: int):
+    with tempfile.TemporaryDirectory() as directory:
+        logfile = str(Path(directory) / 'jwt_auth.log')
+
+        SYNC_LOGGING_CONFIG['handlers']['file']['filename'] = logfile
+        logging.config.dictConfig(SYNC_LOGGING_CONFIG)
+        before = measure(login_with_fstrings, requests)
+
+        cases = {
+            'FileHandler, DEBUG, f-strings (before)': before,
+        }
+        for profile in ('development', 'production'):
+            listener = setup_logging(profile, filename=logfile)
+            cases[f'queue, {profile} profile, lazy %'] = measure(login_with_lazy_formatting, requests)
+            listener.stop()
+
+        for name, seconds in cases.items():
+            print(f'{name:<42} {seconds * 1e6:>8.1f} us/request')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.requests)
@@ -0,0 +1,126 @@
+"""
+Throughput of queued verification emails against a local aiosmtpd server.
+
+Compares one smtplib connection + login per message in a thread pool (the previous send_email)
+with the pooled async transport. ``--rtt-ms`` delays every server reply to mimic a remote server;
+TLS is not used, so the real per-connection cost of the previous implementation is higher still.
+
+    python -m benchmarks.smtp_throughput --emails 1000 --pool-size 4 --rtt-ms 5
+"""
+import argparse
+import asyncio
+import smtplib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+import app.core  # noqa: F401, app.core has to be imported before app.utils
+from app.utils.smtp_pool import SMTPConnectionPool
+
+LOGIN, PASSWORD = 'sender@example.com', 'password'
+
+
+class SlowHandler:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.messages = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        await asyncio.sleep(self.rtt)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        self.messages += 1
+        return '250 OK'
+
+
+def authenticator(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def make_message(number: int) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = LOGIN
+    msg['To'] = f'user{number}@example.com'
+    msg['Subject'] = 'Confirm email'
+    msg.attach(MIMEText(f'Hello press the link to confirm your gmail: http://localhost/verify?token={number}', 'plain'))
+    return msg
+
+
+def send_with_new_connection(host: str, port: int, msg: MIMEMultipart):
+    server = smtplib.SMTP(host, port)
+    try:
+        server.login(LOGIN, PASSWORD)
+        server.sendmail(LOGIN, msg['To'], msg.as_string())
+    finally:
+        server.quit()
+
+
+async def per_message_connections(host: str, port: int, emails: int, threads: int) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, send_with_new_connection, host, port, make_message(number))
+            for number in range(emails)
+        ))
+    return time.perf_counter() - start
+
+
+async def pooled_connections(host: str, port: int, emails: int, pool_size: int) -> float:
+    pool = SMTPConnectionPool(host, port, login=LOGIN, password=PASSWORD, size=pool_size, use_tls=False)
+    start = time.perf_counter()
+    await asyncio.gather(*(pool.send(make_message(number)) for number in range(emails)))
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    return elapsed
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_case(name: str, handler: SlowHandler, emails: int, elapsed: float):
+    print(f'{name:<40} {emails / elapsed:>8.0f} emails/s  {handler.connections:>5} connections')
+
+
+def main(emails: int, pool_size: int, threads: int, rtt_ms: float):
+    cases = {
+        f'new connection per email ({threads} threads)':
+            lambda host, port: per_message_connections(host, port, emails, threads),
+        f'pooled async (size {pool_size})':
+            lambda host, port: pooled_connections(host, port, emails, pool_size),
+    }
+    for name, case in cases.items():
+        handler = SlowHandler(rtt_ms / 1000)
+        controller = Controller(
+            handler, hostname='127.0.0.1', port=free_port(),
+            authenticator=authenticator, auth_require_tls=False, auth_required=True
+        )
+        controller.start()
+        try:
+            elapsed = asyncio.run(case(controller.hostname, controller.port))
+        finally:
+            controller.stop()
+        run_case(name, handler, emails, elapsed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--emails', type=int, default=1000)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=None, help='threads for the previous implementation, defaults to --pool-size')
+    parser.add_argument('--rtt-ms', type=float, default=5)
+    args = parser.parse_args()
+    main(args.emails, args.pool_size, args.threads or args.pool_size, args.rtt_ms)
@@ -0,0 +1,35 @@
+import pytest
+
+from app.utils import create_token, decode_jwt_token, generate_email_verify_token
+from benchmarks.token_payloads import SECRET_KEY, token_payload
+
+ALGORITHMS = ['HS256', 'RS256', 'ES256', 'EdDSA']
+PAYLOAD_SIZES = ['minimal', 'claims', 'large']
+
+
+@pytest.mark.parametrize('size', PAYLOAD_SIZES)
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_create_token(benchmark, keyrings, user, algorithm, size):
+    payload = token_payload(size, user)
+
+    token = benchmark(create_token, payload, SECRET_KEY, 'HS256', keyrings[algorithm])
+
+    assert token.count('.') == 2
+
+@pytest.mark.parametrize('size', PAYLOAD_SIZES)
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_decode_jwt_token(benchmark, keyrings, user, algorithm, size):
+    payload = token_payload(size, user)
+    token = create_token(payload, SECRET_KEY, 'HS256', keyrings[algorithm])
+
+    decoded = benchmark(decode_jwt_token, token, SECRET_KEY, 'HS256', keyrings[algorithm])
+
+    assert decoded['jti'] == payload['jti']
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_generate_email_verify_token(benchmark, keyrings, user, algorithm):
+    payload = {'sub': user.email, 'user_id': user.id}
+
+    token = benchmark(generate_email_verify_token, payload, SECRET_KEY, 'HS256', keyrings[algorithm])
+
+    assert token.count('.') == 2
@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import hash_password, password_is_correct
+from app.utils.password import Argon2Backend, BcryptBackend
+
+PASSWORD = 'benchmark password'
+
+# one round per sample, the costs below take milliseconds to a quarter of a second each
+BACKENDS = {
+    'bcrypt-4': BcryptBackend(rounds=4),
+    'bcrypt-10': BcryptBackend(rounds=10),
+    'bcrypt-12': BcryptBackend(rounds=12),
+    'argon2id-t1-m19MiB': Argon2Backend(time_cost=1, memory_cost=19 * 1024, parallelism=1),
+    'argon2id-t3-m64MiB': Argon2Backend(time_cost=3, memory_cost=64 * 1024, parallelism=4),
+}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_hash_password(benchmark, backend):
+    with patch('app.utils.password.password_hash_backend', BACKENDS[backend]):
+        hashed_password = benchmark.pedantic(hash_password, args=(PASSWORD,), rounds=5, warmup_rounds=1)
+
+    assert BACKENDS[backend].identifies(hashed_password)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_password_is_correct(benchmark, backend):
+    with patch('app.utils.password.password_hash_backend', BACKENDS[backend]):
+        hashed_password = hash_password(PASSWORD)
+        is_correct = benchmark.pedantic(
+            password_is_correct, args=(PASSWORD.encode(), hashed_password), rounds=5, warmup_rounds=1
+        )
+
+    assert is_correct
@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from app.core import settings
+from app.schemas import OutputUserSchema, LoginOutputSchema
+from app.services.auth_service import _user_claims, get_user_from_claims
+
+
+def test_output_user_schema_from_model_dump(benchmark, user):
+    # what register, verify-email and /users/me return
+    output = benchmark(lambda: OutputUserSchema(**user.model_dump()))
+
+    assert output.id == user.id
+
+def test_output_user_schema_model_validate(benchmark, user):
+    output = benchmark(OutputUserSchema.model_validate, user, from_attributes=True)
+
+    assert output.id == user.id
+
+def test_user_model_dump(benchmark, user):
+    data = benchmark(user.model_dump)
+
+    assert data['email'] == user.email
+
+def test_user_claims(benchmark, user):
+    claims = benchmark(_user_claims, user)
+
+    assert claims['usr']['email'] == user.email
+
+def test_get_user_from_claims(benchmark, user):
+    payload = {'sub': str(user.id), **_user_claims(user)}
+
+    with patch.object(settings.jwt, 'user_claims_in_access_token', True):
+        output = benchmark(get_user_from_claims, payload)
+
+    assert output.email == user.email
+
+def test_login_output_schema(benchmark):
+    output = benchmark(LoginOutputSchema, refresh_token='r' * 300, access_token='a' * 300, token_type='Bearer')
+
+    assert output.token_type == 'Bearer'
@@ -0,0 +1,21 @@
+"""Inputs of the JWT benchmarks"""
+import time
+import uuid
+
+from app.models import User
+
+SECRET_KEY = 'benchmark secret key'
+
+
+def token_payload(size: str, user: User) -> dict:
+    """Access token payloads: the minimal one, one with user claims, and one with 50 extra claims"""
+    now = int(time.time())
+    payload = {'sub': str(user.id), 'type': 'access', 'iat': now, 'exp': now + 60, 'jti': uuid.uuid4().hex, 'sid': uuid.uuid4().hex}
+    if size in ('claims', 'large'):
+        payload['usr'] = {
+            'name': user.name, 'email': user.email, 'avatar_url': user.avatar_url, 'is_verified': user.is_verified
+        }
+        payload['ucv'] = 1
+    if size == 'large':
+        payload.update({f'claim_{index}': uuid.uuid4().hex for index in range(50)})
+    return payload
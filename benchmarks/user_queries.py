@@ -0,0 +1,98 @@
+"""
+Per-lookup overhead of the user-by-email query: statement construction, SQL compilation and execution.
+
+The previous code built ``select(User).where(User.email == email)`` on every call; the user service now
+binds values into a statement built once. Execution runs against SQLite unless ``--db-url`` is given,
+the asyncpg prepared statement cache only shows up with Postgres.
+
+    python -m benchmarks.user_queries --lookups 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlmodel import SQLModel, select
+
+import app.core  # noqa: F401, app.core has to be imported before app.utils
+from app.core.db_helper import DatabaseHelper
+from app.models import User
+from app.services.user_service import USER_BY_EMAIL_STMT
+
+EMAIL = 'benchmark@example.com'
+
+
+def per_lookup_us(elapsed: float, lookups: int) -> float:
+    return elapsed / lookups * 1_000_000
+
+
+def construction_and_compilation(lookups: int, dialect) -> dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        select(User).where(User.email == EMAIL)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        select(User).where(User.email == EMAIL).compile(dialect=dialect)
+    build_and_compile = time.perf_counter() - start
+
+    return {
+        'build select() per lookup': per_lookup_us(build, lookups),
+        'build and compile per lookup (no cache)': per_lookup_us(build_and_compile, lookups),
+    }
+
+
+async def execute(db_url: str, lookups: int, query_cache_size: int, prebuilt: bool) -> float:
+    helper = DatabaseHelper(db_url, echo=False, query_cache_size=query_cache_size)
+    async with helper.session_factory() as session:
+        # warm up the pool connection and the caches
+        await session.scalar(USER_BY_EMAIL_STMT, {'email': EMAIL})
+        start = time.perf_counter()
+        for _ in range(lookups):
+            if prebuilt:
+                await session.scalar(USER_BY_EMAIL_STMT, {'email': EMAIL})
+            else:
+                await session.scalar(select(User).where(User.email == EMAIL))
+        elapsed = time.perf_counter() - start
+    await helper.dispose()
+    return per_lookup_us(elapsed, lookups)
+
+
+async def prepare(db_url: str):
+    helper = DatabaseHelper(db_url, echo=False)
+    async with helper.engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    async with helper.session_factory() as session:
+        if await session.scalar(USER_BY_EMAIL_STMT, {'email': EMAIL}) is None:
+            session.add(User(name='benchmark', email=EMAIL, avatar_url='', password_hash=''))
+            await session.commit()
+    dialect = helper.engine.dialect
+    await helper.dispose()
+    return dialect
+
+
+def main(db_url: str, lookups: int):
+    dialect = asyncio.run(prepare(db_url))
+    results = construction_and_compilation(lookups, dialect)
+    results.update({
+        'execute, new select(), compiled cache off': asyncio.run(execute(db_url, lookups, 0, prebuilt=False)),
+        'execute, new select(), compiled cache on': asyncio.run(execute(db_url, lookups, 500, prebuilt=False)),
+        'execute, prebuilt statement with bindparam': asyncio.run(execute(db_url, lookups, 500, prebuilt=True)),
+    })
+    for name, microseconds in results.items():
+        print(f'{name:<45} {microseconds:>8.1f} µs/lookup')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db-url', default=None, help='defaults to a temporary SQLite database')
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.db_url:
+        main(args.db_url, args.lookups)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            main(f'sqlite+aiosqlite:///{os.path.join(directory, "benchmark.db")}', args.lookups)
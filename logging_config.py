@@ -1,4 +1,7 @@
+import atexit
 import logging.config
+import logging.handlers
+import queue
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -12,10 +15,13 @@ LOGGING_CONFIG = {
     "handlers": {
         "file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
+            "()": "logging_config.BatchingRotatingFileHandler",
             "filename": "jwt_auth.log",
             "formatter": "default",
             "mode": "a",
+            "maxBytes": 10 * 1024 * 1024,
+            "backupCount": 5,
+            "encoding": "utf-8",
         },
         "console": {
             "level": "ERROR",
@@ -32,5 +38,123 @@ LOGGING_CONFIG = {
     },
 }
 
-def setup_logging():
-    logging.config.dictConfig(LOGGING_CONFIG)
+# loggers called on every request, production keeps only their warnings and errors
+HOT_PATH_LOGGERS = (
+    "project.auth_service",
+    "project.user_service",
+    "project.user_cache",
+    "project.redis_client",
+    "project.jwt_token_utils",
+    "project.password",
+    "project.database_helper",
+    "sqlalchemy",
+)
+
+PROFILES = {
+    "development": {
+        "": "DEBUG",
+    },
+    "production": {
+        "": "INFO",
+        **{name: "WARNING" for name in HOT_PATH_LOGGERS},
+    },
+}
+
+
+class BatchingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-based rotating file handler that flushes once per ``flush_every`` records.
+
+    Used behind a ``BatchingQueueListener``, which also flushes whenever the queue runs empty,
+    so records are only held back while there is more logging right behind them.
+    """
+    def __init__(self, *args, flush_every: int = 64, **kwargs):
+        self.flush_every = flush_every
+        self._unflushed = 0
+        super().__init__(*args, **kwargs)
+
+    def flush(self):
+        # StreamHandler.emit flushes after every record, defer it until the batch is full
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush_batch()
+
+    def flush_batch(self):
+        self._unflushed = 0
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # the queue handler is the only root handler and the listener lives in this process,
+        # so skip the record copy and leave formatting (asctime, exc_info) to the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                if isinstance(handler, BatchingRotatingFileHandler):
+                    handler.flush_batch()
+        return super().dequeue(block)
+
+    def stop(self):
+        # called from atexit too, QueueListener.stop fails when the thread is already stopped
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(
+        profile: str = "development",
+        use_queue: bool = True,
+        filename: str = "jwt_auth.log",
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        flush_every: int = 64,
+) -> BatchingQueueListener | None:
+    """
+    Configure logging for the given profile.
+
+    With ``use_queue`` the root logger only puts records on a queue, a background thread
+    formats them and writes the file, so request handlers never block on file I/O.
+    """
+    config = {
+        **LOGGING_CONFIG,
+        "handlers": {
+            **LOGGING_CONFIG["handlers"],
+            "file": {
+                **LOGGING_CONFIG["handlers"]["file"],
+                "filename": filename,
+                "maxBytes": max_bytes,
+                "backupCount": backup_count,
+                "flush_every": flush_every if use_queue else 1,
+            },
+        },
+    }
+    logging.config.dictConfig(config)
+
+    for name, level in PROFILES[profile].items():
+        logging.getLogger(name).setLevel(level)
+
+    if not use_queue:
+        return None
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
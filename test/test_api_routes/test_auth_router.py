@@ -1,11 +1,15 @@
 from unittest.mock import patch, AsyncMock
 
+from sqlalchemy import event
+
 from app.api.v1.auth_router import check_is_user_verify_email, refresh_token
-from app.core import settings
+from app.core import settings, db_helper
 from app.main import app
 from app.models import User
 from app.schemas import CreateUserSchema, LoginUserSchema, LoginOutputSchema
-from app.services import get_user_by_email
+from app.services import get_user_by_email, create_user
+from app.services.user_service import change_user_verify_status
+from app.utils import hash_password, user_cache, rate_limiter
 from test.utils.utils import random_lower_string, random_email
 
 async def test_register_user(client, db_session):
@@ -15,7 +19,7 @@ async def test_register_user(client, db_session):
         avatar_url = random_lower_string(),
         password = random_lower_string()
     )
-    with patch('app.services.auth_service.send_email'):
+    with patch('app.services.auth_service.email_outbox.enqueue_verification_email', new_callable=AsyncMock):
         response = client.post(
             f'{settings.api_prefix}/auth/register',
             json=body_data.model_dump()
@@ -33,7 +37,7 @@ def test_register_user_email_already_exists(client, db_session):
         avatar_url = random_lower_string(),
         password = random_lower_string()
     )
-    with patch('app.services.auth_service.send_email'):
+    with patch('app.services.auth_service.email_outbox.enqueue_verification_email', new_callable=AsyncMock):
         client.post(
             f'{settings.api_prefix}/auth/register',
             json=body_data.model_dump()
@@ -98,3 +102,48 @@ def test_login_user_failed_user_with_email_not_found(client, fake_login_user_dat
 
     assert response.json() == {'detail': 'User with this email not found'}
     assert response.status_code == 404
+
+async def test_login_user_makes_one_db_query(client, db_session):
+    password = random_lower_string()
+    user = await create_user(db_session, User(
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password_hash = hash_password(password).decode()
+    ))
+    await change_user_verify_status(user, db_session)
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_helper.engine.sync_engine, 'before_cursor_execute', count_statement)
+    try:
+        with patch.object(user_cache, 'enabled', False):
+            response = client.post(
+                f"{settings.api_prefix}/auth/login",
+                data={'email': user.email, 'password': password}
+            )
+    finally:
+        event.remove(db_helper.engine.sync_engine, 'before_cursor_execute', count_statement)
+
+    assert response.status_code == 200
+    assert len(statements) == 1, 'user row should be loaded once per login'
+
+def test_login_is_rate_limited_before_the_user_is_loaded(client):
+    email = random_email()
+    with (
+        patch.object(rate_limiter, 'enabled', True),
+        patch.object(rate_limiter, 'key_prefix', f'{random_lower_string()}:'),
+        patch('app.api.v1.auth_router.get_user_by_email', new_callable=AsyncMock, return_value=None) as get_user_by_email_mock,
+    ):
+        responses = [
+            client.post(f"{settings.api_prefix}/auth/login", data={'email': email, 'password': random_lower_string()})
+            for _ in range(settings.rate_limit.login_by_email.capacity + 1)
+        ]
+
+    assert all(response.status_code == 404 for response in responses[:-1])
+    assert responses[-1].status_code == 429
+    assert int(responses[-1].headers['Retry-After']) > 0
+    assert get_user_by_email_mock.await_count == settings.rate_limit.login_by_email.capacity
+
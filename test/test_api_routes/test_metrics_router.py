@@ -0,0 +1,51 @@
+import uuid
+
+from app.core import settings
+from app.services.auth_service import _generate_pair_token
+
+
+def test_metrics_are_labelled_by_route_template(client):
+    client.get(f'{settings.api_prefix}/users/me')
+    client.get('/.well-known/jwks.json')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    body = response.text
+    assert (
+        f'http_request_duration_seconds_count{{method="GET",route="{settings.api_prefix}/users/me",status="403"}}'
+        in body
+    )
+    assert 'http_request_duration_seconds_count{method="GET",route="/.well-known/jwks.json",status="200"}' in body
+    assert 'http_requests_in_progress{method="GET",route="/metrics"} 1.0' in body
+
+def test_metrics_expose_pool_redis_password_and_token_stats(client):
+    body = client.get('/metrics').text
+
+    for name in (
+        'db_pool_checked_out', 'db_pool_overflow', 'db_pool_connect_seconds',
+        'redis_command_errors_total', 'password_hash_duration_seconds',
+        'password_hasher_queue_depth', 'jwt_decode_failures_total', 'rate_limit_requests_total',
+    ):
+        assert f'# TYPE {name} ' in body
+
+def test_unmatched_paths_share_one_label(client):
+    client.get('/no/such/path/1')
+    client.get('/no/such/path/2')
+
+    body = client.get('/metrics').text
+
+    assert 'route="<unmatched>",status="404"' in body
+    assert '/no/such/path' not in body
+
+def test_metrics_export_redis_pipelines_run_inside_the_block(client):
+    access_token = _generate_pair_token(999999, None, uuid.uuid4().hex)['access_token']
+
+    response = client.get(
+        f'{settings.api_prefix}/users/me/sessions', headers={'Authorization': f'Bearer {access_token}'}
+    )
+    body = client.get('/metrics').text
+
+    assert response.status_code == 200
+    assert 'redis_command_duration_seconds_count{command="list_sessions"}' in body
@@ -0,0 +1,89 @@
+from unittest.mock import patch, AsyncMock
+
+from app.core import settings
+from app.models import User
+from app.services.auth_service import _generate_pair_token, _user_claims
+from test.utils.utils import random_lower_string, random_email
+
+
+def test_read_current_user_from_token_claims(client):
+    user = User(
+        id = 1,
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password_hash = random_lower_string(),
+        is_verified = True
+    )
+
+    with (
+        patch.object(settings.jwt, 'user_claims_in_access_token', True),
+        patch('app.core.security.get_user_by_id', new_callable=AsyncMock) as get_user_by_id_mock,
+    ):
+        access_token = _generate_pair_token(user.id, _user_claims(user))['access_token']
+        response = client.get(
+            f'{settings.api_prefix}/users/me',
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+
+        assert response.status_code == 200
+        assert response.json()['email'] == user.email
+        get_user_by_id_mock.assert_not_called()
+
+def test_read_current_user_stale_claims_version_goes_to_db(client):
+    user = User(
+        id = 1,
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password_hash = random_lower_string(),
+        is_verified = True
+    )
+
+    with patch.object(settings.jwt, 'user_claims_in_access_token', True):
+        access_token = _generate_pair_token(user.id, {**_user_claims(user), 'ucv': 0})['access_token']
+
+        with patch('app.core.security.get_user_by_id', new_callable=AsyncMock, return_value=user) as get_user_by_id_mock:
+            response = client.get(
+                f'{settings.api_prefix}/users/me',
+                headers={'Authorization': f'Bearer {access_token}'}
+            )
+
+        assert response.status_code == 200
+        get_user_by_id_mock.assert_awaited_once()
+
+def test_read_users_batch_needs_internal_token(client):
+    with patch.object(settings, 'internal_api_token', random_lower_string()):
+        response = client.post(
+            f'{settings.api_prefix}/users/batch',
+            json={'ids': [1]},
+            headers={'X-Internal-Token': random_lower_string()}
+        )
+
+    assert response.status_code == 403
+
+def test_read_users_batch(client):
+    user = User(
+        id = 1,
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password_hash = random_lower_string(),
+        is_verified = True
+    )
+    token = random_lower_string()
+
+    with (
+        patch.object(settings, 'internal_api_token', token),
+        patch('app.api.v1.user_router.get_users_batch', new_callable=AsyncMock, return_value=[user]) as get_users_batch_mock,
+    ):
+        response = client.post(
+            f'{settings.api_prefix}/users/batch',
+            json={'ids': [user.id], 'emails': [user.email]},
+            headers={'X-Internal-Token': token}
+        )
+
+    assert response.status_code == 200
+    assert response.json()[0]['email'] == user.email
+    get_users_batch_mock.assert_awaited_once_with([user.id], [user.email])
+
@@ -0,0 +1,18 @@
+from unittest.mock import patch
+
+from app.cli.calibrate_password_hash import calibrate
+
+
+def test_calibrate_picks_highest_cost_within_target():
+    # every bcrypt round doubles the time: 4 -> 1 ms, 5 -> 2 ms, ...
+    with patch('app.cli.calibrate_password_hash.measure', side_effect=lambda backend, samples: 2 ** (backend.rounds - 4)):
+        measurements, chosen = calibrate('bcrypt', target_ms=10)
+
+    assert [measurement.cost for measurement in measurements] == [4, 5, 6, 7, 8]
+    assert chosen.cost == 7
+
+def test_calibrate_reports_when_lowest_cost_is_too_slow():
+    measurements, chosen = calibrate('argon2id', target_ms=0, samples=1, memory_cost=1024, parallelism=1)
+
+    assert len(measurements) == 1
+    assert chosen is None
@@ -0,0 +1,144 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import pytest
+from argon2 import PasswordHasher as Argon2Hasher
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cli.import_users import Checkpoint, PostgresUserLoader, import_users, prepare_batch
+from app.services import get_user_by_email
+from app.utils.password import password_is_correct
+from test.conftest import DB_URL
+from test.utils.utils import random_email
+
+PASSWORD_HASH = bcrypt.hashpw(b'password', bcrypt.gensalt(4)).decode()
+
+
+class RecordingLoader:
+    def __init__(self):
+        self.batches = []
+
+    async def load(self, records: list[tuple]) -> tuple[int, int]:
+        self.batches.append(records)
+        return len(records), 0
+
+
+def write_csv(path, rows: list[dict]):
+    lines = ['name,email,avatar_url,password,password_hash']
+    lines += [f"{row['name']},{row['email']},,{row.get('password', '')},{row.get('password_hash', '')}" for row in rows]
+    path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.mark.asyncio
+async def test_prepare_batch_hashes_plaintext_and_keeps_bcrypt_hashes():
+    rows = [
+        {'name': 'plain', 'email': 'plain@example.com', 'password': 'password'},
+        {'name': 'hashed', 'email': 'hashed@example.com', 'password_hash': PASSWORD_HASH},
+        {'name': 'no email', 'password': 'password'},
+        {'name': 'bad hash', 'email': 'bad@example.com', 'password_hash': 'not a bcrypt hash'},
+    ]
+
+    with ThreadPoolExecutor() as executor:
+        records, invalid = await prepare_batch(rows, executor, verified=True)
+
+    assert invalid == 2
+    assert [record[1] for record in records] == ['plain@example.com', 'hashed@example.com']
+    assert bcrypt.checkpw(b'password', records[0][3].encode())
+    assert records[1][3] == PASSWORD_HASH
+    assert all(record[4] is True for record in records)
+
+@pytest.mark.asyncio
+async def test_prepare_batch_hashes_passwords_that_look_like_hashes_and_keeps_argon2_hashes():
+    argon2_hash = Argon2Hasher(time_cost=1, memory_cost=1024, parallelism=1).hash('password')
+    rows = [
+        {'name': 'looks hashed', 'email': 'plain@example.com', 'password': PASSWORD_HASH},
+        {'name': 'argon2', 'email': 'argon2@example.com', 'password_hash': argon2_hash},
+        {'name': 'bad argon2', 'email': 'bad@example.com', 'password_hash': '$argon2id$not a hash'},
+    ]
+
+    with ThreadPoolExecutor() as executor:
+        records, invalid = await prepare_batch(rows, executor, verified=False)
+
+    assert invalid == 1
+    assert records[0][3] != PASSWORD_HASH
+    assert password_is_correct(PASSWORD_HASH.encode(), records[0][3].encode())
+    assert records[1][3] == argon2_hash
+
+@pytest.mark.asyncio
+async def test_import_users_counts_malformed_jsonl_lines_as_invalid(tmp_path):
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join([
+        json.dumps({'name': 'first', 'email': 'first@example.com', 'password_hash': PASSWORD_HASH}),
+        '{"name": "broken", "email": ',
+        '["not", "an", "object"]',
+        json.dumps({'name': 'last', 'email': 'last@example.com', 'password_hash': PASSWORD_HASH}),
+    ]))
+    loader = RecordingLoader()
+
+    with ThreadPoolExecutor() as executor:
+        stats = await import_users(path, loader, executor, file_format='jsonl', batch_size=2)
+
+    assert (stats.read, stats.inserted, stats.invalid) == (4, 2, 2)
+    assert [record[1] for batch in loader.batches for record in batch] == ['first@example.com', 'last@example.com']
+
+@pytest.mark.asyncio
+async def test_import_users_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / 'users.csv'
+    write_csv(path, [{'name': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': PASSWORD_HASH} for i in range(5)])
+    checkpoint = Checkpoint(tmp_path / 'users.csv.checkpoint')
+    checkpoint.save(3)
+    loader = RecordingLoader()
+
+    with ThreadPoolExecutor() as executor:
+        stats = await import_users(path, loader, executor, batch_size=1, checkpoint=checkpoint)
+
+    assert stats.resumed_from == 3
+    assert [batch[0][1] for batch in loader.batches] == ['user3@example.com', 'user4@example.com']
+    assert checkpoint.load() == 5
+
+@pytest.mark.asyncio
+async def test_import_users_copies_into_user_table_and_skips_existing(tmp_path, db_session: AsyncSession):
+    emails = [random_email() for _ in range(3)]
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join(
+        json.dumps({'name': 'imported', 'email': email, 'avatar_url': '', 'password_hash': PASSWORD_HASH})
+        for email in [*emails, emails[0]]
+    ))
+    loader = await PostgresUserLoader.connect(DB_URL)
+
+    try:
+        with ThreadPoolExecutor() as executor:
+            stats = await import_users(path, loader, executor, file_format='jsonl', batch_size=2)
+            again = await import_users(path, loader, executor, file_format='jsonl', batch_size=10)
+    finally:
+        await loader.close()
+
+    assert (stats.read, stats.inserted, stats.updated, stats.skipped) == (4, 3, 0, 1)
+    assert (again.inserted, again.updated, again.skipped) == (0, 0, 4)
+    user = await get_user_by_email(emails[1], db_session, with_password_hash=True)
+    assert user.password_hash == PASSWORD_HASH
+
+@pytest.mark.asyncio
+async def test_import_users_counts_updated_users_apart_from_inserted(tmp_path):
+    emails = [random_email() for _ in range(3)]
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join(
+        json.dumps({'name': 'imported', 'email': email, 'avatar_url': '', 'password_hash': PASSWORD_HASH})
+        for email in emails
+    ))
+    loader = await PostgresUserLoader.connect(DB_URL)
+    updating_loader = await PostgresUserLoader.connect(DB_URL, on_conflict='update')
+
+    try:
+        with ThreadPoolExecutor() as executor:
+            await import_users(path, loader, executor, file_format='jsonl', batch_size=2)
+            path.write_text(path.read_text() + '\n' + json.dumps(
+                {'name': 'new', 'email': random_email(), 'avatar_url': '', 'password_hash': PASSWORD_HASH}
+            ))
+            stats = await import_users(path, updating_loader, executor, file_format='jsonl', batch_size=10)
+    finally:
+        await loader.close()
+        await updating_loader.close()
+
+    assert (stats.read, stats.inserted, stats.updated, stats.skipped) == (4, 1, 3, 0)
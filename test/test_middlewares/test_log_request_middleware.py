@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.middlewares import LogginMiddleware
+
+
+async def echo_size(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(str(len(await request.body())))
+
+
+def make_client(**options) -> TestClient:
+    app = Starlette(routes=[Route('/login', echo_size, methods=['POST'])])
+    app.add_middleware(LogginMiddleware, log_body=True, **options)
+    return TestClient(app)
+
+def logged_body(caplog) -> str:
+    record = next(record for record in caplog.records if record.name == 'project.log_request_logger')
+    return record.getMessage().rsplit('| Body: ', 1)[1]
+
+
+@pytest.mark.parametrize('body, content_type, expected', [
+    (b'{"email": "a@b.c", "password": "se\\"cret"}', 'application/json', '{"email": "a@b.c", "password": "***"}'),
+    (b'{"user": {"Password": "secret"}}', 'application/json; charset=utf-8', '{"user": {"Password": "***"}}'),
+    (b'email=a%40b.c&password=se%26cret', 'application/x-www-form-urlencoded', 'email=a%40b.c&password=***'),
+    (b'{"password": "sec', 'application/json', '<17 bytes, application/json>'),
+    (b'--x\r\nContent-Disposition: form-data; name="password"\r\n\r\nsecret\r\n--x--', 'multipart/form-data; boundary=x',
+     '<69 bytes, multipart/form-data>'),
+    (b'secret', '', '<6 bytes, no content-type>'),
+])
+def test_redact_by_content_type(body, content_type, expected):
+    middleware = LogginMiddleware(echo_size)
+
+    assert middleware._redact(body, content_type, len(body)) == expected
+
+def test_multipart_login_body_is_not_logged(caplog):
+    caplog.set_level(logging.INFO, logger='project.log_request_logger')
+
+    response = make_client().post('/login', data={'email': 'a@b.c', 'password': 'secret'}, files={'avatar': b'image'})
+
+    assert response.status_code == 200
+    body = logged_body(caplog)
+    assert 'secret' not in body
+    assert body.endswith('bytes, multipart/form-data>')
+
+def test_body_over_limit_is_cut_before_it_is_logged(caplog):
+    caplog.set_level(logging.INFO, logger='project.log_request_logger')
+
+    response = make_client(body_max_bytes=16).post(
+        '/login', content=b'password=secret&note=' + b'x' * 100,
+        headers={'Content-Type': 'application/x-www-form-urlencoded'}
+    )
+
+    # the route still gets the whole body
+    assert response.text == '121'
+    assert logged_body(caplog) == 'password=***'
+
+def test_process_time_header_is_added():
+    response = make_client().post('/login', json={'password': 'secret'})
+
+    assert float(response.headers['X-Process-Time']) > 0
@@ -0,0 +1,68 @@
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from app.middlewares import TracingMiddleware
+from app.utils.tracing import Span, SpanExporter, Tracer
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class ListExporter(SpanExporter):
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+
+def make_client() -> tuple[TestClient, ListExporter]:
+    exporter = ListExporter()
+    app = FastAPI()
+
+    @app.get('/users/{user_id}')
+    async def read_user(user_id: int):
+        return {'id': user_id}
+
+    app.add_middleware(TracingMiddleware, tracer=Tracer(exporter, batch_size=1, export_in_background=False))
+    return TestClient(app), exporter
+
+
+def test_request_span_continues_the_trace_of_traceparent():
+    client, exporter = make_client()
+
+    response = client.get('/users/1', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+
+    span, = exporter.spans
+    assert span.trace_id == TRACE_ID
+    assert span.parent_id == PARENT_ID
+    assert response.headers['X-Trace-Id'] == TRACE_ID
+
+def test_new_trace_id_is_sent_in_the_response():
+    client, exporter = make_client()
+
+    response = client.get('/users/1')
+
+    span, = exporter.spans
+    assert span.parent_id is None
+    assert response.headers['X-Trace-Id'] == span.trace_id
+    assert span.attributes['http.status_code'] == 200
+
+def test_span_is_renamed_to_the_route_template():
+    client, exporter = make_client()
+
+    client.get('/users/1')
+    client.get('/users/2')
+
+    assert [span.name for span in exporter.spans] == ['GET /users/{user_id}'] * 2
+    assert exporter.spans[0].attributes['http.route'] == '/users/{user_id}'
+    assert exporter.spans[0].attributes['http.target'] == '/users/1'
+
+def test_trace_not_sampled_by_the_caller_is_not_recorded():
+    client, exporter = make_client()
+
+    response = client.get('/users/1', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+
+    assert response.status_code == 200
+    assert 'X-Trace-Id' not in response.headers
+    assert exporter.spans == []
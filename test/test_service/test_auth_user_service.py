@@ -1,21 +1,30 @@
-from unittest.mock import patch
+import asyncio
+from unittest.mock import patch, AsyncMock
 
 import pytest
 
-from app.exceptions import UserWithEmailAlreadyExists, UserWithEmailNotFound, PasswordIsIncorrect
+from fastapi.security import HTTPAuthorizationCredentials
+from redis.exceptions import RedisError
+
+from app.exceptions import UserWithEmailAlreadyExists, UserWithEmailNotFound, PasswordIsIncorrect, RefreshTokenReused, \
+    RefreshTokenDoesNotExist, InvalidTokenType, TokenRevoked, VerificationEmailNotQueued
 from app.schemas import CreateUserSchema, OutputUserSchema, LoginUserSchema
-from app.services import register_user, login_user
+from app.core.security import get_current_user
+from app.services import register_user, login_user, refresh_pair_of_tokens, logout_user, get_user_by_email
+from app.services.auth_service import _background_tasks
+from app.utils.password import BcryptBackend, password_is_correct
+from app.utils import email_outbox, password_hasher
 from test.utils.utils import random_lower_string, random_email
 
-async def __register_user(db_session, background_tasks):
+async def __register_user(db_session):
     user_data = CreateUserSchema(
         name = random_lower_string(),
         email = random_email(),
         avatar_url = random_lower_string(),
         password = random_lower_string()
     )
-    with patch("app.services.auth_service.send_email", return_value=None):
-        registered_user: OutputUserSchema = await register_user(user_data, db_session,background_tasks)
+    with patch("app.services.auth_service.email_outbox.enqueue_verification_email", new_callable=AsyncMock):
+        registered_user: OutputUserSchema = await register_user(user_data, db_session)
         return {
             'registered_user': registered_user,
             'user_data': user_data
@@ -23,9 +32,9 @@ async def __register_user(db_session, background_tasks):
 
 
 @pytest.mark.asyncio
-async def test_register_user_success(db_session, background_tasks):
+async def test_register_user_success(db_session):
 
-    users = await __register_user(db_session, background_tasks)
+    users = await __register_user(db_session)
     registered_user = users['registered_user']
 
     assert isinstance(registered_user, OutputUserSchema)
@@ -34,12 +43,34 @@ async def test_register_user_success(db_session, background_tasks):
     assert registered_user.is_verified == False, 'after creating user by default user if not verified'
 
 @pytest.mark.asyncio
-async def test_register_user_failed_email_already_registered(db_session, background_tasks):
-    users = await __register_user(db_session, background_tasks)
+async def test_register_user_failed_email_already_registered(db_session):
+    users = await __register_user(db_session)
     user_data = users['user_data']
 
     with pytest.raises(UserWithEmailAlreadyExists):
-        await register_user(user_data, db_session, background_tasks)
+        await register_user(user_data, db_session)
+
+@pytest.mark.asyncio
+async def test_register_user_is_removed_when_verification_email_is_not_queued(db_session):
+    user_data = CreateUserSchema(
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password = random_lower_string()
+    )
+    failures = email_outbox.enqueue_failures
+
+    with patch.object(email_outbox.redis.redis_client, 'xadd', new_callable=AsyncMock, side_effect=RedisError):
+        with pytest.raises(VerificationEmailNotQueued):
+            await register_user(user_data, db_session)
+
+    assert email_outbox.enqueue_failures == failures + 1
+    assert await get_user_by_email(user_data.email, db_session) is None
+
+    # the client retries once Redis is back
+    with patch("app.services.auth_service.email_outbox.enqueue_verification_email", new_callable=AsyncMock) as enqueue:
+        registered_user = await register_user(user_data, db_session)
+    enqueue.assert_awaited_once_with(user_data.email, registered_user.id)
 
 @pytest.mark.asyncio
 async def test_login_user_failed_email_not_found(db_session):
@@ -51,8 +82,8 @@ async def test_login_user_failed_email_not_found(db_session):
         await login_user(login_user_data, db_session)
 
 @pytest.mark.asyncio
-async def test_login_user_failed_password_is_incorrect(db_session, background_tasks):
-    users = await __register_user(db_session, background_tasks)
+async def test_login_user_failed_password_is_incorrect(db_session):
+    users = await __register_user(db_session)
     user_data: CreateUserSchema = users['user_data']
     login_user_data = LoginUserSchema(
         email = user_data.email,
@@ -61,4 +92,110 @@ async def test_login_user_failed_password_is_incorrect(db_session, background_ta
     with pytest.raises(PasswordIsIncorrect):
         await login_user(login_user_data, db_session)
 
+@pytest.mark.asyncio
+async def test_register_user_concurrent_same_email(db_session_factory):
+    user_data = CreateUserSchema(
+        name = random_lower_string(),
+        email = random_email(),
+        avatar_url = random_lower_string(),
+        password = random_lower_string()
+    )
+
+    async def register():
+        async with db_session_factory() as session:
+            return await register_user(user_data, session)
+
+    with (
+        patch.object(password_hasher, 'hash_password', new_callable=AsyncMock, return_value=b'hashed_password'),
+        patch("app.services.auth_service.email_outbox.enqueue_verification_email", new_callable=AsyncMock),
+    ):
+        results = await asyncio.gather(*(register() for _ in range(200)), return_exceptions=True)
+
+    registered = [result for result in results if isinstance(result, OutputUserSchema)]
+    rejected = [result for result in results if isinstance(result, UserWithEmailAlreadyExists)]
+    assert len(registered) == 1, 'only one registration should win'
+    assert len(rejected) == len(results) - 1
+
+def __bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme='Bearer', credentials=token)
+
+async def __login(db_session):
+    users = await __register_user(db_session)
+    user_data: CreateUserSchema = users['user_data']
+    return await login_user(LoginUserSchema(email=user_data.email, password=user_data.password), db_session)
+
+@pytest.mark.asyncio
+async def test_refresh_pair_of_tokens_rotates_refresh_token(db_session):
+    tokens = await __login(db_session)
+
+    new_tokens = await refresh_pair_of_tokens(__bearer(tokens.refresh_token))
+
+    assert new_tokens.refresh_token != tokens.refresh_token
+    assert await refresh_pair_of_tokens(__bearer(new_tokens.refresh_token))
+
+@pytest.mark.asyncio
+async def test_refresh_pair_of_tokens_reuse_revokes_session(db_session):
+    tokens = await __login(db_session)
+    new_tokens = await refresh_pair_of_tokens(__bearer(tokens.refresh_token))
+
+    with pytest.raises(RefreshTokenReused):
+        await refresh_pair_of_tokens(__bearer(tokens.refresh_token))
+    with pytest.raises(RefreshTokenDoesNotExist):
+        await refresh_pair_of_tokens(__bearer(new_tokens.refresh_token))
+
+@pytest.mark.asyncio
+async def test_refresh_pair_of_tokens_concurrent_refresh_has_one_winner(db_session):
+    tokens = await __login(db_session)
+
+    results = await asyncio.gather(
+        *(refresh_pair_of_tokens(__bearer(tokens.refresh_token)) for _ in range(5)),
+        return_exceptions=True
+    )
+
+    assert len([result for result in results if not isinstance(result, Exception)]) == 1
+
+@pytest.mark.asyncio
+async def test_login_on_second_device_keeps_first_session(db_session):
+    users = await __register_user(db_session)
+    user_data: CreateUserSchema = users['user_data']
+    login_user_data = LoginUserSchema(email=user_data.email, password=user_data.password)
+    laptop_tokens = await login_user(login_user_data, db_session, user_agent='laptop')
+    phone_tokens = await login_user(login_user_data, db_session, user_agent='phone')
+
+    assert await refresh_pair_of_tokens(__bearer(laptop_tokens.refresh_token))
+    assert await refresh_pair_of_tokens(__bearer(phone_tokens.refresh_token))
+
+@pytest.mark.asyncio
+async def test_refresh_pair_of_tokens_rejects_access_token(db_session):
+    tokens = await __login(db_session)
+
+    with pytest.raises(InvalidTokenType):
+        await refresh_pair_of_tokens(__bearer(tokens.access_token))
+    assert await refresh_pair_of_tokens(__bearer(tokens.refresh_token))
+
+@pytest.mark.asyncio
+async def test_logout_user_revokes_both_tokens(db_session):
+    tokens = await __login(db_session)
+    assert await get_current_user(__bearer(tokens.access_token))
+
+    await logout_user(__bearer(tokens.access_token))
+
+    with pytest.raises(TokenRevoked):
+        await get_current_user(__bearer(tokens.access_token))
+    with pytest.raises(RefreshTokenDoesNotExist):
+        await refresh_pair_of_tokens(__bearer(tokens.refresh_token))
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_outdated_cost(db_session):
+    with patch('app.utils.password.password_hash_backend', BcryptBackend(rounds=4)):
+        users = await __register_user(db_session)
+    user_data: CreateUserSchema = users['user_data']
+
+    with patch('app.utils.password.password_hash_backend', BcryptBackend(rounds=5)):
+        await login_user(LoginUserSchema(email=user_data.email, password=user_data.password), db_session)
+        await asyncio.gather(*_background_tasks)
+
+    user = await get_user_by_email(user_data.email, db_session, with_password_hash=True)
+    assert user.password_hash.startswith('$2b$05$')
+    assert password_is_correct(user_data.password.encode(), user.password_hash.encode())
 
@@ -1,11 +1,14 @@
+import asyncio
+
 import pytest
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.exceptions import UserWithEmailAlreadyExists
 from app.models import User
-from app.services import create_user, get_user_by_email, get_user_by_id
-from app.services.user_service import change_user_verify_status
-from app.utils import hash_password
+from app.services import create_user, get_user_by_email, get_user_by_id, get_users_batch
+from app.services.user_service import change_user_verify_status, user_by_id_loader, user_by_email_loader
+from app.utils import hash_password, redis_client, user_cache
+from app.utils.user_cache import MISSING
 from test.utils.utils import random_lower_string, random_email
 
 async def __create_user(db_session: AsyncSession) -> dict:
@@ -33,7 +36,7 @@ async def test_create_user_success(db_session):
 async def test_create_user_failed_email_already_exists(db_session):
     users = await __create_user(db_session)
     user, created_user = users['user'], users['created_user']
-    with pytest.raises(IntegrityError):
+    with pytest.raises(UserWithEmailAlreadyExists):
         await create_user(db_session, user)
 
 @pytest.mark.asyncio
@@ -82,3 +85,91 @@ async def test_change_user_verify_status(db_session):
 
     assert created_user.is_verified == True
 
+@pytest.mark.asyncio
+async def test_get_user_by_email_not_found_is_cached(db_session):
+    some_email = random_email()
+    await get_user_by_email(some_email, db_session)
+    stats = user_cache.stats()
+    keys_loaded = user_by_email_loader.keys_loaded
+
+    user = await get_user_by_email(some_email, db_session)
+
+    assert user is None
+    after = user_cache.stats()
+    assert after['local_hits'] + after['redis_hits'] == stats['local_hits'] + stats['redis_hits'] + 1
+    assert after['misses'] == stats['misses']
+    assert user_by_email_loader.keys_loaded == keys_loaded
+
+@pytest.mark.asyncio
+async def test_create_user_invalidates_not_found_cache(db_session):
+    user = User(
+        name = random_lower_string(),
+        email = random_email(),
+        password_hash = hash_password(random_lower_string()).decode(),
+        avatar_url = random_lower_string(),
+    )
+    assert await get_user_by_email(user.email, db_session) is None
+
+    await create_user(db_session, user)
+    user_by_email = await get_user_by_email(user.email, db_session)
+
+    assert user_by_email is not None
+    assert user_by_email.email == user.email
+
+@pytest.mark.asyncio
+async def test_cached_user_has_no_password_hash(db_session):
+    created_user = (await __create_user(db_session))['created_user']
+    await get_user_by_email(created_user.email, db_session)
+
+    cached_user = await user_cache.get(user_cache.email_key(created_user.email))
+    raw = await redis_client.get_data(user_cache.id_key(created_user.id))
+
+    assert cached_user.email == created_user.email
+    assert cached_user.password_hash is None
+    assert 'password_hash' not in raw
+    user = await get_user_by_email(created_user.email, db_session, with_password_hash=True)
+    assert user.password_hash == created_user.password_hash
+
+@pytest.mark.asyncio
+async def test_not_found_read_before_create_is_not_cached_after_it(db_session):
+    user = User(
+        name = random_lower_string(),
+        email = random_email(),
+        password_hash = hash_password(random_lower_string()).decode(),
+        avatar_url = random_lower_string(),
+    )
+    cache_key = user_cache.email_key(user.email)
+
+    await create_user(db_session, user)
+    # a lookup that read "not found" before the insert and writes it only now
+    await user_cache.set(cache_key, None)
+
+    assert await user_cache.get(cache_key) is MISSING
+    assert (await get_user_by_email(user.email, db_session)).email == user.email
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_loaded_with_one_query(db_session):
+    created_users = [(await __create_user(db_session))['created_user'] for _ in range(3)]
+    user_ids = [user.id for user in created_users]
+    batches = user_by_id_loader.batches
+
+    users = await asyncio.gather(
+        *(get_user_by_id(user_id, db_session) for user_id in user_ids),
+        get_user_by_id(user_ids[0], db_session),
+        get_user_by_id(999999, db_session),
+    )
+
+    assert [user.id for user in users[:4]] == user_ids + [user_ids[0]]
+    assert users[4] is None
+    assert user_by_id_loader.batches == batches + 1
+
+@pytest.mark.asyncio
+async def test_get_users_batch(db_session):
+    first, second = [(await __create_user(db_session))['created_user'] for _ in range(2)]
+    id_batches, email_batches = user_by_id_loader.batches, user_by_email_loader.batches
+
+    users = await get_users_batch([first.id, 999999], [second.email, first.email, random_email()])
+
+    assert sorted(user.id for user in users) == sorted([first.id, second.id])
+    assert user_by_id_loader.batches == id_batches + 1
+    assert user_by_email_loader.batches == email_batches + 1
@@ -0,0 +1,90 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from app.core.settings import JWTKeySettings
+from app.exceptions import InvalidTokenError
+from app.utils import create_token, decode_jwt_token
+from app.utils.jwt_keys import JWTKeyring
+
+
+def write_private_key(path, private_key) -> str:
+    path.write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    ))
+    return str(path)
+
+def write_public_key(path, private_key) -> str:
+    path.write_bytes(private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+    return str(path)
+
+@pytest.fixture(scope='module')
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture(scope='module')
+def ec_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def test_keyring_signs_with_active_key_and_kid(tmp_path, ec_key):
+    keyring = JWTKeyring.from_settings([
+        JWTKeySettings(kid='new', algorithm='ES256', private_key_path=write_private_key(tmp_path / 'new.pem', ec_key))
+    ])
+
+    token = create_token({'sub': '1'}, keyring=keyring)
+
+    assert jwt.get_unverified_header(token) == {'alg': 'ES256', 'kid': 'new', 'typ': 'JWT'}
+    assert decode_jwt_token(token, keyring=keyring) == {'sub': '1'}
+
+def test_keyring_verifies_tokens_of_retiring_key(tmp_path, ec_key, rsa_key):
+    old_settings = JWTKeySettings(
+        kid='old',
+        algorithm='RS256',
+        private_key_path=write_private_key(tmp_path / 'old.pem', rsa_key)
+    )
+    old_token = create_token({'sub': '1'}, keyring=JWTKeyring.from_settings([old_settings]))
+
+    keyring = JWTKeyring.from_settings([
+        JWTKeySettings(kid='new', algorithm='ES256', private_key_path=write_private_key(tmp_path / 'new.pem', ec_key)),
+        JWTKeySettings(
+            kid='old',
+            algorithm='RS256',
+            public_key_path=write_public_key(tmp_path / 'old.pub.pem', rsa_key),
+            status='retiring'
+        ),
+    ])
+
+    assert keyring.active.kid == 'new'
+    assert decode_jwt_token(old_token, keyring=keyring) == {'sub': '1'}
+    assert [key['kid'] for key in keyring.jwks['keys']] == ['new', 'old']
+    assert keyring.jwks['keys'][1]['kty'] == 'RSA'
+    assert 'd' not in keyring.jwks['keys'][0]
+
+def test_keyring_rejects_unknown_kid_and_hs_tokens(tmp_path, ec_key):
+    keyring = JWTKeyring.from_settings([
+        JWTKeySettings(kid='new', algorithm='ES256', private_key_path=write_private_key(tmp_path / 'new.pem', ec_key))
+    ])
+    unknown_kid_token = jwt.encode({'sub': '1'}, ec_key, algorithm='ES256', headers={'kid': 'unknown'})
+
+    with pytest.raises(InvalidTokenError):
+        decode_jwt_token(unknown_kid_token, keyring=keyring)
+    with pytest.raises(InvalidTokenError):
+        decode_jwt_token(create_token({'sub': '1'}, keyring=JWTKeyring([])), keyring=keyring)
+
+def test_keyring_without_active_key_is_rejected(tmp_path, ec_key):
+    with pytest.raises(ValueError):
+        JWTKeyring.from_settings([
+            JWTKeySettings(
+                kid='old',
+                algorithm='ES256',
+                public_key_path=write_public_key(tmp_path / 'old.pub.pem', ec_key),
+                status='retiring'
+            )
+        ])
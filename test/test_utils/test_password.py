@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from app.exceptions import PasswordHasherIsBusy
+from app.utils.password import PasswordHasher, BcryptBackend, Argon2Backend, password_is_correct, password_needs_rehash
+from test.utils.utils import random_lower_string
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_hash_and_check():
+    hasher = PasswordHasher(max_workers=1, max_queue_size=1)
+    password = random_lower_string()
+
+    hashed_password = await hasher.hash_password(password)
+
+    assert await hasher.password_is_correct(password.encode(), hashed_password)
+    assert not await hasher.password_is_correct(b'incorrect password', hashed_password)
+    assert hasher.hash_latency.count == 3
+    hasher.shutdown()
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+
+    running = [asyncio.create_task(hasher.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    assert hasher.queue_depth == 1
+    with pytest.raises(PasswordHasherIsBusy):
+        await hasher.hash_password(random_lower_string())
+    assert hasher.rejected == 1
+
+    release.set()
+    await asyncio.gather(*running)
+    assert hasher.in_flight == 0
+    hasher.shutdown()
+
+def test_bcrypt_hash_with_other_rounds_needs_rehash():
+    hashed_password = BcryptBackend(rounds=4).hash(random_lower_string())
+
+    assert not BcryptBackend(rounds=4).needs_rehash(hashed_password)
+    assert BcryptBackend(rounds=5).needs_rehash(hashed_password)
+
+def test_hashes_of_both_algorithms_are_verified_and_migrated():
+    password = random_lower_string()
+    bcrypt_hash = BcryptBackend(rounds=4).hash(password)
+    argon2_hash = Argon2Backend(time_cost=1, memory_cost=1024, parallelism=1).hash(password)
+
+    with patch('app.utils.password.password_hash_backend', Argon2Backend(time_cost=1, memory_cost=1024, parallelism=1)):
+        assert password_is_correct(password.encode(), bcrypt_hash)
+        assert password_is_correct(password.encode(), argon2_hash)
+        assert not password_is_correct(b'incorrect password', argon2_hash)
+        assert password_needs_rehash(bcrypt_hash)
+        assert not password_needs_rehash(argon2_hash)
+
+    with patch('app.utils.password.password_hash_backend', Argon2Backend(time_cost=2, memory_cost=1024, parallelism=1)):
+        assert password_needs_rehash(argon2_hash)
+
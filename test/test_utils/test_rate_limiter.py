@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.core.settings import RateLimitRule
+from app.utils import redis_client
+from app.utils.rate_limiter import RateLimiter
+from test.utils.utils import random_lower_string
+
+
+def new_rate_limiter() -> RateLimiter:
+    return RateLimiter(redis_client, key_prefix=f'{random_lower_string()}:')
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_limits():
+    rate_limiter = new_rate_limiter()
+    rule = RateLimitRule(capacity=3, per_minute=1)
+
+    results = [await rate_limiter.hit({'ip': rule}) for _ in range(4)]
+
+    assert results[:3] == [0, 0, 0]
+    assert 59 < results[3] <= 60
+    assert rate_limiter.retry_after_header(results[3]) == 60
+    # answered by the Lua script, not the in-memory fallback
+    assert rate_limiter.stats()['local_fallbacks'] == 0
+
+@pytest.mark.asyncio
+async def test_token_is_taken_only_when_every_bucket_has_one():
+    rate_limiter = new_rate_limiter()
+    ip_rule = RateLimitRule(capacity=5, per_minute=1)
+    email_rule = RateLimitRule(capacity=1, per_minute=1)
+
+    assert await rate_limiter.hit({'ip': ip_rule, 'email:a': email_rule}) == 0
+    assert await rate_limiter.hit({'ip': ip_rule, 'email:a': email_rule}) > 0
+    # the refused attempt did not use up the ip bucket
+    for email in 'bcde':
+        assert await rate_limiter.hit({'ip': ip_rule, f'email:{email}': email_rule}) == 0
+    assert await rate_limiter.hit({'ip': ip_rule, 'email:f': email_rule}) > 0
+    assert rate_limiter.stats()['local_fallbacks'] == 0
+
+@pytest.mark.asyncio
+async def test_limits_in_memory_when_redis_is_unavailable():
+    rate_limiter = new_rate_limiter()
+    rule = RateLimitRule(capacity=2, per_minute=60)
+
+    with patch.object(rate_limiter.redis, 'run_script', side_effect=ConnectionError):
+        results = [await rate_limiter.hit({'ip': rule}) for _ in range(3)]
+
+    assert results[:2] == [0, 0]
+    assert 0 < results[2] <= 1
+    assert rate_limiter.stats()['local_fallbacks'] == 3
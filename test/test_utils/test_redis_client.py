@@ -0,0 +1,55 @@
+import pytest
+from redis.exceptions import ResponseError
+
+from app.utils import redis_client
+from test.utils.utils import random_lower_string
+
+
+@pytest.mark.asyncio
+async def test_set_many_and_get_many():
+    keys = [f'test:{random_lower_string()}' for _ in range(3)]
+
+    await redis_client.set_many({keys[0]: 'first', keys[1]: 'second'}, 60)
+
+    assert await redis_client.get_many(keys) == ['first', 'second', None]
+    assert 0 < await redis_client.redis_client.ttl(keys[0]) <= 60
+    assert redis_client.stats()['set_many']['count'] >= 1
+    await redis_client.delete_data(keys)
+
+@pytest.mark.asyncio
+async def test_pipeline_executes_queued_commands_on_exit():
+    key = f'test:{random_lower_string()}'
+
+    async with redis_client.pipeline(name='test_pipeline') as pipe:
+        pipe.set(key, 'value')
+        pipe.expire(key, 60)
+        assert await redis_client.get_data(key) is None
+
+    assert await redis_client.get_data(key) == 'value'
+    assert redis_client.stats()['test_pipeline']['count'] == 1
+    await redis_client.delete_data(key)
+
+@pytest.mark.asyncio
+async def test_pipeline_returns_replies_of_explicit_execute():
+    key = f'test:{random_lower_string()}'
+
+    async with redis_client.pipeline(name='test_explicit_execute') as pipe:
+        pipe.incr(key)
+        pipe.incr(key)
+        assert await pipe.execute() == [1, 2]
+
+    assert await redis_client.get_data(key) == '2'
+    assert redis_client.stats()['test_explicit_execute']['count'] == 1
+    await redis_client.delete_data(key)
+
+@pytest.mark.asyncio
+async def test_failed_command_is_counted_as_error():
+    key = f'test:{random_lower_string()}'
+    await redis_client.set_data(key, 'not a number', 60)
+
+    with pytest.raises(ResponseError):
+        async with redis_client.pipeline(name='test_failing_pipeline') as pipe:
+            pipe.incr(key)
+
+    assert redis_client.stats()['test_failing_pipeline']['errors'] == 1
+    await redis_client.delete_data(key)
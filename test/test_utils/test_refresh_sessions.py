@@ -0,0 +1,49 @@
+import uuid
+
+import pytest
+
+from app.utils import redis_client
+from app.utils.refresh_sessions import RefreshSessionStore
+
+
+@pytest.fixture
+def store():
+    return RefreshSessionStore(redis_client, max_sessions=3, ttl_seconds=60)
+
+@pytest.fixture
+async def user_id(store):
+    user_id = uuid.uuid4().int % 10 ** 9
+    yield user_id
+    await store.revoke_all(user_id)
+
+
+@pytest.mark.asyncio
+async def test_sessions_over_cap_evict_least_recently_used(store, user_id):
+    for session_id in ['first', 'second', 'third']:
+        await store.create(user_id, session_id, f'{session_id}-jti')
+    # using the first session makes the second one the least recently used
+    assert await store.rotate(user_id, 'first', 'first-jti', 'first-jti-2') == 1
+
+    assert await store.create(user_id, 'fourth', 'fourth-jti') == 1
+
+    assert [session.id for session in await store.get_all(user_id)] == ['fourth', 'first', 'third']
+
+@pytest.mark.asyncio
+async def test_rotate_detects_reuse_and_revokes_only_that_session(store, user_id):
+    await store.create(user_id, 'phone', 'phone-jti', user_agent='phone')
+    await store.create(user_id, 'laptop', 'laptop-jti')
+    assert await store.rotate(user_id, 'phone', 'phone-jti', 'phone-jti-2') == 1
+
+    assert await store.rotate(user_id, 'phone', 'phone-jti', 'phone-jti-3') == -1
+    assert await store.rotate(user_id, 'phone', 'phone-jti-2', 'phone-jti-3') == 0
+    assert await store.rotate(user_id, 'laptop', 'laptop-jti', 'laptop-jti-2') == 1
+
+@pytest.mark.asyncio
+async def test_revoke_sessions(store, user_id):
+    await store.create(user_id, 'phone', 'phone-jti', user_agent='phone')
+    await store.create(user_id, 'laptop', 'laptop-jti')
+
+    assert await store.revoke(user_id, ['phone', 'unknown']) == 1
+    sessions = await store.get_all(user_id)
+    assert [session.id for session in sessions] == ['laptop']
+    assert await store.rotate(user_id, 'phone', 'phone-jti', 'phone-jti-2') == 0
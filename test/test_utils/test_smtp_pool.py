@@ -0,0 +1,119 @@
+import asyncio
+import socket
+from email.message import EmailMessage
+from unittest.mock import patch, AsyncMock
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.utils.smtp_pool import SMTPConnectionPool
+from test.utils.utils import random_email
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('refused'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+def make_message(to: str | None = None) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = random_email()
+    message['To'] = to or random_email()
+    message['Subject'] = 'Confirm email'
+    message.set_content('Hello press the link to confirm your gmail')
+    return message
+
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reuses_connection(smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=1, use_tls=False)
+
+    for _ in range(5):
+        await pool.send(make_message())
+    await pool.close()
+
+    assert len(handler.messages) == 5
+    assert pool.connections_opened == 1
+
+@pytest.mark.asyncio
+async def test_smtp_pool_reconnects_broken_connection(smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=1, use_tls=False)
+    await pool.send(make_message())
+
+    broken_client, _ = pool._idle[0]
+    with patch.object(broken_client, 'send_message', new_callable=AsyncMock, side_effect=aiosmtplib.SMTPServerDisconnected('gone')):
+        await pool.send(make_message())
+    await pool.close()
+
+    assert len(handler.messages) == 2
+    assert pool.connections_opened == 2
+
+@pytest.mark.asyncio
+async def test_smtp_pool_closes_connection_when_login_fails(smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPConnectionPool(controller.hostname, controller.port, login='user', password='wrong', size=1, use_tls=False)
+
+    with (
+        patch.object(aiosmtplib.SMTP, 'login', new_callable=AsyncMock, side_effect=aiosmtplib.SMTPAuthenticationError(535, 'bad')),
+        patch.object(aiosmtplib.SMTP, 'close', autospec=True, side_effect=aiosmtplib.SMTP.close) as close,
+    ):
+        with pytest.raises(aiosmtplib.SMTPAuthenticationError):
+            await pool.send(make_message())
+
+    close.assert_called_once()
+    assert not close.call_args.args[0].is_connected
+    assert pool.connections_opened == 0
+    assert handler.messages == []
+
+@pytest.mark.asyncio
+async def test_smtp_pool_keeps_connection_when_recipient_is_refused(smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=1, use_tls=False)
+
+    for _ in range(3):
+        with pytest.raises(aiosmtplib.SMTPRecipientsRefused):
+            await pool.send(make_message(f'refused-{random_email()}'))
+    await pool.send(make_message())
+    await pool.close()
+
+    assert len(handler.messages) == 1
+    assert pool.connections_opened == 1
+
+@pytest.mark.asyncio
+async def test_smtp_pool_closes_connection_when_send_is_cancelled(smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=1, use_tls=False)
+    await pool.send(make_message())
+
+    client, _ = pool._idle[0]
+    with patch.object(client, 'send_message', new_callable=AsyncMock, side_effect=asyncio.CancelledError):
+        with pytest.raises(asyncio.CancelledError):
+            await pool.send(make_message())
+
+    assert pool._idle == []
+    assert not client.is_connected
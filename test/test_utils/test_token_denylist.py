@@ -0,0 +1,91 @@
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import redis_client
+from app.utils.token_denylist import BloomFilter, TokenDenylist
+from test.utils.utils import random_lower_string
+
+
+def new_denylist() -> TokenDenylist:
+    prefix = random_lower_string()
+    return TokenDenylist(redis_client, key_prefix=f'{prefix}:revoked:', stream=f'{prefix}:revoked', capacity=100)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10_000))
+    assert false_positives < 300
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_seen_by_other_workers_after_refresh():
+    revoking_worker = new_denylist()
+    other_worker = TokenDenylist(redis_client, key_prefix=revoking_worker.key_prefix, stream=revoking_worker.stream)
+    jti = uuid.uuid4().hex
+
+    await revoking_worker.revoke(jti, time.time() + 60)
+
+    assert await revoking_worker.is_revoked(jti)
+    assert not await other_worker.is_revoked(jti)
+    assert await other_worker.refresh() == 1
+    assert await other_worker.is_revoked(jti)
+    assert await other_worker.refresh() == 0
+    assert await revoking_worker.refresh() == 1
+    # the revoking worker has the token in its filter already, its stream entry is counted once
+    assert revoking_worker.filter_entries == other_worker.filter_entries == 1
+    assert 0 < await redis_client.redis_client.ttl(revoking_worker._key(jti)) <= 60
+
+@pytest.mark.asyncio
+async def test_not_revoked_token_is_checked_in_memory():
+    denylist = new_denylist()
+    await denylist.revoke(uuid.uuid4().hex, time.time() + 60)
+
+    assert not await denylist.is_revoked(uuid.uuid4().hex)
+    assert not await denylist.is_revoked(None)
+    assert denylist.filter_hits == 0
+
+@pytest.mark.asyncio
+async def test_full_filter_is_rebuilt_on_refresh():
+    denylist = new_denylist()
+    jti = uuid.uuid4().hex
+    await denylist.revoke(jti, time.time() + 60)
+    denylist.filter_entries = denylist.capacity
+
+    await denylist.refresh()
+
+    assert denylist.filter_entries == 1
+    assert await denylist.is_revoked(jti)
+
+@pytest.mark.asyncio
+async def test_revoked_tokens_are_refused_while_the_filter_is_rebuilt():
+    denylist = new_denylist()
+    jtis = [uuid.uuid4().hex for _ in range(5)]
+    for jti in jtis:
+        await denylist.revoke(jti, time.time() + 60)
+    await denylist.refresh()
+    denylist.filter_entries = denylist.capacity
+    seen_while_rebuilding = []
+    late_jti = uuid.uuid4().hex
+    xrange = redis_client.redis_client.xrange
+
+    async def xrange_checking_filter(*args, **kwargs):
+        seen_while_rebuilding.append([await denylist.is_revoked(jti) for jti in jtis])
+        entries = await xrange(*args, **kwargs)
+        if len(entries) < kwargs['count']:
+            # revoked by this worker after the rebuild has read the last of the stream
+            await denylist.revoke(late_jti, time.time() + 60)
+        return entries
+
+    with patch.object(redis_client.redis_client, 'xrange', side_effect=xrange_checking_filter):
+        assert await denylist.refresh(batch_size=2) == 5
+
+    assert all(all(seen) for seen in seen_while_rebuilding)
+    assert await denylist.is_revoked(late_jti)
+    assert all([await denylist.is_revoked(jti) for jti in jtis])
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.utils.tracing import JsonFileExporter, Span, SpanExporter, Tracer, parse_traceparent
+from test.conftest import DB_URL
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class ListExporter(SpanExporter):
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.threads: set[str] = set()
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+        self.threads.add(threading.current_thread().name)
+
+
+def new_tracer(**kwargs) -> tuple[Tracer, ListExporter]:
+    exporter = ListExporter()
+    return Tracer(exporter, batch_size=1, export_in_background=False, **kwargs), exporter
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01') == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-00') == (TRACE_ID, PARENT_ID, False)
+    assert parse_traceparent(f'00-{"0" * 32}-{PARENT_ID}-01') is None
+    assert parse_traceparent('not a traceparent') is None
+    assert parse_traceparent(None) is None
+
+def test_nested_spans_form_one_trace():
+    tracer, exporter = new_tracer()
+
+    with tracer.start_span('request') as root:
+        with tracer.start_span('service') as child:
+            assert tracer.current_span() is child
+        assert tracer.current_span() is root
+
+    child_span, root_span = exporter.spans
+    assert child_span.trace_id == root_span.trace_id
+    assert child_span.parent_id == root_span.span_id
+    assert root_span.parent_id is None
+    assert root_span.duration >= child_span.duration
+
+def test_trace_is_continued_from_traceparent():
+    tracer, exporter = new_tracer(sample_rate=0)
+
+    with tracer.start_span('request', traceparent=f'00-{TRACE_ID}-{PARENT_ID}-01') as span:
+        assert tracer.current_traceparent() == f'00-{TRACE_ID}-{span.span_id}-01'
+
+    assert exporter.spans[0].trace_id == TRACE_ID
+    assert exporter.spans[0].parent_id == PARENT_ID
+
+def test_spans_of_trace_not_sampled_are_not_recorded():
+    tracer, exporter = new_tracer(sample_rate=1)
+
+    with tracer.start_span('request', traceparent=f'00-{TRACE_ID}-{PARENT_ID}-00') as span:
+        assert span is None
+        with tracer.start_span('service') as child:
+            assert child is None
+        assert tracer.current_traceparent() is None
+
+    assert exporter.spans == []
+
+def test_child_only_span_needs_a_parent():
+    tracer, exporter = new_tracer()
+
+    with tracer.start_span('redis', child_only=True) as span:
+        assert span is None
+
+    assert exporter.spans == []
+
+@pytest.mark.asyncio
+async def test_traced_function_records_error():
+    tracer, exporter = new_tracer()
+
+    @tracer.traced()
+    async def failing():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        await failing()
+
+    assert exporter.spans[0].name.endswith('failing')
+    assert exporter.spans[0].error == 'ValueError'
+
+def test_spans_are_exported_by_a_background_thread():
+    exporter = ListExporter()
+    tracer = Tracer(exporter, batch_size=1)
+
+    with tracer.start_span('request'):
+        pass
+    tracer.shutdown()
+
+    assert [span.name for span in exporter.spans] == ['request']
+    assert exporter.threads == {'span-exporter'}
+    assert tracer.exported == 1
+
+def test_batches_are_dropped_when_the_exporter_falls_behind():
+    release = threading.Event()
+
+    class BlockedExporter(ListExporter):
+        def export(self, spans: list[Span]) -> None:
+            release.wait()
+            super().export(spans)
+
+    exporter = BlockedExporter()
+    tracer = Tracer(exporter, batch_size=1, max_queued_batches=1)
+
+    # the first batch is taken by the thread, the second waits in the queue, the rest do not fit
+    for name in ('first', 'second', 'third', 'fourth'):
+        with tracer.start_span(name):
+            pass
+        if name == 'first':
+            while not tracer._batches.empty():
+                time.sleep(0.001)
+    release.set()
+    tracer.shutdown()
+
+    assert [span.name for span in exporter.spans] == ['first', 'second']
+    assert tracer.dropped == 2
+
+def test_json_file_exporter_appends_one_span_per_line(tmp_path):
+    filename = tmp_path / 'traces.jsonl'
+    tracer = Tracer(JsonFileExporter(str(filename)), batch_size=10)
+
+    with tracer.start_span('request', {'http.method': 'GET'}):
+        with tracer.start_span('service'):
+            pass
+    assert not filename.exists()
+    tracer.shutdown()
+
+    spans = [json.loads(line) for line in filename.read_text().splitlines()]
+    assert [span['name'] for span in spans] == ['service', 'request']
+    assert spans[1]['attributes'] == {'http.method': 'GET'}
+
+@pytest.mark.asyncio
+async def test_statements_are_spans_of_the_current_trace():
+    tracer, exporter = new_tracer()
+    engine = create_async_engine(DB_URL)
+    tracer.instrument_engine(engine)
+
+    async with engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+        with tracer.start_span('request') as root:
+            await connection.execute(text('SELECT 2'))
+
+    await engine.dispose()
+    statement_span, root_span = exporter.spans
+    assert statement_span.attributes['db.statement'] == 'SELECT 2'
+    assert statement_span.parent_id == root.span_id
@@ -0,0 +1,72 @@
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import pytest
+
+from app.utils import redis_client
+from app.utils.email_outbox import EmailOutbox
+from app.utils.tracing import Tracer
+from app.workers.email import EmailWorker, EMAIL_SENDERS
+from test.utils.utils import random_lower_string, random_email
+
+
+@pytest.fixture
+async def outbox():
+    prefix = f'test:email:{random_lower_string()}'
+    email_outbox = EmailOutbox(
+        redis_client,
+        stream=f'{prefix}:outbox',
+        group='test-email-workers',
+        retry_key=f'{prefix}:retry',
+        dead_letter_stream=f'{prefix}:dead',
+        max_attempts=2,
+        backoff_base_seconds=0,
+    )
+    await email_outbox.ensure_group()
+    yield email_outbox
+    await redis_client.delete_data([email_outbox.stream, email_outbox.retry_key, email_outbox.dead_letter_stream])
+
+def make_worker(outbox: EmailOutbox) -> EmailWorker:
+    return EmailWorker(outbox, consumer='test-consumer', batch_size=10, concurrency=2, block_ms=100)
+
+
+@pytest.mark.asyncio
+async def test_email_worker_sends_and_acks_jobs(outbox):
+    emails = [random_email() for _ in range(3)]
+    for user_id, email in enumerate(emails):
+        await outbox.enqueue_verification_email(email, user_id)
+
+    sender = AsyncMock()
+    with patch.dict(EMAIL_SENDERS, {'verify_email': sender}):
+        processed = await make_worker(outbox).run_once()
+
+    assert processed == 3
+    assert sorted(call.args[0].email for call in sender.await_args_list) == sorted(emails)
+    assert await redis_client.redis_client.xlen(outbox.stream) == 0
+
+@pytest.mark.asyncio
+async def test_email_worker_retries_then_dead_letters(outbox):
+    await outbox.enqueue_verification_email(random_email(), 1)
+    worker = make_worker(outbox)
+
+    with patch.dict(EMAIL_SENDERS, {'verify_email': AsyncMock(side_effect=ConnectionError)}):
+        await worker.run_once()
+        assert await redis_client.redis_client.zcard(outbox.retry_key) == 1
+
+        await worker.run_once()
+
+    assert await redis_client.redis_client.zcard(outbox.retry_key) == 0
+    assert await redis_client.redis_client.xlen(outbox.dead_letter_stream) == 1
+    assert await redis_client.redis_client.xlen(outbox.stream) == 0
+
+@pytest.mark.asyncio
+async def test_email_job_carries_trace_of_enqueuing_request(outbox):
+    tracer = Tracer(MagicMock(), sample_rate=1)
+    with (
+        patch('app.utils.email_outbox.tracer', tracer),
+        tracer.start_span('request') as span,
+    ):
+        await outbox.enqueue_verification_email(random_email(), 1)
+
+    jobs = await outbox.read_batch('test-consumer', 10, 100)
+
+    assert jobs[0].traceparent == span.traceparent